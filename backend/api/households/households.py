@@ -1,8 +1,13 @@
-from fastapi import APIRouter, HTTPException, Request, status
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List, Optional
-from firebase import db
+from firebase import db, firestore_v1
+from metrics import FIRESTORE_SECONDS
+from api.repositories import household_repository, user_resolver
+from api.users.repository import UserResolver
 
 router = APIRouter(prefix="/households", tags=["households"])
 
@@ -14,29 +19,29 @@ class Household(BaseModel):
     member_emails: Optional[List[str]] = []
 
 @router.get("/")
-def get_households():
-    households_ref = db.collection(HOUSEHOLDS_COLLECTION).stream()
-    return [doc.to_dict() for doc in households_ref]
+async def get_households():
+    with FIRESTORE_SECONDS.time("households.list"):
+        households_ref = db.collection(HOUSEHOLDS_COLLECTION).stream()
+        return [doc.to_dict() async for doc in households_ref]
 
 @router.post("/create")
-def create_household(request: Request, household: Household):
+async def create_household(request: Request, household: Household, users: UserResolver = Depends(user_resolver)):
     user_id = request.cookies.get('user_id')
     if not user_id: 
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='User not authenticated')
     
-    user_ref = db.collection(USERS_COLLECTION).document(user_id)
-    user_doc = user_ref.get()
-    if not user_doc.exists:
+    # The requesting user and all member emails are looked up at the same time
+    user, email_ids = await asyncio.gather(users.get(user_id), users.ids_for_emails(household.member_emails or []))
+    if user is None:
         raise HTTPException(status_code=404, detail="Requesting userId not found")
 
     member_ids = []
     if household.member_emails: 
         for email in household.member_emails:
-            user_query = db.collection(USERS_COLLECTION).where('email', '==', email).limit(1).get()
-            if user_query:
-                member_ids.append(user_query[0].id)
-            else: 
+            if email_ids[email] is None:
                 raise HTTPException(status_code=404, detail=f'No user found for email: {email}')
+            if email_ids[email] not in member_ids:
+                member_ids.append(email_ids[email])
 
     household_data = {
         'name': household.name,
@@ -47,17 +52,16 @@ def create_household(request: Request, household: Household):
         'ingredients': []
     }
 
-    household_ref = db.collection(HOUSEHOLDS_COLLECTION).document()
-    household_ref.set(household_data)
+    household_id = await household_repository.create(household_data)
 
     response = JSONResponse(content={
         'message': 'Household successfully created',
-        'household_id': household_ref.id
+        'household_id': household_id
     })
 
     response.set_cookie(
         key='household_id',
-        value=household_ref.id,
+        value=household_id,
         httponly=False,
         max_age=604800,
         secure=False,
@@ -66,39 +70,25 @@ def create_household(request: Request, household: Household):
     return response
 
 @router.get('/joined')
-def get_joined_households(request: Request):
+async def get_joined_households(request: Request):
     user_id = request.cookies.get('user_id')
     if not user_id:
         raise HTTPException(status_code=401, detail='Missing userId cookie')
     
-    households_ref = db.collection(HOUSEHOLDS_COLLECTION).stream()
-    joined = []
-    for doc in households_ref:
-        data = doc.to_dict()
-        if user_id in data.get('users', []):
-            joined.append({
-                'id': doc.id,
-                'name': data.get('name', 'Unnamed Household')
-            })
-
-    return joined
+    return await household_repository.joined(user_id)
 
 
 @router.get('/admin')
-def check_admin(request: Request): 
+async def check_admin(request: Request): 
     household_id = request.cookies.get('household_id')
     user_id = request.cookies.get('user_id')
 
     if not household_id or not user_id:
         raise HTTPException(status_code=401, detail='Missing cookies')
     
-    household_ref = db.collection(HOUSEHOLDS_COLLECTION).document(household_id)
-    household_doc = household_ref.get()
-
-    if not household_doc.exists:
+    data = await household_repository.get(household_id)
+    if data is None:
         raise HTTPException(status_code=404, detail='Household not found')
-    
-    data = household_doc.to_dict()
 
     if user_id == data.get('owner') or user_id in data.get('admins', []):
         return { 'authorized': True }
@@ -106,32 +96,29 @@ def check_admin(request: Request):
     return { 'authorized': False }
 
 @router.get('/users')
-def get_household_users(request: Request): 
+async def get_household_users(request: Request, users: UserResolver = Depends(user_resolver)): 
     household_id = request.cookies.get('household_id')
 
     if not household_id:
         raise HTTPException(status_code=401, detail='Missing household_id cookie')
 
-    household_ref = db.collection(HOUSEHOLDS_COLLECTION).document(household_id)
-    household_doc = household_ref.get()
-
-    if not household_doc.exists:
+    data = await household_repository.get(household_id)
+    if data is None:
         raise HTTPException(status_code=404, detail='Household not found')
-
-    data = household_doc.to_dict()
-    
-    def get_user_info(user_id): 
-        user_ref = db.collection(USERS_COLLECTION).document(user_id)
-        user_doc = user_ref.get()
-        if user_doc.exists:
-            user_data = user_doc.to_dict()
-            return { 'id': user_id, 'email': user_data.get('email', 'unknown') }
-        return None
     
     owner_id = data.get('owner')
     admins = data.get('admins', [])
     members = data.get('members', [])
 
+    # Everyone is fetched in one round-trip
+    found = await users.get_many([owner_id] + admins + members)
+
+    def get_user_info(user_id): 
+        user_data = found.get(user_id)
+        if user_data is not None:
+            return { 'id': user_id, 'email': user_data.get('email', 'unknown') }
+        return None
+
     response = {
         'owner': get_user_info(owner_id),
         'admins': [user for user in [get_user_info(userId) for userId in admins] if user],
@@ -141,7 +128,7 @@ def get_household_users(request: Request):
     return response
 
 @router.post('/add-member')
-def add_member(request: Request, payload: dict):
+async def add_member(request: Request, payload: dict, users: UserResolver = Depends(user_resolver)):
     household_id = request.cookies.get('household_id')
     if not household_id:
         raise HTTPException(status_code=401, detail='Missing household_id cookie')
@@ -150,94 +137,70 @@ def add_member(request: Request, payload: dict):
     if not email:
         raise HTTPException(status_code=400, detail='Email is required')
     
-    user_query = db.collection(USERS_COLLECTION).where('email', '==', email).limit(1).get()
-    if not user_query:
+    email_ids, data = await asyncio.gather(users.ids_for_emails([email]), household_repository.get(household_id))
+    user_id = email_ids[email]
+    if user_id is None:
         raise HTTPException(status_code=404, detail='No user found with that email')
-    user_id = user_query[0].id
 
-    household_ref = db.collection(HOUSEHOLDS_COLLECTION).document(household_id)
-    household_doc = household_ref.get()
-    if not household_doc.exists:
+    if data is None:
         raise HTTPException(status_code=404, detail='Household not found')
 
-    data = household_doc.to_dict()
-
     if user_id in data.get('users', []):
         raise HTTPException(status_code=409, detail='User already in household')
 
-    # Update members and users
-    updated_members = data.get('members', [])
-    updated_users = data.get('users', [])
-
-    updated_members.append(user_id)
-    updated_users.append(user_id)
-
-    household_ref.update({
-        'members': updated_members,
-        'users': updated_users
+    # Update members and users, ArrayUnion keeps members added at the same time
+    await household_repository.update(household_id, {
+        'members': firestore_v1().ArrayUnion([user_id]),
+        'users': firestore_v1().ArrayUnion([user_id])
     })
 
     return { 'message': 'Member added successfully', 'user_id': user_id }
 
 @router.post('/promote')
-def promote_to_admin(request: Request, payload: dict):
+async def promote_to_admin(request: Request, payload: dict):
     household_id = request.cookies.get('household_id')
     user_id = payload.get('user_id')
 
-    household_ref = db.collection(HOUSEHOLDS_COLLECTION).document(household_id)
-    household_doc = household_ref.get()
-    if not household_doc.exists:
+    # Moving between roles depends on the current roles, so it runs in a transaction
+    def promote(data):
+        if user_id not in data.get('members', []):
+            raise HTTPException(status_code=404, detail='User is not a member')
+        return { 'members': firestore_v1().ArrayRemove([user_id]), 'admins': firestore_v1().ArrayUnion([user_id]) }
+
+    if await household_repository.transact(household_id, promote) is None:
         raise HTTPException(status_code=404, detail='Household not found')
-    
-    data = household_doc.to_dict()
-    if user_id in data.get('members', []):
-        data['members'].remove(user_id)
-        data['admins'].append(user_id)
-        household_ref.update({ 'members': data['members'], 'admins': data['admins'] })
-        return { 'message': 'User promoted to admin' }
-    raise HTTPException(status_code=404, detail='User is not a member')
+    return { 'message': 'User promoted to admin' }
 
 @router.post('/demote')
-def demote_to_member(request: Request, payload: dict):
+async def demote_to_member(request: Request, payload: dict):
     household_id = request.cookies.get('household_id')
     user_id = payload.get('user_id')
 
-    household_ref = db.collection(HOUSEHOLDS_COLLECTION).document(household_id)
-    household_doc = household_ref.get()
-    if not household_doc.exists:
+    def demote(data):
+        if user_id not in data.get('admins', []):
+            raise HTTPException(status_code=404, detail='User is not a member')
+        return { 'admins': firestore_v1().ArrayRemove([user_id]), 'members': firestore_v1().ArrayUnion([user_id]) }
+
+    if await household_repository.transact(household_id, demote) is None:
         raise HTTPException(status_code=404, detail='Household not found')
-    
-    data = household_doc.to_dict()
-    if user_id in data.get('admins', []):
-        data['admins'].remove(user_id)
-        data['members'].append(user_id)
-        household_ref.update({ 'admins': data['admins'], 'members': data['members'] })
-        return { 'message': 'User demoted to member' }
-    raise HTTPException(status_code=404, detail='User is not a member')
+    return { 'message': 'User demoted to member' }
 
 @router.post('/remove')
-def remove_user(request: Request, payload: dict):
+async def remove_user(request: Request, payload: dict):
     household_id = request.cookies.get('household_id')
     user_id = payload.get('user_id')
 
-    household_ref = db.collection(HOUSEHOLDS_COLLECTION).document(household_id)
-    household_doc = household_ref.get()
-    if not household_doc.exists:
+    data = await household_repository.get(household_id)
+    if data is None:
         raise HTTPException(status_code=404, detail='Household not found')
     
-    data = household_doc.to_dict()
-    
     if user_id == data.get('owner'):
         raise HTTPException(status_code=403, detail='Cannot remove owner')
     
-    for role in ['admins', 'members', 'users']:
-        if user_id in data.get(role, []):
-            data[role].remove(user_id)
-
-    household_ref.update({
-        'admins': data['admins'],
-        'members': data['members'],
-        'users': data['users']
+    await household_repository.update(household_id, {
+        'admins': firestore_v1().ArrayRemove([user_id]),
+        'members': firestore_v1().ArrayRemove([user_id]),
+        'users': firestore_v1().ArrayRemove([user_id])
     })
 
     return { 'message': 'User removed' }
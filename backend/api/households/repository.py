@@ -0,0 +1,251 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from firebase import firestore_v1
+
+from metrics import FIRESTORE_SECONDS
+
+HOUSEHOLDS_COLLECTION = "households"
+# How often a transaction is tried before giving up, when other writes to the household keep getting in between
+TRANSACTION_ATTEMPTS = 10
+
+
+class CachedHousehold:
+    __slots__ = ("data", "update_time", "expires_at", "watch")
+
+    def __init__(self, data: dict, update_time, expires_at: float):
+        self.data = data
+        self.update_time = update_time
+        self.expires_at = expires_at
+        # Snapshot listener keeping this entry up to date, if any
+        self.watch = None
+
+
+def _is_plain(value) -> bool:
+    """True for values that are stored as they are, False for transforms like ArrayUnion or SERVER_TIMESTAMP."""
+    if isinstance(value, dict):
+        return all(_is_plain(item) for item in value.values())
+    if isinstance(value, list):
+        return all(_is_plain(item) for item in value)
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+def _apply(current, value):
+    """
+    The value of a field after writing value to it, computed like Firestore does.
+    Raises TypeError for transforms that only the server can apply, e.g. SERVER_TIMESTAMP.
+    """
+    firestore = firestore_v1()
+    if isinstance(value, firestore.ArrayUnion):
+        items = list(current) if isinstance(current, list) else []
+        for item in value.values:
+            if item not in items:
+                items.append(copy.deepcopy(item))
+        return items
+    if isinstance(value, firestore.ArrayRemove):
+        return [item for item in (current if isinstance(current, list) else []) if item not in value.values]
+    if isinstance(value, firestore.Increment):
+        return (current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0) + value.value
+    if _is_plain(value):
+        return copy.deepcopy(value)
+    raise TypeError(f"{type(value).__name__} is applied by the server")
+
+
+class HouseholdRepository:
+    """
+    Reads and writes household documents, with a read cache in front of Firestore.
+
+    Every handler that needs a household goes through get(), so one page view
+    reads each household from Firestore at most once per ttl seconds. Writes
+    go to Firestore first and then update the cached copy (write-through).
+    The cache is per process: with several workers, a change made through
+    another worker shows up after at most ttl seconds, or right away if
+    listen_db is given: cached households are then kept fresh with snapshot
+    listeners.
+
+    db is an async Firestore client, or anything with the same interface (the
+    in-memory fake in benchmarks/fake_firestore.py, or a client connected to
+    the emulator). The async client has no snapshot listeners, so listening
+    needs listen_db, a synchronous client for the same database.
+    """
+
+    def __init__(self, db, ttl: float = 30.0, max_entries: int = 10_000, listen_db=None,
+                 max_listeners: int = 100):
+        self.db = db
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.listen_db = listen_db
+        self.max_listeners = max_listeners
+        self._entries: OrderedDict[str, CachedHousehold] = OrderedDict()
+        self._lock = threading.Lock()
+        self._n_watches = 0
+        self.hits = 0
+        self.misses = 0
+
+    def reference(self, household_id: str):
+        return self.db.collection(HOUSEHOLDS_COLLECTION).document(household_id)
+
+    async def get(self, household_id: str) -> dict | None:
+        """Returns a copy of the household's data, or None if it does not exist."""
+        with self._lock:
+            entry = self._entries.get(household_id)
+            if entry is not None and (entry.watch is not None or entry.expires_at >= time.monotonic()):
+                self._entries.move_to_end(household_id)
+                self.hits += 1
+                return copy.deepcopy(entry.data)
+            self.misses += 1
+
+        with FIRESTORE_SECONDS.time("households.get"):
+            snapshot = await self.reference(household_id).get()
+        if not snapshot.exists:
+            self.invalidate(household_id)
+            return None
+        data = snapshot.to_dict()
+        self._store(household_id, data, snapshot.update_time)
+        if self.listen_db is not None:
+            self._watch(household_id)
+        return copy.deepcopy(data)
+
+    async def joined(self, user_id: str) -> list[dict]:
+        """
+        Id and name of every household the user is in. Uses the single-field
+        index Firestore keeps for `users`, and only fetches the name field.
+        """
+        query = (self.db.collection(HOUSEHOLDS_COLLECTION)
+                 .where(filter=firestore_v1().FieldFilter("users", "array_contains", user_id))
+                 .select(["name"]))
+        with FIRESTORE_SECONDS.time("households.joined"):
+            return [{"id": doc.id, "name": (doc.to_dict() or {}).get("name", "Unnamed Household")}
+                    async for doc in query.stream()]
+
+    async def create(self, data: dict) -> str:
+        """Adds a new household and returns its id."""
+        household_ref = self.db.collection(HOUSEHOLDS_COLLECTION).document()
+        with FIRESTORE_SECONDS.time("households.create"):
+            result = await household_ref.set(data)
+        if _is_plain(data):
+            self._store(household_ref.id, copy.deepcopy(data), result.update_time)
+        return household_ref.id
+
+    async def update(self, household_id: str, changes: dict):
+        """
+        Updates fields of a household in Firestore and in the cache. Use
+        ArrayUnion / ArrayRemove to change lists: they are applied atomically
+        by Firestore, so concurrent changes to the same list are not lost.
+        """
+        with FIRESTORE_SECONDS.time("households.update"):
+            result = await self.reference(household_id).update(changes)
+        with self._lock:
+            entry = self._entries.get(household_id)
+            if entry is None:
+                return
+            try:
+                if any("." in field for field in changes):
+                    raise TypeError("nested field paths")
+                updated = {field: _apply(entry.data.get(field), value) for field, value in changes.items()}
+            except TypeError:
+                pass
+            else:
+                entry.data.update(updated)
+                entry.update_time = result.update_time
+                entry.expires_at = time.monotonic() + self.ttl
+                return
+        # The next get() reads the result from Firestore
+        self.invalidate(household_id)
+
+    async def transact(self, household_id: str, change) -> dict | None:
+        """
+        Reads the household and writes change(data) in one transaction.
+        change gets a copy of the current data and returns the fields to
+        update (or nothing), it may raise to cancel. If the household is
+        changed by someone else in between, Firestore aborts and the whole
+        thing runs again with the new data, up to TRANSACTION_ATTEMPTS times.
+        Returns the household after the change, or None if it does not exist.
+        """
+        reference = self.reference(household_id)
+
+        @firestore_v1().async_transactional
+        async def run(transaction):
+            snapshot = await reference.get(transaction=transaction)
+            if not snapshot.exists:
+                return None
+            data = snapshot.to_dict()
+            changes = change(copy.deepcopy(data))
+            if changes:
+                transaction.update(reference, changes)
+                data.update({field: _apply(data.get(field), value) for field, value in changes.items()})
+            return data
+
+        # Timed as a whole, including the retries
+        with FIRESTORE_SECONDS.time("households.transaction"):
+            data = await run(self.db.transaction(max_attempts=TRANSACTION_ATTEMPTS))
+        if data is None:
+            self.invalidate(household_id)
+        else:
+            # The commit time is not known here, but this is the newest version this process has seen
+            self._store(household_id, copy.deepcopy(data), None)
+        return data
+
+    def invalidate(self, household_id: str):
+        with self._lock:
+            entry = self._entries.pop(household_id, None)
+        if entry is not None:
+            self._unwatch(entry)
+
+    def _store(self, household_id: str, data: dict, update_time):
+        evicted = []
+        with self._lock:
+            entry = self._entries.get(household_id)
+            if entry is None:
+                self._entries[household_id] = CachedHousehold(data, update_time, time.monotonic() + self.ttl)
+            elif entry.update_time is None or update_time is None or update_time >= entry.update_time:
+                # Never replace the cached copy with an older version, e.g. a read that
+                # started before a write through this process finished
+                entry.data = data
+                entry.update_time = update_time
+                entry.expires_at = time.monotonic() + self.ttl
+            self._entries.move_to_end(household_id)
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[1])
+        for entry in evicted:
+            self._unwatch(entry)
+
+    def _watch(self, household_id: str):
+        with self._lock:
+            entry = self._entries.get(household_id)
+            if entry is None or entry.watch is not None or self._n_watches >= self.max_listeners:
+                return
+            entry.watch = True
+            self._n_watches += 1
+
+        def on_snapshot(snapshots, changes, read_time):
+            for snapshot in snapshots:
+                if snapshot.exists:
+                    self._store(snapshot.id, snapshot.to_dict(), snapshot.update_time)
+                else:
+                    self.invalidate(snapshot.id)
+
+        # Listener callbacks run on a background thread of the synchronous client
+        watch = self.listen_db.collection(HOUSEHOLDS_COLLECTION).document(household_id).on_snapshot(on_snapshot)
+        with self._lock:
+            if entry.watch is True:
+                entry.watch = watch
+                return
+        # The entry was dropped while the listener started
+        watch.unsubscribe()
+
+    def _unwatch(self, entry: CachedHousehold):
+        watch = entry.watch
+        if watch is None:
+            return
+        entry.watch = None
+        with self._lock:
+            self._n_watches -= 1
+        if watch is not True:
+            watch.unsubscribe()
+
+    def status(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "listeners": self._n_watches}
@@ -1,75 +1,168 @@
+import csv
+import io
+import json
+
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from firebase import db
+from firebase import firestore_v1
+from api.repositories import household_repository
 
 router = APIRouter(prefix="/households", tags=["Ingredients"])
 
-HOUSEHOLDS_COLLECTION = 'households'
+# Most ingredients one bulk request may add or delete
+MAX_BULK_INGREDIENTS = 1000
+# Ingredients per chunk of an export
+EXPORT_CHUNK_SIZE = 500
 
 class Ingredient(BaseModel):
     name: str
 
+class IngredientList(BaseModel):
+    names: list[str]
+
+def ingredient_changes(transform) -> dict:
+    """
+    The update for a change to the ingredients list. ingredients_version is incremented
+    in the same write, so recommendations memoized for the old ingredients are not used anymore.
+    """
+    return {'ingredients': transform, 'ingredients_version': firestore_v1().Increment(1)}
+
+def bulk_names(ingredients: IngredientList) -> list[str]:
+    """The names of a bulk request without blanks and duplicates, in their original order."""
+    if len(ingredients.names) > MAX_BULK_INGREDIENTS:
+        raise HTTPException(status_code=413, detail=f'At most {MAX_BULK_INGREDIENTS} ingredients per request')
+    return list(dict.fromkeys(name.strip() for name in ingredients.names if name.strip()))
+
 @router.get("/ingredients")
 async def get_ingredients(request: Request):
     household_id = request.cookies.get('household_id')
     if not household_id: 
         raise HTTPException(status_code=401, detail='Missing household_id cookie')
     
-    household_ref = db.collection(HOUSEHOLDS_COLLECTION).document(household_id)
-    household_doc = household_ref.get()
-
-    if not household_doc.exists:
+    household_data = await household_repository.get(household_id)
+    if household_data is None:
         raise HTTPException(status_code=404, detail='Household not found')
-
-    household_data = household_doc.to_dict()
     ingredients = household_data.get('ingredients', [])
 
     return { 'household_id': household_id, 'ingredients': ingredients }
 
 
 @router.post("/ingredients")
-def add_ingredient(request: Request, ingredient: Ingredient):
+async def add_ingredient(request: Request, ingredient: Ingredient):
     household_id = request.cookies.get('household_id')
     if not household_id:
         raise HTTPException(status_code=401, detail='Missing household_id cookie')
     
-    household_ref = db.collection(HOUSEHOLDS_COLLECTION).document(household_id)
-    household_doc = household_ref.get()
-
-    if not household_doc.exists:
+    household_data = await household_repository.get(household_id)
+    if household_data is None:
         raise HTTPException(status_code=404, detail='Household not found')
-    
-    household_data = household_doc.to_dict()
     ingredients = household_data.get('ingredients', [])
 
     if any(item.get('name') == ingredient.name for item in ingredients):
         raise HTTPException(status_code=400, detail='Ingredient already exists')
     
-    ingredients.append({'name': ingredient.name})
-    household_ref.update({'ingredients': ingredients})
+    # ArrayUnion only sends the new ingredient, and keeps ingredients others add at the same time
+    await household_repository.update(household_id, ingredient_changes(firestore_v1().ArrayUnion([{'name': ingredient.name}])))
 
     return { 'message': 'Ingredient added successfully', 'ingredient': ingredient }
 
+# Bulk routes are declared before DELETE /ingredients/{ingredient_name}, which would match "bulk" too
+@router.post("/ingredients/bulk")
+async def add_ingredients_bulk(request: Request, ingredients: IngredientList):
+    """Adds many ingredients with a single write. Ingredients the household already has are skipped."""
+    household_id = request.cookies.get('household_id')
+    if not household_id:
+        raise HTTPException(status_code=401, detail='Missing household_id cookie')
+
+    names = bulk_names(ingredients)
+    household_data = await household_repository.get(household_id)
+    if household_data is None:
+        raise HTTPException(status_code=404, detail='Household not found')
+
+    existing = {item.get('name') for item in household_data.get('ingredients', [])}
+    added = [name for name in names if name not in existing]
+    if added:
+        await household_repository.update(household_id, ingredient_changes(firestore_v1().ArrayUnion([{'name': name} for name in added])))
+
+    return {
+        'message': f'{len(added)} ingredients added',
+        'added': added,
+        'skipped': [name for name in names if name in existing]
+    }
+
+@router.delete("/ingredients/bulk")
+async def delete_ingredients_bulk(request: Request, ingredients: IngredientList):
+    """Deletes many ingredients with a single write. Names the household does not have are reported as not found."""
+    household_id = request.cookies.get('household_id')
+    if not household_id:
+        raise HTTPException(status_code=401, detail='Missing household_id cookie')
+
+    names = bulk_names(ingredients)
+    wanted = set(names)
+    household_data = await household_repository.get(household_id)
+    if household_data is None:
+        raise HTTPException(status_code=404, detail='Household not found')
+
+    removed = [item for item in household_data.get('ingredients', []) if item.get('name') in wanted]
+    if removed:
+        await household_repository.update(household_id, ingredient_changes(firestore_v1().ArrayRemove(removed)))
+
+    removed_names = {item.get('name') for item in removed}
+    return {
+        'message': f'{len(removed_names)} ingredients deleted',
+        'deleted': [name for name in names if name in removed_names],
+        'not_found': [name for name in names if name not in removed_names]
+    }
+
+@router.get("/ingredients/export")
+async def export_ingredients(request: Request, format: str = 'ndjson'):
+    """Streams the household's ingredients as JSON lines or CSV, without building the whole file first."""
+    household_id = request.cookies.get('household_id')
+    if not household_id:
+        raise HTTPException(status_code=401, detail='Missing household_id cookie')
+    if format not in ('ndjson', 'csv'):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+
+    household_data = await household_repository.get(household_id)
+    if household_data is None:
+        raise HTTPException(status_code=404, detail='Household not found')
+    ingredients = household_data.get('ingredients', [])
+
+    def chunks():
+        if format == 'csv':
+            yield 'name\n'
+        for start in range(0, len(ingredients), EXPORT_CHUNK_SIZE):
+            chunk = ingredients[start:start + EXPORT_CHUNK_SIZE]
+            if format == 'ndjson':
+                yield ''.join(json.dumps(item, ensure_ascii=False) + '\n' for item in chunk)
+            else:
+                out = io.StringIO()
+                writer = csv.writer(out, lineterminator='\n')
+                writer.writerows([item.get('name', '')] for item in chunk)
+                yield out.getvalue()
+
+    media_type = 'application/x-ndjson' if format == 'ndjson' else 'text/csv'
+    return StreamingResponse(chunks(), media_type=media_type, headers={
+        'Content-Disposition': f'attachment; filename="ingredients.{format}"'
+    })
+
 @router.delete('/ingredients/{ingredient_name}')
-def delete_ingredient(request: Request, ingredient_name: str):
+async def delete_ingredient(request: Request, ingredient_name: str):
     household_id = request.cookies.get('household_id')
     if not household_id: 
         raise HTTPException(status_code=401, detail='Missing household_id cookie')
     
-    household_ref = db.collection(HOUSEHOLDS_COLLECTION).document(household_id)
-    household_doc = household_ref.get()
-
-    if not household_doc.exists:
+    household_data = await household_repository.get(household_id)
+    if household_data is None:
         raise HTTPException(status_code=404, detail='Household not found')
-    
-    household_data = household_doc.to_dict()
     ingredients = household_data.get('ingredients', [])
 
-    updated_ingredients = [item for item in ingredients if item.get('name') != ingredient_name]
+    removed = [item for item in ingredients if item.get('name') == ingredient_name]
 
-    if len(updated_ingredients) == len(ingredients):
+    if not removed:
         raise HTTPException(status_code=404, detail='Ingredient not found')
     
-    household_ref.update({ 'ingredients': updated_ingredients })
+    await household_repository.update(household_id, ingredient_changes(firestore_v1().ArrayRemove(removed)))
 
     return { 'message': 'Ingredient successfully deleted', 'deleted': ingredient_name }
\ No newline at end of file
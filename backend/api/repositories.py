@@ -0,0 +1,17 @@
+import os
+
+from firebase import db, sync_client
+from api.households.repository import HouseholdRepository
+from api.users.repository import UserResolver
+
+# Shared by the households and ingredients routers, so they also share the cached households
+household_repository = HouseholdRepository(
+    db,
+    ttl=float(os.environ.get("HOUSEHOLD_CACHE_TTL", "30")),
+    listen_db=sync_client() if os.environ.get("HOUSEHOLD_CACHE_LISTEN", "0") == "1" else None,
+)
+
+
+def user_resolver() -> UserResolver:
+    """FastAPI dependency: a UserResolver for the current request."""
+    return UserResolver(db)
@@ -4,7 +4,7 @@ from fastapi.responses import JSONResponse
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 @router.get("/")
-def check_auth(request: Request):
+async def check_auth(request: Request):
     user_id = request.cookies.get("user_id")
     if not user_id:
         raise HTTPException(
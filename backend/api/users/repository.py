@@ -0,0 +1,61 @@
+import asyncio
+
+from firebase import firestore_v1
+
+from metrics import FIRESTORE_SECONDS
+
+USERS_COLLECTION = "users"
+# Most values Firestore accepts in one `in` filter
+IN_QUERY_LIMIT = 30
+
+
+class UserResolver:
+    """
+    Looks up many users at once: ids with one db.get_all() call, emails with
+    concurrent `in` queries of up to IN_QUERY_LIMIT emails each. Results are
+    remembered, so asking again for a user within the same request costs
+    nothing.
+
+    Create one per request (see api.repositories.user_resolver), the memo is
+    not invalidated when users change.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._users: dict[str, dict | None] = {}
+        self._emails: dict[str, str | None] = {}
+
+    async def get_many(self, user_ids) -> dict[str, dict | None]:
+        """Maps each user id to {"email": ...}, or None if there is no such user. Passwords are never fetched."""
+        missing = [user_id for user_id in dict.fromkeys(user_ids) if user_id and user_id not in self._users]
+        if missing:
+            users = self.db.collection(USERS_COLLECTION)
+            with FIRESTORE_SECONDS.time("users.get_all"):
+                async for doc in self.db.get_all([users.document(user_id) for user_id in missing], field_paths=["email"]):
+                    self._users[doc.id] = doc.to_dict() if doc.exists else None
+        return {user_id: self._users.get(user_id) for user_id in user_ids if user_id}
+
+    async def get(self, user_id: str) -> dict | None:
+        return (await self.get_many([user_id])).get(user_id)
+
+    async def ids_for_emails(self, emails) -> dict[str, str | None]:
+        """Maps each email to the id of the user with that email, or None."""
+        missing = [email for email in dict.fromkeys(emails) if email not in self._emails]
+        chunks = [missing[start:start + IN_QUERY_LIMIT] for start in range(0, len(missing), IN_QUERY_LIMIT)]
+        for docs in await asyncio.gather(*(self._query_emails(chunk) for chunk in chunks)):
+            for doc in docs:
+                email = doc.to_dict().get("email")
+                # Keep the first match for an email, like the old .limit(1) lookups
+                if self._emails.get(email) is None:
+                    self._emails[email] = doc.id
+                    self._users.setdefault(doc.id, {"email": email})
+        for email in missing:
+            self._emails.setdefault(email, None)
+        return {email: self._emails[email] for email in emails}
+
+    async def _query_emails(self, emails: list[str]) -> list:
+        query = (self.db.collection(USERS_COLLECTION)
+                 .where(filter=firestore_v1().FieldFilter("email", "in", emails))
+                 .select(["email"]))
+        with FIRESTORE_SECONDS.time("users.query_emails"):
+            return await query.get()
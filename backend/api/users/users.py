@@ -1,6 +1,9 @@
+import logging
+
 from fastapi import APIRouter, HTTPException, Depends, status, Response
 from pydantic import BaseModel
 from firebase import db
+from metrics import FIRESTORE_SECONDS
 from fastapi.security import OAuth2PasswordRequestForm
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -8,15 +11,18 @@ router = APIRouter(prefix="/users", tags=["users"])
 USERS_COLLECTION = "users"
 HOUSEHOLDS_COLLECTION = "households"
 
+logger = logging.getLogger(__name__)
+
 class User(BaseModel):
     email: str
     password: str
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
-def create_user(user: User, response: Response):
+async def create_user(user: User, response: Response):
     try:
         users_ref = db.collection(USERS_COLLECTION)
-        existing = users_ref.where("email", "==", user.email).get()
+        with FIRESTORE_SECONDS.time("users.find_by_email"):
+            existing = await users_ref.where("email", "==", user.email).limit(1).get()
         
         if existing:
             raise HTTPException(
@@ -25,25 +31,27 @@ def create_user(user: User, response: Response):
             )
         
         new_user_ref = users_ref.document()
-        new_user_ref.set(user.dict())
+        with FIRESTORE_SECONDS.time("users.create"):
+            await new_user_ref.set(user.dict())
         
         return {"message": "User created successfully", "user_id": new_user_ref.id}
     except HTTPException as http_exc:
         raise http_exc
     except Exception as e:
         # Log exception for debugging
-        print(f"Error creating user: {e}")
+        logger.exception("Error creating user: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred while creating the user."
         )
 
 @router.post("/login")
-def login(response: Response, form_data: OAuth2PasswordRequestForm = Depends()):
+async def login(response: Response, form_data: OAuth2PasswordRequestForm = Depends()):
     try:
         users_ref = db.collection(USERS_COLLECTION)
         query = users_ref.where("email", "==", form_data.username).limit(1)
-        user_docs = query.get()
+        with FIRESTORE_SECONDS.time("users.find_by_email"):
+            user_docs = await query.get()
         
         if not user_docs:
             raise HTTPException(
@@ -75,7 +83,7 @@ def login(response: Response, form_data: OAuth2PasswordRequestForm = Depends()):
     except HTTPException as http_exc:
         raise http_exc
     except Exception as e:
-        print(f'Error during login: {e}')
+        logger.exception("Error during login: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f'An unexpected error occurred during login: {str(e)}'
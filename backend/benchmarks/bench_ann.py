@@ -0,0 +1,101 @@
+"""
+Recall and throughput of the approximate index (model/ann.py) against the
+exact search, on the Zipf-distributed corpus of eval_scoring.py.
+
+Every query is a few random ingredients plus pantry staples. recall@k is
+the share of the approximate top k that scores at least as high as the
+exact k-th result, so recipes tied with the exact ones count as found.
+QPS is for single queries, one after the other, on one core.
+
+The knob settings (bands looked up, probe radius, max candidates) are
+applied to the loaded model between runs, like the ANN_* environment
+variables would be.
+
+Run from the backend directory:
+    python benchmarks/bench_ann.py --recipes 1000000 5000000
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "model"))
+
+import train
+from eval_scoring import STAPLES, generate
+from segments import load_model
+
+# (bands, probe radius, max candidates)
+SETTINGS = [(8, 0, 4000), (16, 0, 4000), (16, 1, 2000), (16, 1, 4000), (16, 1, 16000)]
+
+
+def run(model, vectors, k, approximate):
+    start = time.perf_counter()
+    results = [model.search(vector, k, approximate) for vector in vectors]
+    return results, len(vectors) / (time.perf_counter() - start)
+
+
+def recall(exact, approximate, k):
+    found = 0
+    for (_, exact_scores), (_, scores) in zip(exact, approximate):
+        # Scores are summed in the same order on both paths, the slack is only for printing safety
+        found += int(np.sum(scores >= exact_scores[k - 1] - 1e-12))
+    return found / (k * len(exact))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipes", type=int, nargs="+", default=[1_000_000, 5_000_000])
+    parser.add_argument("--ingredients", type=int, default=5_000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--query-ingredients", type=int, default=3, help="random ingredients per query, besides staples")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--scoring", default="count")
+    parser.add_argument("--bits", type=int, default=256)
+    args = parser.parse_args()
+
+    for n_recipes in args.recipes:
+        rng = random.Random(11)
+        with tempfile.TemporaryDirectory() as tmp:
+            recipes_path = os.path.join(tmp, "recipes.json")
+            generate(recipes_path, n_recipes, args.ingredients, rng)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                train.train(recipes_path, os.path.join(tmp, "artifact"), mode=args.scoring, ann_bits=args.bits)
+            train_seconds = time.perf_counter() - start
+            os.remove(recipes_path)
+
+            model = load_model(os.path.join(tmp, "artifact"))
+            ann = model.segments[0].engine.ann
+            index_mb = sum(array.nbytes for array in (ann.planes, ann.signatures, ann.band_indptr, ann.band_recipes))
+            print(f"{n_recipes} recipes ({args.scoring}), trained with a {args.bits} bit index in {train_seconds:.0f} s, "
+                  f"index {index_mb / (1 << 20):.0f} MB")
+
+            # Ingredients picked like the corpus uses them: frequent ones more often
+            weights = 1 / np.arange(1, args.ingredients + 1)
+            np_rng = np.random.default_rng(11)
+            queries = []
+            for _ in range(args.queries):
+                chosen = np_rng.choice(args.ingredients, size=args.query_ingredients, replace=False, p=weights / weights.sum())
+                queries.append(", ".join([f"Zutat{i}" for i in chosen] + STAPLES[:3]))
+            vectors = [model.vectorize([query]) for query in queries]
+
+            exact, exact_qps = run(model, vectors, args.k, approximate=False)
+            print(f"  {'exact':<22} recall@{args.k} 1.000  {exact_qps:>8.1f} QPS")
+            for bands, radius, max_candidates in SETTINGS:
+                ann.bands, ann.probe_radius, ann.max_candidates = bands, radius, max_candidates
+                results, qps = run(model, vectors, args.k, approximate=True)
+                label = f"bands={bands} r={radius} c={max_candidates}"
+                print(f"  {label:<22} recall@{args.k} {recall(exact, results, args.k):.3f}  {qps:>8.1f} QPS "
+                      f"({qps / exact_qps:.0f}x)")
+            del model, ann
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Requests per second one backend worker handles for a household page
+(read the household, then fetch its users), with the synchronous Firestore
+client against the async one.
+
+Sync handlers run on Starlette's thread pool (40 threads), each blocked for
+the whole round-trip; async handlers wait on the event loop, so many more
+requests can be in flight at once. Runs against the in-memory fake with a
+simulated round-trip time, or against the Firestore emulator with
+--emulator (needs FIRESTORE_EMULATOR_HOST).
+
+Run from the backend directory:
+    python benchmarks/bench_async.py --concurrency 200 --latency 0.01
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from anyio import to_thread
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from api.households.repository import HOUSEHOLDS_COLLECTION
+from api.users.repository import USERS_COLLECTION
+from fake_firestore import FakeAsyncFirestore, FakeFirestore
+
+
+def page_sync(db, household_id):
+    data = db.collection(HOUSEHOLDS_COLLECTION).document(household_id).get().to_dict()
+    users = db.collection(USERS_COLLECTION)
+    return [doc.to_dict() for doc in db.get_all([users.document(user_id) for user_id in data["users"]])]
+
+
+async def page_async(db, household_id):
+    data = (await db.collection(HOUSEHOLDS_COLLECTION).document(household_id).get()).to_dict()
+    users = db.collection(USERS_COLLECTION)
+    return [doc.to_dict() async for doc in db.get_all([users.document(user_id) for user_id in data["users"]])]
+
+
+async def run(handler, concurrency, requests):
+    """Sends requests through handler from `concurrency` clients, returns requests per second."""
+    remaining = iter(range(requests))
+
+    async def client():
+        for _ in remaining:
+            await handler()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - start)
+
+
+def seed(db):
+    for i in range(5):
+        db.collection(USERS_COLLECTION).document(f"u{i}").set({"email": f"user{i}@example.org"})
+    db.collection(HOUSEHOLDS_COLLECTION).document("bench").set(
+        {"name": "Bench", "owner": "u0", "admins": [], "members": ["u1", "u2", "u3", "u4"],
+         "users": ["u0", "u1", "u2", "u3", "u4"], "ingredients": []})
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=200, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.01, help="simulated round-trip time of the fake, seconds")
+    parser.add_argument("--emulator", action="store_true", help="use the Firestore emulator instead of the fake")
+    args = parser.parse_args()
+
+    if args.emulator:
+        from google.cloud import firestore
+        sync_db = firestore.Client(project="demo-recipes")
+        async_db = firestore.AsyncClient(project="demo-recipes")
+    else:
+        sync_db = FakeFirestore(latency=args.latency)
+        async_db = FakeAsyncFirestore(latency=args.latency)
+        seed(async_db.sync)
+    seed(sync_db)
+
+    sync_rate = await run(lambda: to_thread.run_sync(page_sync, sync_db, "bench"), args.concurrency, args.requests)
+    async_rate = await run(lambda: page_async(async_db, "bench"), args.concurrency, args.requests)
+    print(f"{args.concurrency} concurrent clients, {args.requests} requests")
+    print(f"  sync client, thread pool  {sync_rate:>8.0f} requests/s")
+    print(f"  async client              {async_rate:>8.0f} requests/s  ({async_rate / sync_rate:.1f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+"""
+Throughput of ScoringEngine.search_many (one sparse matrix-matrix product per
+chunk of queries) against calling search() once per query, which is what
+thousands of POST /recommend calls in a row amount to.
+
+Run from the backend directory:
+    python benchmarks/bench_batch.py --recipes 100000 --queries 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.sparse import vstack
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "model"))
+
+from bench_index import queries_for, zipf_matrix
+from engine import ScoringEngine
+from index import InvertedIndex
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipes", type=int, default=100_000)
+    parser.add_argument("--features", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--top-n", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(11)
+    X = zipf_matrix(args.recipes, args.features, 10, rng)
+    queries = queries_for(args.queries, args.features, 6, rng)
+    query_matrix = vstack(queries).tocsr()
+
+    brute = ScoringEngine(X)
+    indexed = ScoringEngine(brute.matrix, normalized=True, index=InvertedIndex.from_matrix(brute.matrix))
+
+    start = time.perf_counter()
+    single_results = [brute.search(query, args.top_n) for query in queries]
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed_results = [indexed.search(query, args.top_n) for query in queries]
+    indexed_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_results = brute.search_many(query_matrix, args.top_n)
+    batch_time = time.perf_counter() - start
+
+    identical = all(
+        np.array_equal(a_ids, b_ids) and np.array_equal(a_scores, b_scores)
+        for (a_ids, a_scores), (b_ids, b_scores) in zip(single_results, batch_results)
+    )
+
+    print(f"{args.queries} queries against {args.recipes} recipes (top_n={args.top_n})")
+    print(f"  one search() per query:        {args.queries / single_time:>10.0f} queries/s")
+    print(f"  one indexed search() per query:{args.queries / indexed_time:>10.0f} queries/s")
+    print(f"  search_many():                 {args.queries / batch_time:>10.0f} queries/s")
+    print(f"  identical results: {identical}")
+
+
+if __name__ == "__main__":
+    main()
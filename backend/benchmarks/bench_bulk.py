@@ -0,0 +1,92 @@
+"""
+Latency of filling and clearing a household pantry of --items ingredients:
+one POST /households/ingredients per item (as before), against one
+POST / DELETE /households/ingredients/bulk. Uses the writes the handlers
+send, through HouseholdRepository, on the in-memory fake with a simulated
+round-trip time, or on the Firestore emulator with --emulator.
+
+Run from the backend directory:
+    python benchmarks/bench_bulk.py --items 200 --latency 0.01
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from google.cloud.firestore_v1 import ArrayRemove, ArrayUnion
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from api.households.repository import HOUSEHOLDS_COLLECTION, HouseholdRepository
+from fake_firestore import FakeAsyncFirestore
+
+
+async def add_one_by_one(repository, household_id, names):
+    for name in names:
+        data = await repository.get(household_id)
+        if all(item.get("name") != name for item in data["ingredients"]):
+            await repository.update(household_id, {"ingredients": ArrayUnion([{"name": name}])})
+
+
+async def add_bulk(repository, household_id, names):
+    data = await repository.get(household_id)
+    existing = {item.get("name") for item in data["ingredients"]}
+    added = [name for name in dict.fromkeys(names) if name not in existing]
+    await repository.update(household_id, {"ingredients": ArrayUnion([{"name": name} for name in added])})
+
+
+async def delete_one_by_one(repository, household_id, names):
+    for name in names:
+        data = await repository.get(household_id)
+        removed = [item for item in data["ingredients"] if item.get("name") == name]
+        await repository.update(household_id, {"ingredients": ArrayRemove(removed)})
+
+
+async def delete_bulk(repository, household_id, names):
+    wanted = set(names)
+    data = await repository.get(household_id)
+    removed = [item for item in data["ingredients"] if item.get("name") in wanted]
+    await repository.update(household_id, {"ingredients": ArrayRemove(removed)})
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.01, help="simulated round-trip time of the fake, seconds")
+    parser.add_argument("--emulator", action="store_true", help="use the Firestore emulator instead of the fake")
+    args = parser.parse_args()
+
+    if args.emulator:
+        from google.cloud import firestore
+        db = firestore.AsyncClient(project="demo-recipes")
+    else:
+        db = FakeAsyncFirestore(latency=args.latency)
+
+    names = [f"Zutat {i}" for i in range(args.items)]
+    print(f"{args.items} ingredients, {args.runs} runs each")
+    for label, add, delete in (("one by one", add_one_by_one, delete_one_by_one), ("bulk", add_bulk, delete_bulk)):
+        add_times, delete_times = [], []
+        for run in range(args.runs):
+            reference = db.collection(HOUSEHOLDS_COLLECTION).document()
+            await reference.set({"name": "Bench", "ingredients": []})
+            # A fresh repository per run, so every run starts with an uncached household
+            repository = HouseholdRepository(db)
+            start = time.perf_counter()
+            await add(repository, reference.id, names)
+            add_times.append(time.perf_counter() - start)
+            stored = (await reference.get()).to_dict()["ingredients"]
+            assert len(stored) == args.items, len(stored)
+            start = time.perf_counter()
+            await delete(repository, reference.id, names)
+            delete_times.append(time.perf_counter() - start)
+            assert not (await reference.get()).to_dict()["ingredients"]
+        for operation, times in (("add", add_times), ("delete", delete_times)):
+            print(f"  {label:<11} {operation:<7} median {statistics.median(times) * 1000:>8.1f} ms  "
+                  f"max {max(times) * 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
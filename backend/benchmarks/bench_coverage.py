@@ -0,0 +1,91 @@
+"""
+Latency of coverage ranking (fewest missing ingredients first, see
+model/coverage.py) over the whole catalog, for pantries of different sizes,
+next to a plain similarity search. The first queries of every size are
+checked against a brute-force ranking over Python sets.
+
+Uses the Zipf-distributed corpus of eval_scoring.py.
+
+Run from the backend directory:
+    python benchmarks/bench_coverage.py --recipes 1000000
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "model"))
+
+import train
+from artifact import ingredient_names
+from eval_scoring import STAPLES, generate
+from normalize import ingredient_name
+from segments import load_model
+
+
+def brute_force(recipe_sets, pantry, scores, k):
+    """(missing count, -score, -id) for every recipe using a pantry ingredient, best k."""
+    ranked = sorted((len(ingredients - pantry), -scores[i], -i) for i, ingredients in enumerate(recipe_sets)
+                    if ingredients & pantry)
+    return [-i for _, _, i in ranked[:k]]
+
+
+def percentile(times, q):
+    return float(np.percentile(times, q)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipes", type=int, default=1_000_000)
+    parser.add_argument("--ingredients", type=int, default=5_000)
+    parser.add_argument("--pantry-sizes", type=int, nargs="+", default=[5, 20, 50])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--check", type=int, default=3, help="queries per pantry size checked against brute force")
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        recipes_path = os.path.join(tmp, "recipes.json")
+        generate(recipes_path, args.recipes, args.ingredients, rng)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            train.train(recipes_path, os.path.join(tmp, "artifact"))
+        print(f"{args.recipes} recipes, trained in {time.perf_counter() - start:.1f} s")
+        recipe_sets = [ingredient_names(recipe) for recipe in train.iter_recipes(recipes_path)] if args.check else []
+
+        model = load_model(os.path.join(tmp, "artifact"))
+        names = [f"Zutat{i}" for i in range(args.ingredients)]
+        print(f"{'pantry':>7} {'coverage p50':>13} {'p99':>8} {'similarity p50':>15} {'p99':>8}  brute force")
+        for size in args.pantry_sizes:
+            coverage_times, similarity_times, checked = [], [], True
+            for query in range(args.queries):
+                pantry = STAPLES[:3] + rng.sample(names[:size * 20], size - 3)
+                start = time.perf_counter()
+                pantry_ids = model.pantry_ids(ingredient_name(name) for name in pantry)
+                vector = model.vectorize([", ".join(pantry)])
+                ids, missing, _ = model.search_coverage(vector, pantry_ids, args.top_n)
+                model.missing_ingredients(ids, pantry_ids)
+                coverage_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                model.search(model.vectorize([", ".join(pantry)]), args.top_n)
+                similarity_times.append(time.perf_counter() - start)
+
+                if query < args.check:
+                    scores = model.segments[0].engine.score(vector)
+                    expected = brute_force(recipe_sets, {ingredient_name(name) for name in pantry}, scores, args.top_n)
+                    checked &= ids.tolist() == expected
+            print(f"{size:>7} {percentile(coverage_times, 50):>10.2f} ms {percentile(coverage_times, 99):>5.2f} ms "
+                  f"{percentile(similarity_times, 50):>12.2f} ms {percentile(similarity_times, 99):>5.2f} ms  "
+                  f"{'identical' if checked else 'DIFFERENT'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Latency of filtered searches (model/filters.py) against filtering after
+scoring, on the Zipf-distributed corpus of eval_scoring.py with Weekday,
+Month and Day fields like the real recipes.json.
+
+"pushed down" is SegmentedModel.search with a recipe filter: the filter
+becomes a boolean mask first, and only allowed recipes are scored. "after
+scoring" scores the whole catalog and drops the recipes outside the mask
+before the top k, the cheapest way to filter on the result side. Both
+rankings are compared for every query.
+
+Run from the backend directory:
+    python benchmarks/bench_filters.py --recipes 1000000
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "model"))
+
+import train
+from engine import top_k
+from eval_scoring import STAPLES, generate
+from filters import RecipeFilter
+from normalize import normalize_tokens
+from segments import load_model
+
+WEEKDAYS = ["Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag", "Samstag", "Sonntag"]
+MONTHS = ["Januar", "Februar", "März", "April", "Mai", "Juni", "Juli", "August", "September", "Oktober",
+          "November", "Dezember"]
+
+FILTERS = {
+    "none": RecipeFilter(),
+    "exclude 2 staples": RecipeFilter(exclude=[term for name in STAPLES[:2] for term in normalize_tokens(name)]),
+    "max 5 ingredients": RecipeFilter(max_ingredients=5),
+    "Weekday": RecipeFilter(categories={"Weekday": ["Sonntag"]}),
+    "Weekday + Month": RecipeFilter(categories={"Weekday": ["Sonntag"], "Month": ["Mai"]}),
+    "require Zutat50": RecipeFilter(require=["zutat50"]),
+    "require + Day": RecipeFilter(require=["zutat50"], categories={"Day": [1]}),
+}
+
+
+def calendar_fields(rng):
+    return {"Day": rng.randint(1, 28), "Month": rng.choice(MONTHS), "Weekday": rng.choice(WEEKDAYS)}
+
+
+def after_scoring(model, vector, masks, k):
+    """Scores every recipe, then drops the ones outside the masks."""
+    segment = model.segments[0]
+    scores = segment.engine.score(vector)
+    rows = np.flatnonzero(masks[0])
+    return rows[top_k(scores[rows], k, ids=rows)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipes", type=int, default=1_000_000)
+    parser.add_argument("--ingredients", type=int, default=5_000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(13)
+    with tempfile.TemporaryDirectory() as tmp:
+        recipes_path = os.path.join(tmp, "recipes.json")
+        generate(recipes_path, args.recipes, args.ingredients, rng, calendar_fields)
+        with contextlib.redirect_stdout(io.StringIO()):
+            train.train(recipes_path, os.path.join(tmp, "artifact"))
+        os.remove(recipes_path)
+        model = load_model(os.path.join(tmp, "artifact"))
+        print(f"{args.recipes} recipes, categorical fields {model.categories}")
+
+        queries = [", ".join(STAPLES[:3] + [f"Zutat{rng.randrange(200)}" for _ in range(3)]) for _ in range(args.queries)]
+        vectors = [model.vectorize([query]) for query in queries]
+        print(f"{'filter':<18} {'recipes left':>12} {'mask ms':>8} {'pushed down ms':>15} {'after scoring ms':>17}  same")
+        for label, recipe_filter in FILTERS.items():
+            start = time.perf_counter()
+            masks = model.filter_masks(recipe_filter)
+            mask_ms = (time.perf_counter() - start) * 1000
+            pushed, after, same = [], [], True
+            for vector in vectors:
+                start = time.perf_counter()
+                ids, _ = model.search(vector, args.k, recipe_filter=recipe_filter)
+                pushed.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                expected = after_scoring(model, vector, model.filter_masks(recipe_filter), args.k)
+                after.append(time.perf_counter() - start)
+                same &= np.array_equal(ids, expected)
+            print(f"{label:<18} {int(masks[0].sum()):>12} {mask_ms:>8.2f} {np.median(pushed) * 1000:>15.2f} "
+                  f"{np.median(after) * 1000:>17.2f}  {same}")
+
+
+if __name__ == "__main__":
+    main()
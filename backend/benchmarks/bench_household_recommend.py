@@ -0,0 +1,63 @@
+"""
+Cost of a repeated household recommendation view for a pantry of --items
+ingredients: scoring from scratch, recommend() with a result cache hit
+(canonicalizes the pantry on every call), and recommend_for_household()
+with the memo keyed on the household's ingredients_version.
+
+Needs a trained model artifact (python model/train.py recipes.json).
+
+Run from the backend directory:
+    python benchmarks/bench_household_recommend.py --items 200
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "model"))
+os.environ.setdefault("MODEL_WATCH_INTERVAL", "0")
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import predict
+
+
+def timed(fn, views):
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for _ in range(views):
+            result = fn()
+    return (time.perf_counter() - start) / views * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--views", type=int, default=500)
+    parser.add_argument("--top-n", type=int, default=5)
+    args = parser.parse_args()
+
+    snapshot = predict.registry.current()
+    if snapshot is None:
+        sys.exit("No model loaded, train one first")
+    words = snapshot.model.vocabulary.terms[:args.items]
+    pantry = [word.capitalize() for word in words]
+
+    def uncached():
+        predict.result_cache.clear()
+        return predict.recommend(pantry, args.top_n)
+
+    scratch_ms, expected = timed(uncached, max(args.views // 10, 1))
+    cached_ms, cached = timed(lambda: predict.recommend(pantry, args.top_n), args.views)
+    memo_ms, memoized = timed(lambda: predict.recommend_for_household("bench", 1, pantry, args.top_n), args.views)
+
+    print(f"{len(pantry)} ingredients, {args.views} views")
+    print(f"  scoring every view     {scratch_ms:>8.3f} ms/view")
+    print(f"  result cache hit       {cached_ms:>8.3f} ms/view")
+    print(f"  household memo hit     {memo_ms:>8.3f} ms/view")
+    print(f"  same results: {expected == cached == memoized}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Firestore round-trips and latency of the household reads one page view
+makes (ingredients, admin check, household users), reading the document
+directly every time vs through the cached HouseholdRepository.
+
+Runs against the in-memory fake with a simulated network latency, or
+against the Firestore emulator with --emulator (needs FIRESTORE_EMULATOR_HOST).
+
+Run from the backend directory:
+    python benchmarks/bench_households.py --views 200 --latency 0.01
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from api.households.repository import HOUSEHOLDS_COLLECTION, HouseholdRepository
+from fake_firestore import FakeAsyncFirestore
+
+READS_PER_VIEW = 3
+
+
+async def page_view_direct(db, household_id):
+    for _ in range(READS_PER_VIEW):
+        (await db.collection(HOUSEHOLDS_COLLECTION).document(household_id).get()).to_dict()
+
+
+async def page_view_cached(repository, household_id):
+    for _ in range(READS_PER_VIEW):
+        await repository.get(household_id)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--views", type=int, default=200)
+    parser.add_argument("--households", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.01, help="simulated round-trip time of the fake, seconds")
+    parser.add_argument("--emulator", action="store_true", help="use the Firestore emulator instead of the fake")
+    args = parser.parse_args()
+
+    if args.emulator:
+        from google.cloud import firestore
+        db = firestore.AsyncClient(project="demo-recipes")
+        listen_db = firestore.Client(project="demo-recipes")
+    else:
+        db = FakeAsyncFirestore(latency=args.latency)
+        listen_db = db.sync
+
+    household_ids = []
+    for i in range(args.households):
+        reference = db.collection(HOUSEHOLDS_COLLECTION).document()
+        await reference.set({"name": f"Haushalt {i}", "owner": "u0", "admins": [], "members": [], "users": ["u0"],
+                             "ingredients": [{"name": f"Zutat {j}"} for j in range(50)]})
+        household_ids.append(reference.id)
+
+    repository = HouseholdRepository(db, ttl=30)
+    for name, view, target in (("direct", page_view_direct, db), ("repository", page_view_cached, repository)):
+        before = getattr(db, "round_trips", None)
+        start = time.perf_counter()
+        for i in range(args.views):
+            await view(target, household_ids[i % len(household_ids)])
+        elapsed = time.perf_counter() - start
+        trips = f"{(db.round_trips - before) / args.views:.2f}" if before is not None else "n/a"
+        print(f"  {name:<11} {elapsed / args.views * 1000:>7.2f} ms/view  {trips} round-trips/view")
+
+    # Write-through: the cached copy changes with the write, without another read
+    household_id = household_ids[0]
+    ingredients = (await repository.get(household_id))["ingredients"] + [{"name": "Safran"}]
+    await repository.update(household_id, {"ingredients": ingredients})
+    cached = (await repository.get(household_id))["ingredients"]
+    stored = (await db.collection(HOUSEHOLDS_COLLECTION).document(household_id).get()).to_dict()["ingredients"]
+    print(f"  write-through consistent: {cached == stored}")
+
+    # Listeners: a write that does not go through this repository still shows up
+    listening = HouseholdRepository(db, ttl=30, listen_db=listen_db)
+    await listening.get(household_id)
+    await db.collection(HOUSEHOLDS_COLLECTION).document(household_id).update({"name": "Umbenannt"})
+    await asyncio.sleep(0.5 if args.emulator else 0)
+    print(f"  listener picked up outside write: {(await listening.get(household_id))['name'] == 'Umbenannt'}")
+    print(f"  {repository.status()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
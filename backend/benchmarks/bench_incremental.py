@@ -0,0 +1,128 @@
+"""
+Checks incremental updates (model/update.py) against full retrains and
+compares their cost.
+
+A base model is trained on part of a generated corpus, then new and
+changed recipes are added as two delta segments. The script checks that:
+  - before compaction, base + deltas return the same recipes as a full
+    retrain on the equivalent corpus
+  - after compaction, the artifact is byte-for-byte identical to that full
+    retrain (apart from the manifest timestamp)
+
+Run from the backend directory:
+    python benchmarks/bench_incremental.py --recipes 50000 --updates 500
+"""
+import argparse
+import contextlib
+import filecmp
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "model"))
+
+from bench_train import UNITS, WORDS
+from segments import load_model
+from train import train
+from update import apply_update, compact
+
+
+def recipe(i, rng, version=0):
+    ingredients = [f"{rng.randint(1, 500)} {rng.choice(UNITS)} {rng.choice(WORDS)}{rng.randint(0, 3000)}"
+                   for _ in range(rng.randint(3, 12))]
+    return {"Url": f"https://example.org/rezept/{i}", "Name": f"Rezept {i} v{version}", "Ingredients": ingredients,
+            "Instructions": "Alles vermengen und kochen. " * rng.randint(1, 10)}
+
+
+def write_jsonl(path, recipes):
+    with open(path, "w", encoding="utf-8") as f:
+        for item in recipes:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+
+def quiet(fn, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipes", type=int, default=50_000)
+    parser.add_argument("--updates", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    base = [recipe(i, rng) for i in range(args.recipes)]
+    # Two update batches: new recipes, changed recipes (same Url) and unchanged copies
+    batches = []
+    next_id = args.recipes
+    for _ in range(2):
+        batch = [recipe(next_id + i, rng) for i in range(args.updates)]
+        next_id += args.updates
+        batch += [recipe(i, rng, version=1) for i in rng.sample(range(args.recipes), args.updates // 10)]
+        batch += [base[i] for i in rng.sample(range(args.recipes), args.updates // 10)]
+        batches.append(batch)
+
+    # The corpus a full retrain sees: live base recipes in order, then the delta recipes in order
+    corpus = {item["Url"]: item for item in base}
+    for batch in batches:
+        for item in batch:
+            if corpus.get(item["Url"]) != item:
+                corpus.pop(item["Url"], None)
+                corpus[item["Url"]] = item
+
+    with tempfile.TemporaryDirectory() as tmp:
+        artifact, full = os.path.join(tmp, "artifact"), os.path.join(tmp, "full")
+        write_jsonl(os.path.join(tmp, "base.jsonl"), base)
+        write_jsonl(os.path.join(tmp, "corpus.jsonl"), corpus.values())
+        quiet(train, os.path.join(tmp, "base.jsonl"), artifact)
+
+        update_seconds = []
+        for i, batch in enumerate(batches):
+            write_jsonl(os.path.join(tmp, f"batch{i}.jsonl"), batch)
+            start = time.perf_counter()
+            quiet(apply_update, artifact, os.path.join(tmp, f"batch{i}.jsonl"))
+            update_seconds.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        quiet(train, os.path.join(tmp, "corpus.jsonl"), full)
+        retrain_seconds = time.perf_counter() - start
+
+        segmented, retrained = load_model(artifact), load_model(full)
+        assert segmented.n_recipes == retrained.n_recipes
+        words = sorted({token for item in batches[0] for token in " ".join(item["Ingredients"]).lower().split()})
+        query_rng = random.Random(5)
+        same = 0
+        for _ in range(args.queries):
+            text = " ".join(query_rng.sample(words, 4))
+            a_ids, a_scores = segmented.search(segmented.vectorize([text]), 10)
+            b_ids, b_scores = retrained.search(retrained.vectorize([text]), 10)
+            a_urls = [record["Url"] for record in segmented.get(a_ids, ["Url"])]
+            b_urls = [record["Url"] for record in retrained.get(b_ids, ["Url"])]
+            same += a_urls == b_urls and np.allclose(a_scores, b_scores)
+
+        start = time.perf_counter()
+        quiet(compact, artifact)
+        compact_seconds = time.perf_counter() - start
+
+        files = sorted(os.listdir(full))
+        different = [f for f in files if f != "manifest.json" and not filecmp.cmp(
+            os.path.join(artifact, f), os.path.join(full, f), shallow=False)]
+
+    print(f"{args.recipes} base recipes, 2 updates of {len(batches[0])} recipes each")
+    print(f"  update:       {' / '.join(f'{s:.2f} s' for s in update_seconds)}")
+    print(f"  full retrain: {retrain_seconds:.2f} s")
+    print(f"  compaction:   {compact_seconds:.2f} s")
+    print(f"  base + deltas match full retrain: {same}/{args.queries} queries")
+    print(f"  compacted artifact identical to full retrain: {not different} {different or ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compares brute-force scoring of every recipe with the inverted index
+(MaxScore pruning) in ScoringEngine.search.
+
+Token frequencies follow a Zipf distribution like real ingredient lists, and
+the queries use rare tokens, so the number of matching recipes stays small
+while the catalog grows. Indexed latency should stay roughly flat.
+
+Run from the backend directory:
+    python benchmarks/bench_index.py --sizes 10000 100000 500000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "model"))
+
+from engine import ScoringEngine
+from index import InvertedIndex
+
+
+def zipf_matrix(n_recipes, n_features, ingredients_per_recipe, rng):
+    # Term ids drawn from a Zipf distribution: term 0 is "salt", the tail is rare
+    ranks = np.arange(1, n_features + 1)
+    probabilities = 1.0 / ranks
+    probabilities /= probabilities.sum()
+    rows = np.repeat(np.arange(n_recipes), ingredients_per_recipe)
+    cols = rng.choice(n_features, size=rows.size, p=probabilities)
+    X = csr_matrix((np.ones(rows.size, dtype=np.int64), (rows, cols)), shape=(n_recipes, n_features))
+    X.sum_duplicates()
+    return X
+
+
+def queries_for(n_queries, n_features, tokens_per_query, rng):
+    queries = []
+    for _ in range(n_queries):
+        # Half common tokens, half from the long tail
+        cols = np.unique(np.concatenate([
+            rng.integers(0, 50, size=tokens_per_query // 2),
+            rng.integers(n_features // 2, n_features, size=tokens_per_query - tokens_per_query // 2),
+        ]))
+        queries.append(csr_matrix((np.ones(cols.size, dtype=np.int64), (np.zeros(cols.size, dtype=np.int64), cols)),
+                                  shape=(1, n_features)))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 300_000])
+    parser.add_argument("--features", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-n", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    print(f"{'recipes':>10} {'brute ms':>10} {'index ms':>10} {'speedup':>8}  identical")
+    for size in args.sizes:
+        X = zipf_matrix(size, args.features, 10, rng)
+        queries = queries_for(args.queries, args.features, 4, rng)
+
+        brute = ScoringEngine(X)
+        indexed = ScoringEngine(brute.matrix, normalized=True, index=InvertedIndex.from_matrix(brute.matrix))
+
+        start = time.perf_counter()
+        brute_results = [brute.search(query, args.top_n) for query in queries]
+        brute_time = (time.perf_counter() - start) / len(queries)
+
+        start = time.perf_counter()
+        indexed_results = [indexed.search(query, args.top_n) for query in queries]
+        indexed_time = (time.perf_counter() - start) / len(queries)
+
+        identical = all(
+            np.array_equal(a_ids, b_ids) and np.array_equal(a_scores, b_scores)
+            for (a_ids, a_scores), (b_ids, b_scores) in zip(brute_results, indexed_results)
+        )
+        print(f"{size:>10} {brute_time * 1000:>10.2f} {indexed_time * 1000:>10.2f} "
+              f"{brute_time / indexed_time:>7.1f}x  {identical}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+GET /households/joined: the old full collection scan (stream every
+household, filter on `users` in Python) against the array_contains query
+with a field projection used by HouseholdRepository.joined(), on the
+in-memory fake seeded with --households households.
+
+Run from the backend directory:
+    python benchmarks/bench_joined.py --households 100000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from api.households.repository import HOUSEHOLDS_COLLECTION, HouseholdRepository
+from fake_firestore import FakeAsyncFirestore
+
+
+async def joined_scan(db, user_id):
+    """The previous implementation of get_joined_households."""
+    joined = []
+    async for doc in db.collection(HOUSEHOLDS_COLLECTION).stream():
+        data = doc.to_dict()
+        if user_id in data.get("users", []):
+            joined.append({"id": doc.id, "name": data.get("name", "Unnamed Household")})
+    return joined
+
+
+def seed(db, n_households, n_users, rng):
+    """Writes straight into the synchronous fake, no event loop needed."""
+    batch = db.batch()
+    for i in range(n_households):
+        users = rng.sample(range(n_users), rng.randint(1, 5))
+        batch.set(db.collection(HOUSEHOLDS_COLLECTION).document(f"h{i:07d}"), {
+            "name": f"Haushalt {i}",
+            "owner": f"u{users[0]}",
+            "admins": [],
+            "members": [f"u{user}" for user in users[1:]],
+            "users": [f"u{user}" for user in users],
+            "ingredients": [{"name": f"Zutat {rng.randint(0, 500)}"} for _ in range(rng.randint(0, 40))],
+        })
+        if (i + 1) % 500 == 0:
+            batch.commit()
+    batch.commit()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--households", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    db = FakeAsyncFirestore()
+    start = time.perf_counter()
+    seed(db.sync, args.households, args.users, rng)
+    print(f"Seeded {args.households} households in {time.perf_counter() - start:.1f} s")
+
+    repository = HouseholdRepository(db)
+    user_ids = [f"u{rng.randrange(args.users)}" for _ in range(args.queries)]
+
+    # The scan is slow, a few queries are enough to time it
+    scan_ids = user_ids[:5]
+    start = time.perf_counter()
+    expected = [await joined_scan(db, user_id) for user_id in scan_ids]
+    scan_ms = (time.perf_counter() - start) / len(scan_ids) * 1000
+
+    start = time.perf_counter()
+    results = [await repository.joined(user_id) for user_id in user_ids]
+    query_ms = (time.perf_counter() - start) / len(user_ids) * 1000
+
+    print(f"  full scan          {scan_ms:>9.2f} ms/request")
+    print(f"  array_contains     {query_ms:>9.3f} ms/request  ({scan_ms / query_ms:.0f}x faster)")
+    print(f"  same results: {results[:len(scan_ids)] == expected}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
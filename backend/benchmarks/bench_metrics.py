@@ -0,0 +1,171 @@
+"""
+Overhead of the latency histograms (metrics.py), on the Zipf-distributed
+corpus of eval_scoring.py.
+
+Per corpus size and for uncached and cached requests (the same pantry
+again, the cheapest requests there are):
+  - cost: what one request spends on instrumentation, from timing the
+    pieces it uses in a loop. An uncached request makes four laps (one of
+    them split into score and top_k), two top_k_seconds() calls, one call
+    through the timing wrapper of engine.top_k and the serialize Timer of
+    main.py; a cached request two laps and the Timer. Relative to the median
+    latency of predict.recommend() and of POST /recommend through the app
+    (in-process, without a network, so the smallest latency a client sees).
+  - A/B: recommend() with the real stage timings against recommend() with
+    predict.Stages replaced by one that records nothing, alternating call by
+    call. The median of the paired differences, relative to the untimed
+    median. This is the direct measurement, but on a busy machine its noise
+    is larger than the overhead; the cost above is the stable number.
+
+Run from the backend directory:
+    python benchmarks/bench_metrics.py --recipes 10000 1000000
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "model"))
+
+import engine
+import metrics
+import train
+from eval_scoring import STAPLES, generate
+
+
+class NullStages:
+    """Stands in for metrics.Stages without recording anything."""
+
+    def __init__(self, histogram, mode):
+        pass
+
+    def lap(self, stage, part=None, part_seconds=0.0):
+        pass
+
+
+def paired(predict, queries, cached, rounds):
+    """Median latency of timed and untimed recommend() calls and the median of their paired differences."""
+    timed, untimed, differences = [], [], []
+    for round_ in range(rounds):
+        for i, query in enumerate(queries):
+            pair = {}
+            # The second call of a pair finds the recipes in the CPU caches, so each goes first half of the time
+            order = (metrics.Stages, NullStages) if (round_ + i) % 2 else (NullStages, metrics.Stages)
+            for stages in order:
+                predict.Stages = stages
+                if not cached:
+                    predict.result_cache.clear()
+                start = time.perf_counter()
+                predict.recommend(query, 10, ["Name"])
+                pair[stages] = time.perf_counter() - start
+            timed.append(pair[metrics.Stages])
+            untimed.append(pair[NullStages])
+            differences.append(pair[metrics.Stages] - pair[NullStages])
+    predict.Stages = metrics.Stages
+    return statistics.median(timed), statistics.median(untimed), statistics.median(differences)
+
+
+def http_latency(app, predict, queries, cached, rounds):
+    """Median latency of POST /recommend through the app, in-process."""
+    import httpx
+
+    async def run():
+        result = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for _ in range(rounds):
+                for query in queries:
+                    if not cached:
+                        predict.result_cache.clear()
+                    start = time.perf_counter()
+                    response = await client.post("/recommend", json={"ingredients": query, "top_n": 10, "fields": ["Name"]})
+                    result.append(time.perf_counter() - start)
+                    response.raise_for_status()
+        return statistics.median(result)
+
+    return asyncio.run(run())
+
+
+def instrumentation_seconds():
+    """
+    Seconds an uncached and a cached recommend() call spend on instrumentation,
+    measured piece by piece, and the seconds of main.py's serialize Timer.
+    """
+    histogram = metrics.Histogram("bench_seconds", "Benchmark only.", ("mode", "stage"))
+    stages = metrics.Stages(histogram, "similarity")
+    number = 200_000
+
+    def each(statement, globals_):
+        return min(timeit.repeat(statement, globals=globals_, number=number, repeat=5)) / number
+
+    create = each('Stages(histogram, "similarity")', {"Stages": metrics.Stages, "histogram": histogram})
+    lap = each('stages.lap("cache")', {"stages": stages})
+    split_lap = each('stages.lap("score", "top_k", 0.0001)', {"stages": stages})
+    top_k_seconds = each("top_k_seconds()", {"top_k_seconds": engine.top_k_seconds})
+    timer = each('with histogram.time("similarity", "serialize"): pass', {"histogram": histogram})
+    scores = np.random.default_rng(0).random(2_000)
+    wrapper = (each("top_k(scores, 10)", {"top_k": engine.top_k, "scores": scores})
+               - each("_top_k(scores, 10, None)", {"_top_k": engine._top_k, "scores": scores}))
+    # Inside recommend(), and the serialize Timer of main.py on top for a request through the app
+    uncached = create + 3 * lap + split_lap + 2 * top_k_seconds + max(wrapper, 0.0)
+    cached = create + 2 * lap
+    return uncached, cached, timer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipes", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--ingredients", type=int, default=5_000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    uncached_cost, cached_cost, timer = instrumentation_seconds()
+    costs = {"uncached": uncached_cost, "cached": cached_cost}
+    for label, cost in costs.items():
+        print(f"instrumentation per {label} request: {cost * 1e6:.2f} us in recommend(), {(cost + timer) * 1e6:.2f} us in total")
+
+    # main.py sets up logging like a worker (LOG_LEVEL, default INFO), its load_predict() loads every corpus' model
+    import main as app_main
+    # httpx logs every request at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    for n_recipes in args.recipes:
+        rng = random.Random(19)
+        with tempfile.TemporaryDirectory() as tmp:
+            recipes_path = os.path.join(tmp, "recipes.json")
+            generate(recipes_path, n_recipes, args.ingredients, rng)
+            with contextlib.redirect_stdout(io.StringIO()):
+                train.train(recipes_path, os.path.join(tmp, "artifact"))
+            os.remove(recipes_path)
+            os.environ["MODEL_ARTIFACT_PATH"] = os.path.join(tmp, "artifact")
+            os.environ["MODEL_WATCH_INTERVAL"] = "0"
+            app_main.load_predict()
+            predict = app_main.predict
+            queries = [STAPLES[:2] + [f"Zutat{rng.randrange(500)}" for _ in range(4)] for _ in range(args.queries)]
+
+            print(f"{n_recipes} recipes")
+            print(f"  {'request':<9} {'recommend ms':>13} {'cost':>7} {'HTTP ms':>8} {'cost':>7} {'A/B':>8}")
+            for label, cached in (("uncached", False), ("cached", True)):
+                paired(predict, queries, cached, 1)
+                timed, untimed, difference = paired(predict, queries, cached, args.rounds)
+                http = http_latency(app_main.app, predict, queries, cached, args.rounds)
+                cost = costs[label]
+                print(f"  {label:<9} {untimed * 1000:>13.3f} {cost / untimed:>7.2%} {http * 1000:>8.3f} "
+                      f"{(cost + timer) / http:>7.2%} {difference / untimed:>+8.2%}")
+            app_main.predict = None
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+What ingredient normalization (model/normalize.py) does to the model: the
+number of terms and ingredient names, and the non-zeros of the count
+matrix, with the normalized terms against the plain lowercase tokens used
+before. Also reports tokenization throughput and the cost of normalizing a
+pantry, cold and memoized.
+
+Uses a generated corpus where every ingredient is written in several ways
+(plurals, regional and English names, preparation words), or any recipes
+file with --recipes.
+
+Run from the backend directory:
+    python benchmarks/bench_normalize.py --recipes-count 200000
+    python benchmarks/bench_normalize.py --recipes model/recipes.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from scipy.sparse import csr_matrix
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "model"))
+
+import normalize
+import train
+
+# Ways recipes write the same ingredient
+VARIANTS = [
+    ["Tomate", "Tomaten", "Paradeiser", "gehackte Tomaten", "tomatoes", "Roma tomatoes"],
+    ["Kartoffel", "Kartoffeln", "Erdäpfel", "potatoes", "kleine Kartoffeln"],
+    ["Zwiebel", "Zwiebeln", "onions", "rote Zwiebel", "fein gehackte Zwiebeln"],
+    ["Karotte", "Karotten", "Möhren", "Mohrrüben", "carrots"],
+    ["Knoblauch", "Knoblauchzehen", "garlic", "frischer Knoblauch"],
+    ["Ei", "Eier", "eggs", "große Eier"],
+    ["Sahne", "Schlagobers", "Obers", "cream"],
+    ["Hackfleisch", "Faschiertes", "Hack"],
+    ["Lauch", "Porree", "leeks"],
+    ["Champignon", "Champignons", "frische Champignons"],
+    ["Paprika", "Paprikas", "rote Paprika"],
+    ["Apfel", "Äpfel", "apples"],
+    ["Salz", "salt", "etwas Salz"],
+    ["Pfeffer", "pepper", "Pfeffer nach Belieben"],
+    ["Mehl", "flour"],
+    ["Zucker", "sugar"],
+    ["Butter", "Butter"],
+    ["Milch", "milk"],
+]
+UNITS = ["g", "kg", "ml", "EL", "TL", "Prise", "Stück", "cups", "tbsp", "Dose"]
+
+
+def generate(path, n_recipes, rng):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i in range(n_recipes):
+            lines = [f"{rng.randint(1, 500)} {rng.choice(UNITS)} {rng.choice(forms)}"
+                     for forms in rng.sample(VARIANTS, rng.randint(3, 10))]
+            recipe = {"Url": f"https://example.org/rezept/{i}", "Name": f"Rezept {i}", "Ingredients": lines,
+                      "Instructions": "Alles vermengen und kochen."}
+            f.write(("," if i else "") + json.dumps(recipe, ensure_ascii=False))
+        f.write("]")
+
+
+def previous_name(line):
+    """Ingredient names before normalization: the lowercase tokens after leading quantities and units."""
+    tokens = normalize.tokenize(line)
+    start = 0
+    while start < len(tokens) - 1 and (tokens[start] in normalize.UNIT_WORDS or any(c.isdigit() for c in tokens[start])):
+        start += 1
+    return " ".join(tokens[start:])
+
+
+def count_matrix(documents, analyzer):
+    """(number of terms, non-zeros) of the recipes x terms count matrix, and the seconds it took."""
+    start = time.perf_counter()
+    terms, indices, indptr = {}, [], [0]
+    for text in documents:
+        row = {terms.setdefault(term, len(terms)) for term in analyzer(text)}
+        indices.extend(row)
+        indptr.append(len(indices))
+    seconds = time.perf_counter() - start
+    matrix = csr_matrix(([1] * len(indices), indices, indptr), shape=(len(documents), len(terms)))
+    return len(terms), matrix.nnz, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipes", help="recipes file to measure, instead of a generated one")
+    parser.add_argument("--recipes-count", type=int, default=200_000, help="size of the generated corpus")
+    parser.add_argument("--pantry", type=int, default=200, help="entries of the normalized pantry")
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    with tempfile.TemporaryDirectory() as tmp:
+        recipes_path = args.recipes
+        if recipes_path is None:
+            recipes_path = os.path.join(tmp, "recipes.json")
+            generate(recipes_path, args.recipes_count, rng)
+        recipes = list(train.iter_recipes(recipes_path))
+    lines = [line for recipe in recipes for line in recipe.get("Ingredients") or []]
+    documents = [", ".join(recipe.get("Ingredients") or []) for recipe in recipes]
+    print(f"{len(recipes)} recipes, {len(lines)} ingredient lines")
+
+    raw_terms, raw_nnz, raw_seconds = count_matrix(documents, normalize.tokenize)
+    terms, nnz, seconds = count_matrix(documents, normalize.normalize_tokens)
+    raw_names = len({previous_name(line) for line in lines})
+    normalize.ingredient_name.cache_clear()
+    names = len({normalize.ingredient_name(line) for line in lines})
+
+    print(f"{'':<18} {'tokens':>10} {'normalized':>11} {'change':>8}")
+    for label, before, after in (("terms", raw_terms, terms), ("matrix non-zeros", raw_nnz, nnz),
+                                 ("ingredient names", raw_names, names)):
+        print(f"{label:<18} {before:>10} {after:>11} {(after - before) / max(before, 1):>+8.1%}")
+    print(f"{'recipes/s':<18} {len(documents) / raw_seconds:>10.0f} {len(documents) / seconds:>11.0f}")
+
+    pantry = rng.sample(sorted(set(lines)), min(args.pantry, len(set(lines))))
+    normalize.ingredient_name.cache_clear()
+    start = time.perf_counter()
+    [normalize.ingredient_name(entry) for entry in pantry]
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    [normalize.ingredient_name(entry) for entry in pantry]
+    warm = time.perf_counter() - start
+    print(f"pantry of {len(pantry)}: {cold * 1000:.3f} ms to normalize, {warm * 1000:.3f} ms memoized")
+
+
+if __name__ == "__main__":
+    main()
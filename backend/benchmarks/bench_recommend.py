@@ -0,0 +1,77 @@
+"""
+Compares the old /recommend scoring path (cosine_similarity + full argsort)
+with the ScoringEngine (pre-normalized matrix + argpartition top-k).
+
+Run from the backend directory:
+    python benchmarks/bench_recommend.py --sizes 10000 100000 500000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.sparse import random as sparse_random
+from sklearn.metrics.pairwise import cosine_similarity
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "model"))
+
+from engine import ScoringEngine
+
+
+def synthetic_matrix(n_recipes, n_features, ingredients_per_recipe, rng):
+    # Integer token counts, like CountVectorizer output
+    density = ingredients_per_recipe / n_features
+    X = sparse_random(n_recipes, n_features, density=density, format="csr", random_state=rng,
+                      data_rvs=lambda size: rng.integers(1, 4, size=size))
+    return X.astype(np.int64)
+
+
+def synthetic_queries(n_queries, n_features, tokens_per_query, rng):
+    return [sparse_random(1, n_features, density=tokens_per_query / n_features, format="csr", random_state=rng,
+                          data_rvs=lambda size: np.ones(size)).astype(np.int64) for _ in range(n_queries)]
+
+
+def legacy_search(query, X, top_n):
+    similarity_scores = cosine_similarity(query, X)[0]
+    top_indices = np.argsort(similarity_scores, kind="stable")[::-1][:top_n]
+    return top_indices, similarity_scores[top_indices]
+
+
+def timed(fn, queries, *args):
+    start = time.perf_counter()
+    results = [fn(query, *args) for query in queries]
+    return (time.perf_counter() - start) / len(queries), results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 300_000])
+    parser.add_argument("--features", type=int, default=5_000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-n", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"{'recipes':>10} {'legacy ms':>10} {'engine ms':>10} {'speedup':>8}  identical")
+    for size in args.sizes:
+        X = synthetic_matrix(size, args.features, 10, rng)
+        queries = synthetic_queries(args.queries, args.features, 4, rng)
+
+        build_start = time.perf_counter()
+        engine = ScoringEngine(X)
+        build_time = time.perf_counter() - build_start
+
+        legacy_time, legacy_results = timed(legacy_search, queries, X, args.top_n)
+        engine_time, engine_results = timed(engine.search, queries, args.top_n)
+
+        identical = all(
+            np.array_equal(a_ids, b_ids) and np.array_equal(a_scores, b_scores)
+            for (a_ids, a_scores), (b_ids, b_scores) in zip(legacy_results, engine_results)
+        )
+        print(f"{size:>10} {legacy_time * 1000:>10.2f} {engine_time * 1000:>10.2f} "
+              f"{legacy_time / engine_time:>7.1f}x  {identical}  (one-off normalize: {build_time * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
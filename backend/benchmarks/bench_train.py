@@ -0,0 +1,98 @@
+"""
+Peak memory and throughput of the streaming trainer (model/train.py) against
+the previous in-memory pipeline (json.load + DataFrame + CountVectorizer),
+on a generated recipes file. Each variant runs in its own process so the
+peak RSS numbers do not influence each other. Both write an artifact, and the
+two are compared file by file.
+
+Run from the backend directory (Linux/macOS, needs the resource module):
+    python benchmarks/bench_train.py --recipes 200000
+"""
+import argparse
+import filecmp
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "model")
+
+IN_MEMORY = """
+import json, resource, sys, time
+sys.path.insert(0, {model_dir!r})
+import pandas as pd
+from sklearn.feature_extraction.text import CountVectorizer
+from artifact import TEXT_FIELDS, write_artifact
+from normalize import normalize_tokens
+start = time.perf_counter()
+with open({recipes!r}, encoding="utf-8") as f:
+    df = pd.DataFrame(json.load(f))
+lines = df["Ingredients"].tolist()
+df["Ingredients"] = df["Ingredients"].apply(lambda lst: ", ".join(lst))
+vectorizer = CountVectorizer(analyzer=normalize_tokens)
+X = vectorizer.fit_transform(df["Ingredients"])
+write_artifact({out!r}, list(vectorizer.get_feature_names_out()), X, {{f: df[f].tolist() for f in TEXT_FIELDS}},
+               recipe_ingredients=lines)
+print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+STREAMING = """
+import resource, sys, time, io, contextlib
+sys.path.insert(0, {model_dir!r})
+import train
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    train.train({recipes!r}, {out!r}, 10_000)
+print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+WORDS = ["Zwiebel", "Tomaten", "Knoblauch", "Salz", "Pfeffer", "Olivenöl", "Mehl", "Zucker", "Eier", "Butter",
+         "Milch", "Sahne", "Kartoffeln", "Karotten", "Paprika", "Reis", "Nudeln", "Käse", "Hackfleisch", "Basilikum"]
+UNITS = ["g", "kg", "ml", "EL", "TL", "Prise", "Stück"]
+
+
+def generate(path, n_recipes):
+    rng = random.Random(1)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i in range(n_recipes):
+            ingredients = [f"{rng.randint(1, 500)} {rng.choice(UNITS)} {rng.choice(WORDS)}{rng.randint(0, 2000)}"
+                           for _ in range(rng.randint(3, 15))]
+            recipe = {"Url": f"https://example.org/rezept/{i}", "Name": f"Rezept {i}", "Ingredients": ingredients,
+                      "Instructions": "Alles vermengen und kochen. " * rng.randint(5, 40)}
+            f.write(("," if i else "") + json.dumps(recipe, ensure_ascii=False))
+        f.write("]")
+
+
+def run(template, **kwargs):
+    output = subprocess.run([sys.executable, "-c", template.format(model_dir=MODEL_DIR, **kwargs)],
+                            check=True, capture_output=True, text=True).stdout.split()
+    seconds, max_rss = float(output[0]), int(output[1])
+    return seconds, max_rss / (1 << 20) if sys.platform == "darwin" else max_rss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipes", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        recipes = os.path.join(tmp, "recipes.json")
+        generate(recipes, args.recipes)
+        size_mb = os.path.getsize(recipes) / (1 << 20)
+        print(f"{args.recipes} recipes, {size_mb:.0f} MB of JSON")
+
+        for name, template in (("in-memory", IN_MEMORY), ("streaming", STREAMING)):
+            seconds, peak = run(template, recipes=recipes, out=os.path.join(tmp, name))
+            print(f"  {name:<10} {seconds:>6.1f} s  {args.recipes / seconds:>8.0f} recipes/s  peak RSS {peak:>6.0f} MB")
+
+        files = sorted(os.listdir(os.path.join(tmp, "in-memory")))
+        different = [f for f in files if f != "manifest.json" and not filecmp.cmp(
+            os.path.join(tmp, "in-memory", f), os.path.join(tmp, "streaming", f), shallow=False)]
+        print(f"  artifacts identical (except manifest timestamp): {not different} {different or ''}")
+
+
+if __name__ == "__main__":
+    main()
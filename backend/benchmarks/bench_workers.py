@@ -0,0 +1,172 @@
+"""
+Memory and startup time of the backend with several worker processes:
+`uvicorn main:app --workers N` against serve.py, for a generated model of
+--recipes recipes (eval_scoring.py's corpus).
+
+For every launcher and worker count it reports
+  - first request: seconds from starting the launcher to the first
+    successful POST /recommend
+  - all loaded: seconds until every worker has the model mapped
+  - RSS and USS (memory only this process uses) per worker, averaged over
+    the workers after every worker answered a few requests
+  - PSS of all processes together, the memory the whole server costs the
+    machine: pages shared by k processes count 1/k for each of them
+
+Memory comes from /proc/<pid>/smaps_rollup, so this only runs on Linux.
+Model files stay in the page cache between runs, so the startup times are
+warm-cache times for both launchers.
+
+Run from the backend directory, with Firebase credentials in ./firebase:
+    python benchmarks/bench_workers.py --recipes 1000000 --workers 1 4 16
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(BACKEND_DIR, "model"))
+
+import train
+from eval_scoring import STAPLES, generate
+
+STARTUP_TIMEOUT = 600
+
+
+def launcher_command(launcher, workers, port):
+    if launcher == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR, "--port", str(port),
+                "--workers", str(workers), "--log-level", "warning"]
+    return [sys.executable, os.path.join(BACKEND_DIR, "serve.py"), "--port", str(port), "--workers", str(workers),
+            "--log-level", "warning"]
+
+
+def children(pid):
+    """Pids of all descendants of pid."""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    # The command name may contain spaces, the fields after it do not
+                    parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (FileNotFoundError, ProcessLookupError):
+                pass
+    found, todo = [], [pid]
+    while todo:
+        parent = todo.pop()
+        for child, child_parent in parents.items():
+            if child_parent == parent:
+                found.append(child)
+                todo.append(child)
+    return found
+
+
+def maps_file(pid, name):
+    try:
+        with open(f"/proc/{pid}/maps") as f:
+            return name in f.read()
+    except (FileNotFoundError, ProcessLookupError):
+        return False
+
+
+def memory(pid):
+    """(RSS, PSS, USS) of a process in bytes."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return values["Rss"], values["Pss"], values["Private_Clean"] + values["Private_Dirty"]
+
+
+def recommend(url, ingredients):
+    # A new connection per request, so the kernel spreads them over the workers
+    response = httpx.post(f"{url}/recommend", json={"ingredients": ingredients, "top_n": 5}, timeout=60)
+    response.raise_for_status()
+    return response.json()["recommendations"]
+
+
+def measure(launcher, workers, port, artifact_path, rng):
+    env = {**os.environ, "MODEL_ARTIFACT_PATH": artifact_path, "MODEL_WATCH_INTERVAL": "0"}
+    url = f"http://127.0.0.1:{port}"
+    weights_file = os.path.join(artifact_path, "weights.npy")
+    start = time.perf_counter()
+    process = subprocess.Popen(launcher_command(launcher, workers, port), env=env, stdout=subprocess.DEVNULL)
+    try:
+        first_request = all_loaded = None
+        while first_request is None or all_loaded is None:
+            if time.perf_counter() - start > STARTUP_TIMEOUT or process.poll() is not None:
+                raise RuntimeError(f"{launcher} with {workers} workers did not start")
+            if first_request is None:
+                try:
+                    if recommend(url, STAPLES[:3]):
+                        first_request = time.perf_counter() - start
+                except httpx.HTTPError:
+                    pass
+            if all_loaded is None:
+                # uvicorn serves in the launcher process itself with one worker
+                loaded = [pid for pid in [process.pid] + children(process.pid) if maps_file(pid, weights_file)]
+                if len(loaded) == workers:
+                    all_loaded = time.perf_counter() - start
+            time.sleep(0.01)
+
+        for _ in range(8 * workers):
+            recommend(url, STAPLES[:2] + [f"Zutat{rng.randrange(300)}" for _ in range(4)])
+
+        processes = [process.pid] + children(process.pid)
+        worker_pids = [pid for pid in processes if maps_file(pid, weights_file)]
+        stats = {pid: memory(pid) for pid in processes}
+        rss = sum(stats[pid][0] for pid in worker_pids) / len(worker_pids)
+        uss = sum(stats[pid][2] for pid in worker_pids) / len(worker_pids)
+        pss = sum(pss for _, pss, _ in stats.values())
+        return first_request, all_loaded, rss, uss, pss
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipes", type=int, default=1_000_000)
+    parser.add_argument("--ingredients", type=int, default=5_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--launchers", nargs="+", default=["uvicorn", "serve.py"], choices=["uvicorn", "serve.py"])
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    rng = random.Random(17)
+    with tempfile.TemporaryDirectory() as tmp:
+        recipes_path = os.path.join(tmp, "recipes.json")
+        generate(recipes_path, args.recipes, args.ingredients, rng)
+        artifact_path = os.path.join(tmp, "artifact")
+        with contextlib.redirect_stdout(io.StringIO()):
+            train.train(recipes_path, artifact_path)
+        os.remove(recipes_path)
+        size = sum(os.path.getsize(os.path.join(artifact_path, name)) for name in os.listdir(artifact_path))
+        print(f"{args.recipes} recipes, model files {size / (1 << 20):.0f} MB, {os.cpu_count()} CPUs")
+
+        print(f"{'launcher':<9} {'workers':>7} {'first request s':>15} {'all loaded s':>12} "
+              f"{'RSS/worker MB':>13} {'USS/worker MB':>13} {'PSS total MB':>12}")
+        for workers in args.workers:
+            for launcher in args.launchers:
+                first_request, all_loaded, rss, uss, pss = measure(launcher, workers, args.port, artifact_path, rng)
+                print(f"{launcher:<9} {workers:>7} {first_request:>15.2f} {all_loaded:>12.2f} "
+                      f"{rss / (1 << 20):>13.1f} {uss / (1 << 20):>13.1f} {pss / (1 << 20):>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
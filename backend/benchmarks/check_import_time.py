@@ -0,0 +1,75 @@
+"""
+Import time budget of the backend. Imports main.py with `python -X importtime`
+and fails (exit code 1) if
+
+  - importing it takes longer than --budget milliseconds (median of --runs
+    fresh interpreters), or
+  - it imports any of the modules that main.py only loads in the background
+    or on first use: numpy, scipy, scikit-learn, pandas, firebase_admin, the
+    Google Cloud client libraries and predict.py with the model
+
+and prints the modules that took the longest. Runs without a model and
+without Firebase credentials.
+
+Run from the backend directory:
+    python benchmarks/check_import_time.py --budget 1000
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Top-level packages main.py must not import, see the lifespan in main.py and firebase.py
+DEFERRED = ["numpy", "scipy", "sklearn", "pandas", "firebase_admin", "google", "predict_module_name"]
+
+
+def import_times(module):
+    """{module: (self us, cumulative us)} for one import of module in a fresh interpreter."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=BACKEND_DIR,
+                            env={**os.environ, "MODEL_WATCH_INTERVAL": "0"}, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget", type=float, default=1000, help="milliseconds")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest modules to print")
+    args = parser.parse_args()
+
+    # The first run also writes the .pyc files, it does not count
+    import_times("main")
+    runs = [import_times("main") for _ in range(args.runs)]
+    total_ms = statistics.median(times["main"][1] for times in runs) / 1000
+
+    last = runs[-1]
+    print(f"{'module':<50} {'self ms':>8} {'cumulative ms':>14}")
+    for name, (own, cumulative) in sorted(last.items(), key=lambda item: -item[1][1])[:args.top]:
+        print(f"{name:<50} {own / 1000:>8.1f} {cumulative / 1000:>14.1f}")
+
+    failed = False
+    deferred = sorted({name for name in last if name.split(".")[0] in DEFERRED})
+    if deferred:
+        print(f"FAIL: main imports modules it should load lazily: {deferred}")
+        failed = True
+    if total_ms > args.budget:
+        print(f"FAIL: importing main took {total_ms:.0f} ms, the budget is {args.budget:.0f} ms")
+        failed = True
+    if not failed:
+        print(f"OK: importing main took {total_ms:.0f} ms (median of {args.runs}), budget {args.budget:.0f} ms")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
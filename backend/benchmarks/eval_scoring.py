@@ -0,0 +1,138 @@
+"""
+Offline evaluation of the scoring modes (count, tfidf, bm25, see
+model/scoring.py): ranking quality and latency of the same recipes trained
+in every mode.
+
+Quality is measured as known-item search, the way households use the
+recommender: a query is a few ingredients of one recipe plus the pantry
+staples everybody has (salt, pepper, oil, ...), and the recipe it was taken
+from should rank high. Reports recall@k (the recipe is in the top k) and
+MRR@k. Latency is per single query (search) and per query in a batch
+(search_many).
+
+Uses a generated corpus with Zipf-distributed ingredients by default, or
+any recipes file with --recipes.
+
+Run from the backend directory:
+    python benchmarks/eval_scoring.py --recipes-count 50000 --queries 1000
+    python benchmarks/eval_scoring.py --recipes model/recipes.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "model"))
+
+import train
+from normalize import tokenize
+from scoring import SCORING_MODES
+from segments import load_model
+
+STAPLES = ["Salz", "Pfeffer", "Olivenöl", "Wasser", "Zucker", "Butter"]
+UNITS = ["g", "kg", "ml", "EL", "TL", "Prise", "Stück"]
+
+
+def generate(path, n_recipes, n_ingredients, rng, extra_fields=None):
+    """
+    Recipes with Zipf-distributed ingredients, most of them also using a few staples.
+    extra_fields(rng) returns more fields for every recipe.
+    """
+    names = [f"Zutat{i}" for i in range(n_ingredients)]
+    weights = 1 / np.arange(1, n_ingredients + 1)
+    weights /= weights.sum()
+    np_rng = np.random.default_rng(rng.randrange(1 << 30))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i in range(n_recipes):
+            chosen = np_rng.choice(n_ingredients, size=rng.randint(3, 12), replace=False, p=weights)
+            ingredients = [names[j] for j in chosen] + [s for s in STAPLES if rng.random() < 0.6]
+            lines = [f"{rng.randint(1, 500)} {rng.choice(UNITS)} {name}" for name in ingredients]
+            recipe = {"Url": f"https://example.org/rezept/{i}", "Name": f"Rezept {i}", "Ingredients": lines,
+                      "Instructions": "Alles vermengen und kochen."}
+            if extra_fields is not None:
+                recipe.update(extra_fields(rng))
+            f.write(("," if i else "") + json.dumps(recipe, ensure_ascii=False))
+        f.write("]")
+
+
+def make_queries(recipes, n_queries, n_ingredients, rng):
+    """(query text, recipe id) pairs: some ingredient words of a recipe plus all staples."""
+    staples = [staple.lower() for staple in STAPLES]
+    queries = []
+    while len(queries) < n_queries:
+        recipe_id = rng.randrange(len(recipes))
+        # The ingredient word is the last one of a line, after the quantity and unit
+        words = [tokenize(line)[-1] for line in recipes[recipe_id]["Ingredients"] if tokenize(line)]
+        own = [word for word in words if word not in staples]
+        if len(own) < n_ingredients:
+            continue
+        queries.append((", ".join(rng.sample(own, n_ingredients) + staples), recipe_id))
+    return queries
+
+
+def evaluate(model, queries, k):
+    vectors = model.vectorize([text for text, _ in queries])
+    expected = np.array([recipe_id for _, recipe_id in queries])
+
+    start = time.perf_counter()
+    results = [model.search(vectors[i], k)[0] for i in range(vectors.shape[0])]
+    single_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+    start = time.perf_counter()
+    batched = model.search_many(vectors, k)
+    batch_ms = (time.perf_counter() - start) / len(queries) * 1000
+    assert all(np.array_equal(a, b) for a, b in zip(results, (ids for ids, _ in batched)))
+
+    ranks = np.array([np.flatnonzero(ids == target)[0] + 1 if target in ids else 0
+                      for ids, target in zip(results, expected)])
+    recall = {cutoff: float(np.mean((ranks > 0) & (ranks <= cutoff))) for cutoff in sorted({1, 5, k})}
+    mrr = float(np.mean(np.where(ranks > 0, 1 / np.maximum(ranks, 1), 0)))
+    return recall, mrr, single_ms, batch_ms
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipes", help="recipes file to evaluate on, instead of a generated one")
+    parser.add_argument("--recipes-count", type=int, default=50_000, help="size of the generated corpus")
+    parser.add_argument("--ingredients", type=int, default=5_000, help="distinct ingredients of the generated corpus")
+    parser.add_argument("--queries", type=int, default=1_000)
+    parser.add_argument("--query-ingredients", type=int, default=2, help="recipe ingredients per query, besides the staples")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--modes", nargs="+", choices=SCORING_MODES, default=list(SCORING_MODES))
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        recipes_path = args.recipes
+        if recipes_path is None:
+            recipes_path = os.path.join(tmp, "recipes.json")
+            generate(recipes_path, args.recipes_count, args.ingredients, rng)
+        recipes = list(train.iter_recipes(recipes_path))
+        queries = make_queries(recipes, args.queries, args.query_ingredients, rng)
+        print(f"{len(recipes)} recipes, {len(queries)} queries of {args.query_ingredients} ingredients + "
+              f"{len(STAPLES)} staples, k={args.k}")
+
+        cutoffs = sorted({1, 5, args.k})
+        print(f"{'mode':<7} " + " ".join(f"{f'R@{c}':>7}" for c in cutoffs) + f" {f'MRR@{args.k}':>8} "
+              f"{'train s':>8} {'search ms':>10} {'batch ms':>9}")
+        for mode in args.modes:
+            out = os.path.join(tmp, mode)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                train.train(recipes_path, out, mode=mode)
+            train_seconds = time.perf_counter() - start
+            recall, mrr, single_ms, batch_ms = evaluate(load_model(out), queries, args.k)
+            print(f"{mode:<7} " + " ".join(f"{recall[c]:>7.3f}" for c in cutoffs) + f" {mrr:>8.3f} "
+                  f"{train_seconds:>8.1f} {single_ms:>10.3f} {batch_ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
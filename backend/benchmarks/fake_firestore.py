@@ -0,0 +1,498 @@
+"""
+In-memory stand-in for the parts of the Firestore client the backend uses,
+for benchmarks and for trying the data layer without a Firebase project.
+
+Every call that would be a network round-trip sleeps for `latency` seconds
+and is counted in `round_trips`, so benchmarks can show both. Queries scan
+the collection like the real server would without an index only when they
+have to: equality and array_contains filters use per-field indexes.
+
+FakeFirestore mirrors the synchronous client, FakeAsyncFirestore the async
+one the backend uses. The async fake keeps its data in a FakeFirestore
+(its `sync` attribute), which can be used for snapshot listeners.
+
+    db = FakeAsyncFirestore(latency=0.005)
+    repository = HouseholdRepository(db, listen_db=db.sync)
+"""
+import asyncio
+import copy
+import itertools
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import Aborted
+
+
+class FakeWriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference, data: dict | None, update_time=None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.update_time = update_time
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> dict | None:
+        return copy.deepcopy(self._data)
+
+    def get(self, field: str):
+        return self._data.get(field)
+
+
+class FakeDocumentReference:
+    def __init__(self, collection, document_id: str):
+        self._collection = collection
+        self.id = document_id
+
+    @property
+    def path(self) -> str:
+        return f"{self._collection.id}/{self.id}"
+
+    def get(self, field_paths=None) -> FakeDocumentSnapshot:
+        self._collection._db._round_trip()
+        return self._collection._snapshot(self.id, field_paths)
+
+    def set(self, data: dict, merge: bool = False) -> FakeWriteResult:
+        self._collection._db._round_trip()
+        return FakeWriteResult(self._collection._write(self.id, data, replace=not merge))
+
+    def update(self, changes: dict) -> FakeWriteResult:
+        self._collection._db._round_trip()
+        if self.id not in self._collection._documents:
+            raise KeyError(f"No document to update: {self.path}")
+        return FakeWriteResult(self._collection._write(self.id, changes, replace=False))
+
+    def delete(self):
+        self._collection._db._round_trip()
+        self._collection._delete(self.id)
+
+    def on_snapshot(self, callback):
+        return self._collection._listen(self.id, callback)
+
+
+class FakeWatch:
+    def __init__(self, listeners: list, entry):
+        self._listeners = listeners
+        self._entry = entry
+
+    def unsubscribe(self):
+        if self._entry in self._listeners:
+            self._listeners.remove(self._entry)
+
+
+class FakeQuery:
+    def __init__(self, collection, filters=(), fields=None, limit=None):
+        self._collection = collection
+        self._filters = list(filters)
+        self._fields = fields
+        self._limit = limit
+
+    def where(self, field: str = None, op: str = None, value=None, filter=None) -> "FakeQuery":
+        if filter is not None:
+            field, op, value = filter.field_path, filter.op_string, filter.value
+        return FakeQuery(self._collection, self._filters + [(field, op, value)], self._fields, self._limit)
+
+    def select(self, field_paths) -> "FakeQuery":
+        return FakeQuery(self._collection, self._filters, list(field_paths), self._limit)
+
+    def limit(self, count: int) -> "FakeQuery":
+        return FakeQuery(self._collection, self._filters, self._fields, count)
+
+    def stream(self):
+        self._collection._db._round_trip()
+        return iter(self._collection._query(self._filters, self._fields, self._limit))
+
+    def get(self) -> list[FakeDocumentSnapshot]:
+        return list(self.stream())
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, collection_id: str):
+        super().__init__(self)
+        self._db = db
+        self.id = collection_id
+        self._documents: dict[str, dict] = {}
+        self._update_times: dict[str, datetime] = {}
+        self._listeners: list = []
+        # field -> value -> document ids, for equality and array_contains filters
+        self._indexes: dict[str, dict] = {}
+
+    def document(self, document_id: str | None = None) -> FakeDocumentReference:
+        return FakeDocumentReference(self, document_id or uuid.uuid4().hex[:20])
+
+    def add(self, data: dict):
+        reference = self.document()
+        return reference.set(data).update_time, reference
+
+    def _snapshot(self, document_id: str, field_paths=None) -> FakeDocumentSnapshot:
+        with self._db._lock:
+            data = self._documents.get(document_id)
+            if data is not None and field_paths is not None:
+                data = {field: data[field] for field in field_paths if field in data}
+            return FakeDocumentSnapshot(self.document(document_id), copy.deepcopy(data),
+                                        self._update_times.get(document_id))
+
+    def _index_values(self, value):
+        values = value if isinstance(value, list) else [value]
+        return [item for item in values if isinstance(item, (str, int, float, bool))]
+
+    def _reindex(self, document_id: str, old: dict | None, new: dict | None):
+        for data, add in ((old, False), (new, True)):
+            for field, value in (data or {}).items():
+                index = self._indexes.setdefault(field, {})
+                for item in self._index_values(value):
+                    ids = index.setdefault(item, set())
+                    if add:
+                        ids.add(document_id)
+                    else:
+                        ids.discard(document_id)
+
+    def _write(self, document_id: str, changes: dict, replace: bool) -> datetime:
+        with self._db._lock:
+            old = self._documents.get(document_id)
+            data = {} if replace or old is None else copy.deepcopy(old)
+            for field, value in changes.items():
+                data[field] = apply_transform(data.get(field), value)
+            self._reindex(document_id, old, data)
+            self._documents[document_id] = data
+            update_time = self._update_times[document_id] = self._db._now()
+        self._notify(document_id)
+        return update_time
+
+    def _delete(self, document_id: str):
+        with self._db._lock:
+            old = self._documents.pop(document_id, None)
+            self._update_times.pop(document_id, None)
+            self._reindex(document_id, old, None)
+        self._notify(document_id)
+
+    def _listen(self, document_id: str, callback) -> FakeWatch:
+        entry = (document_id, callback)
+        self._listeners.append(entry)
+        callback([self._snapshot(document_id)], [], self._db._now())
+        return FakeWatch(self._listeners, entry)
+
+    def _notify(self, document_id: str):
+        for listened_id, callback in list(self._listeners):
+            if listened_id == document_id:
+                callback([self._snapshot(document_id)], [], self._db._now())
+
+    def _query(self, filters, fields, limit) -> list[FakeDocumentSnapshot]:
+        with self._db._lock:
+            candidates = None
+            for field, op, value in filters:
+                if op in ("==", "array_contains"):
+                    ids = self._indexes.get(field, {}).get(value, set())
+                    candidates = ids if candidates is None else candidates & ids
+            ids = list(self._documents) if candidates is None else sorted(candidates)
+
+            results = []
+            for document_id in ids:
+                data = self._documents[document_id]
+                if all(matches(data.get(field), op, value) for field, op, value in filters):
+                    results.append(document_id)
+                    if limit is not None and len(results) == limit:
+                        break
+        return [self._snapshot(document_id, fields) for document_id in results]
+
+
+def matches(field_value, op: str, value) -> bool:
+    if op == "==":
+        return field_value == value
+    if op == "array_contains":
+        return isinstance(field_value, list) and value in field_value
+    if op == "in":
+        return field_value in value
+    if op == "array_contains_any":
+        return isinstance(field_value, list) and any(item in field_value for item in value)
+    raise ValueError(f"Unsupported operator in fake query: {op}")
+
+
+def apply_transform(current, value):
+    """Applies ArrayUnion / ArrayRemove / Increment the way the server does, plain values replace the field."""
+    name = type(value).__name__
+    if name == "ArrayUnion":
+        items = list(current) if isinstance(current, list) else []
+        for item in value.values:
+            if item not in items:
+                items.append(item)
+        return items
+    if name == "ArrayRemove":
+        return [item for item in (current if isinstance(current, list) else []) if item not in value.values]
+    if name == "Increment":
+        return (current or 0) + value.value
+    return copy.deepcopy(value)
+
+
+class FakeWriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, reference, data: dict, merge: bool = False):
+        self._writes.append((reference, data, not merge))
+
+    def update(self, reference, changes: dict):
+        self._writes.append((reference, changes, False))
+
+    def delete(self, reference):
+        self._writes.append((reference, None, None))
+
+    def commit(self) -> list[FakeWriteResult]:
+        self._db._round_trip()
+        results = []
+        for reference, data, replace in self._writes:
+            if data is None:
+                reference._collection._delete(reference.id)
+                results.append(FakeWriteResult(self._db._now()))
+            else:
+                results.append(FakeWriteResult(reference._collection._write(reference.id, data, replace)))
+        self._writes = []
+        return results
+
+
+class FakeFirestore:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.round_trips = 0
+        self._collections: dict[str, FakeCollection] = {}
+        self._lock = threading.RLock()
+        self._clock = itertools.count(1)
+
+    def _round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _now(self) -> datetime:
+        # Strictly increasing, like server update times
+        return datetime.fromtimestamp(next(self._clock) / 1_000_000, tz=timezone.utc)
+
+    def collection(self, collection_id: str) -> FakeCollection:
+        with self._lock:
+            if collection_id not in self._collections:
+                self._collections[collection_id] = FakeCollection(self, collection_id)
+            return self._collections[collection_id]
+
+    def get_all(self, references, field_paths=None):
+        self._round_trip()
+        for reference in references:
+            yield reference._collection._snapshot(reference.id, field_paths)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+
+# --- Async client ---
+# Thin wrappers around the synchronous fake: every round-trip awaits the
+# latency instead of sleeping, so concurrent calls overlap like they do
+# against a real server.
+
+# How often writes waiting for a document locked by a transaction check again, seconds
+LOCK_POLL_INTERVAL = 0.0005
+
+class FakeAsyncDocumentReference:
+    def __init__(self, db, reference: FakeDocumentReference):
+        self._db = db
+        self._reference = reference
+        self.id = reference.id
+
+    @property
+    def path(self) -> str:
+        return self._reference.path
+
+    async def get(self, field_paths=None, transaction=None) -> FakeDocumentSnapshot:
+        await self._db._round_trip()
+        if transaction is not None:
+            await self._db._lock_document(self._reference, transaction)
+        snapshot = self._reference.get(field_paths)
+        if transaction is not None:
+            transaction._reads.append((self._reference, snapshot.update_time))
+        return snapshot
+
+    async def set(self, data: dict, merge: bool = False) -> FakeWriteResult:
+        await self._db._round_trip()
+        await self._db._wait_unlocked(self._reference)
+        return self._reference.set(data, merge)
+
+    async def update(self, changes: dict) -> FakeWriteResult:
+        await self._db._round_trip()
+        await self._db._wait_unlocked(self._reference)
+        return self._reference.update(changes)
+
+    async def delete(self):
+        await self._db._round_trip()
+        await self._db._wait_unlocked(self._reference)
+        self._reference.delete()
+
+
+class FakeAsyncQuery:
+    def __init__(self, db, query: FakeQuery):
+        self._db = db
+        self._query = query
+
+    def where(self, *args, **kwargs) -> "FakeAsyncQuery":
+        return FakeAsyncQuery(self._db, self._query.where(*args, **kwargs))
+
+    def select(self, field_paths) -> "FakeAsyncQuery":
+        return FakeAsyncQuery(self._db, self._query.select(field_paths))
+
+    def limit(self, count: int) -> "FakeAsyncQuery":
+        return FakeAsyncQuery(self._db, self._query.limit(count))
+
+    async def stream(self):
+        await self._db._round_trip()
+        for snapshot in self._query.stream():
+            yield snapshot
+
+    async def get(self) -> list[FakeDocumentSnapshot]:
+        await self._db._round_trip()
+        return self._query.get()
+
+
+class FakeAsyncCollection(FakeAsyncQuery):
+    def __init__(self, db, collection: FakeCollection):
+        super().__init__(db, collection)
+        self.id = collection.id
+
+    def document(self, document_id: str | None = None) -> FakeAsyncDocumentReference:
+        return FakeAsyncDocumentReference(self._db, self._query.document(document_id))
+
+
+class FakeAsyncWriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self._batch = db.sync.batch()
+
+    def set(self, reference, data: dict, merge: bool = False):
+        self._batch.set(reference._reference, data, merge)
+
+    def update(self, reference, changes: dict):
+        self._batch.update(reference._reference, changes)
+
+    def delete(self, reference):
+        self._batch.delete(reference._reference)
+
+    async def commit(self) -> list[FakeWriteResult]:
+        await self._db._round_trip()
+        for reference, _, _ in self._batch._writes:
+            await self._db._wait_unlocked(reference)
+        return self._batch.commit()
+
+
+class FakeAsyncTransaction:
+    """
+    Implements what google.cloud.firestore_v1.async_transactional expects.
+
+    Like the server, reading a document in a transaction locks it until the
+    transaction commits or rolls back, and other writes to it wait. Commits
+    still fail with Aborted if a document read in the transaction was
+    written since (a write that was already on its way when the lock was
+    taken); the decorator then runs the transaction again.
+    """
+
+    def __init__(self, db, max_attempts: int = 5):
+        self._db = db
+        self._max_attempts = max_attempts
+        self._read_only = False
+        self._id = None
+        self._reads = []
+        self._writes = []
+
+    @property
+    def in_progress(self) -> bool:
+        return self._id is not None
+
+    def _clean_up(self):
+        self._id = None
+        self._reads = []
+        self._writes = []
+
+    async def _begin(self, retry_id=None):
+        self._id = uuid.uuid4().bytes
+
+    async def _rollback(self):
+        self._db._unlock_documents(self)
+        self._clean_up()
+
+    def set(self, reference, data: dict, merge: bool = False):
+        self._writes.append((reference._reference, data, not merge))
+
+    def update(self, reference, changes: dict):
+        self._writes.append((reference._reference, changes, False))
+
+    async def _commit(self) -> list[FakeWriteResult]:
+        await self._db._round_trip()
+        sync = self._db.sync
+        sync._round_trip()
+        with sync._lock:
+            for reference, update_time in self._reads:
+                if reference._collection._update_times.get(reference.id) != update_time:
+                    self._db._unlock_documents(self)
+                    self._clean_up()
+                    raise Aborted(f"{reference.path} changed during the transaction")
+            results = [FakeWriteResult(reference._collection._write(reference.id, data, replace))
+                       for reference, data, replace in self._writes]
+            self._db._unlock_documents(self)
+        self._clean_up()
+        return results
+
+
+class FakeAsyncFirestore:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        # Holds the data and counts the round-trips, without sleeping
+        self.sync = FakeFirestore()
+        # Document path -> transaction that read (and so locked) it
+        self._locks: dict[str, FakeAsyncTransaction] = {}
+
+    @property
+    def round_trips(self) -> int:
+        return self.sync.round_trips
+
+    async def _round_trip(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def _lock_document(self, reference: FakeDocumentReference, transaction):
+        while True:
+            with self.sync._lock:
+                owner = self._locks.get(reference.path)
+                if owner is None or owner is transaction:
+                    self._locks[reference.path] = transaction
+                    return
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+
+    def _unlock_documents(self, transaction):
+        with self.sync._lock:
+            for reference, _ in transaction._reads:
+                if self._locks.get(reference.path) is transaction:
+                    del self._locks[reference.path]
+
+    async def _wait_unlocked(self, reference: FakeDocumentReference):
+        while self._locks.get(reference.path) is not None:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+
+    def collection(self, collection_id: str) -> FakeAsyncCollection:
+        return FakeAsyncCollection(self, self.sync.collection(collection_id))
+
+    async def get_all(self, references, field_paths=None):
+        await self._round_trip()
+        for snapshot in self.sync.get_all([reference._reference for reference in references], field_paths):
+            yield snapshot
+
+    def batch(self) -> FakeAsyncWriteBatch:
+        return FakeAsyncWriteBatch(self)
+
+    def transaction(self, max_attempts: int = 5, read_only: bool = False) -> FakeAsyncTransaction:
+        return FakeAsyncTransaction(self, max_attempts)
@@ -0,0 +1,89 @@
+"""
+Load test: latency of an unrelated endpoint (GET /) while /recommend is
+under concurrent load. First measures GET / alone, then again while
+--concurrency clients send /recommend requests back to back.
+
+If recommendations block the event loop, the p99 of GET / grows to the
+duration of a similarity pass; with the recommendation pool (workers.py) it
+should stay close to the idle numbers. Rejected requests (503) show the pool's
+back-pressure.
+
+Start the backend first, then run from the backend directory:
+    uvicorn main:app --port 8000
+    python benchmarks/load_recommend.py --url http://127.0.0.1:8000 --concurrency 32 --duration 20
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+
+import httpx
+
+INGREDIENTS = ["Tomaten", "Zwiebeln", "Knoblauch", "Salz", "Pfeffer", "Olivenöl", "Mehl", "Zucker", "Eier", "Butter",
+               "Milch", "Sahne", "Kartoffeln", "Karotten", "Paprika", "Reis", "Nudeln", "Käse", "Hackfleisch", "Basilikum"]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else float("nan")
+
+
+async def probe(client, stop_at, interval):
+    """Calls GET / every interval seconds until stop_at, returns the latencies."""
+    latencies = []
+    while time.perf_counter() < stop_at:
+        start = time.perf_counter()
+        response = await client.get("/")
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - start)))
+    return latencies
+
+
+async def recommend_client(client, stop_at, statuses, latencies, rng):
+    while time.perf_counter() < stop_at:
+        body = {"ingredients": rng.sample(INGREDIENTS, rng.randint(3, 8)), "top_n": 10, "fields": ["Name", "Url"]}
+        start = time.perf_counter()
+        response = await client.post("/recommend", json=body)
+        statuses[response.status_code] += 1
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - start)
+        elif response.status_code == 503:
+            await asyncio.sleep(float(response.headers.get("Retry-After", "1")) / 10)
+
+
+def report(name, latencies, duration):
+    print(f"  {name:<22} {len(latencies) / duration:>7.1f} req/s  p50 {percentile(latencies, 0.50):>8.1f} ms  "
+          f"p99 {percentile(latencies, 0.99):>8.1f} ms  max {max(latencies, default=0) * 1000:>8.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent /recommend clients")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per phase")
+    parser.add_argument("--probe-interval", type=float, default=0.02, help="seconds between GET / calls")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.concurrency + 8)
+    async with httpx.AsyncClient(base_url=args.url, timeout=60, limits=limits) as client:
+        print(f"GET / alone, {args.duration:.0f} s")
+        idle = await probe(client, time.perf_counter() + args.duration, args.probe_interval)
+        report("GET /", idle, args.duration)
+
+        print(f"GET / with {args.concurrency} concurrent /recommend clients, {args.duration:.0f} s")
+        stop_at = time.perf_counter() + args.duration
+        statuses, recommend_latencies = Counter(), []
+        rng = random.Random(1)
+        results = await asyncio.gather(
+            probe(client, stop_at, args.probe_interval),
+            *(recommend_client(client, stop_at, statuses, recommend_latencies, rng) for _ in range(args.concurrency)),
+        )
+        report("GET /", results[0], args.duration)
+        report("POST /recommend (200)", recommend_latencies, args.duration)
+        print(f"  /recommend status codes: {dict(sorted(statuses.items()))}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,200 @@
+"""
+Concurrency check for household writes: many threads, each with its own
+event loop and its own HouseholdRepository (like separate backend workers),
+change the same household at once. Afterwards no change may be missing:
+
+  - every thread adds --ingredients ingredients, then deletes half of them
+  - every thread adds --members users to the household
+  - every thread promotes and demotes one shared user over and over
+
+The writes are the ones the handlers in households.py and ingredients.py
+send. --legacy runs the previous read-modify-write versions instead, which
+lose updates.
+
+Runs against the in-memory fake by default, or against the Firestore
+emulator with --emulator (needs FIRESTORE_EMULATOR_HOST).
+
+Run from the backend directory:
+    python benchmarks/stress_households.py --threads 16
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+from google.cloud.firestore_v1 import ArrayRemove, ArrayUnion, Increment
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from api.households.repository import HOUSEHOLDS_COLLECTION, HouseholdRepository
+from fake_firestore import FakeAsyncFirestore
+
+HOUSEHOLD_ID = "stress"
+SHARED_USER = "shared"
+
+
+class AtomicWrites:
+    """The writes the handlers send."""
+
+    def __init__(self, repository: HouseholdRepository):
+        self.repository = repository
+
+    async def add_ingredient(self, name):
+        await self.repository.update(HOUSEHOLD_ID, {"ingredients": ArrayUnion([{"name": name}]), "ingredients_version": Increment(1)})
+
+    async def delete_ingredient(self, name):
+        await self.repository.update(HOUSEHOLD_ID, {"ingredients": ArrayRemove([{"name": name}]), "ingredients_version": Increment(1)})
+
+    async def add_member(self, user_id):
+        await self.repository.update(HOUSEHOLD_ID, {"members": ArrayUnion([user_id]), "users": ArrayUnion([user_id])})
+
+    async def toggle_admin(self):
+        def toggle(data):
+            if SHARED_USER in data["members"]:
+                return {"members": ArrayRemove([SHARED_USER]), "admins": ArrayUnion([SHARED_USER])}
+            return {"admins": ArrayRemove([SHARED_USER]), "members": ArrayUnion([SHARED_USER])}
+        await self.repository.transact(HOUSEHOLD_ID, toggle)
+
+
+class LegacyWrites:
+    """Read the household, change the lists in Python, write them back."""
+
+    def __init__(self, db):
+        self.reference = db.collection(HOUSEHOLDS_COLLECTION).document(HOUSEHOLD_ID)
+
+    async def _change(self, change):
+        data = (await self.reference.get()).to_dict()
+        change(data)
+        await self.reference.update({field: data[field] for field in ("ingredients", "members", "admins", "users")})
+
+    async def add_ingredient(self, name):
+        await self._change(lambda data: data["ingredients"].append({"name": name}))
+
+    async def delete_ingredient(self, name):
+        await self._change(lambda data: data["ingredients"].remove({"name": name}))
+
+    async def add_member(self, user_id):
+        await self._change(lambda data: (data["members"].append(user_id), data["users"].append(user_id)))
+
+    async def toggle_admin(self):
+        def toggle(data):
+            source, target = ("members", "admins") if SHARED_USER in data["members"] else ("admins", "members")
+            data[source].remove(SHARED_USER)
+            data[target].append(SHARED_USER)
+        await self._change(toggle)
+
+
+async def worker(thread, writes, args, errors):
+    names = [f"t{thread}-zutat{i}" for i in range(args.ingredients)]
+    for i, name in enumerate(names):
+        await writes.add_ingredient(name)
+        await writes.add_member(f"t{thread}-user{i % args.members}")
+        await writes.toggle_admin()
+    for name in names[::2]:
+        try:
+            await writes.delete_ingredient(name)
+        except ValueError as e:
+            # The legacy version can miss its own ingredient after a lost update
+            errors.append(str(e))
+
+
+def run_thread(thread, make_db, args, errors):
+    async def main():
+        db = make_db()
+        writes = LegacyWrites(db) if args.legacy else AtomicWrites(HouseholdRepository(db))
+        await worker(thread, writes, args, errors)
+    try:
+        asyncio.run(main())
+    except Exception as e:
+        errors.append(f"thread {thread}: {type(e).__name__}: {e}")
+
+
+def expected_ingredient_names(args) -> list[str]:
+    return sorted(f"t{t}-zutat{i}" for t in range(args.threads) for i in range(1, args.ingredients, 2))
+
+
+def expected_users(args) -> set[str]:
+    return {f"t{t}-user{i}" for t in range(args.threads) for i in range(min(args.members, args.ingredients))}
+
+
+def setup_household(collection):
+    collection.document(HOUSEHOLD_ID).set({
+        "name": "Stress", "owner": "owner", "admins": [], "members": [SHARED_USER],
+        "users": ["owner", SHARED_USER], "ingredients": [],
+    })
+
+
+def run_threads(make_db, args) -> list[str]:
+    """Runs every thread's writes against the household, returns the errors."""
+    errors = []
+    threads = [threading.Thread(target=run_thread, args=(i, make_db, args, errors)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+def check(data: dict, args) -> dict[str, bool]:
+    """{check: passed} for the household after all threads are done. A failed check means lost updates."""
+    roles = data["admins"] + data["members"]
+    added_users = expected_users(args)
+    # Every thread toggled the shared user the same number of times
+    shared_is_admin = (args.threads * args.ingredients) % 2 == 1
+    checks = {
+        "ingredients": sorted(item["name"] for item in data["ingredients"]) == expected_ingredient_names(args),
+        "members added": added_users <= set(data["members"]) and added_users <= set(data["users"]),
+        "one role per user": len(roles) == len(set(roles)) and set(roles) | {"owner"} == set(data["users"]),
+        "promote/demote": (SHARED_USER in data["admins"]) == shared_is_admin,
+    }
+    if not args.legacy:
+        # One increment per ingredient write
+        checks["ingredients version"] = data.get("ingredients_version") == args.threads * (args.ingredients + len(range(0, args.ingredients, 2)))
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ingredients", type=int, default=20, help="ingredients added per thread")
+    parser.add_argument("--members", type=int, default=5, help="users added per thread")
+    parser.add_argument("--latency", type=float, default=0.002, help="simulated round-trip time of the fake, seconds")
+    parser.add_argument("--legacy", action="store_true", help="run the old read-modify-write handlers")
+    parser.add_argument("--emulator", action="store_true", help="use the Firestore emulator instead of the fake")
+    args = parser.parse_args()
+
+    if args.emulator:
+        from google.cloud import firestore
+        # gRPC channels belong to one event loop, so every thread gets its own client
+        make_db = lambda: firestore.AsyncClient(project="demo-recipes")
+        setup = firestore.Client(project="demo-recipes")
+    else:
+        fake = FakeAsyncFirestore(latency=args.latency)
+        make_db = lambda: fake
+        setup = fake.sync
+
+    setup_household(setup.collection(HOUSEHOLDS_COLLECTION))
+
+    start = time.perf_counter()
+    errors = run_threads(make_db, args)
+    elapsed = time.perf_counter() - start
+
+    data = setup.collection(HOUSEHOLDS_COLLECTION).document(HOUSEHOLD_ID).get().to_dict()
+    checks = check(data, args)
+    expected_ingredients = expected_ingredient_names(args)
+    added_users = expected_users(args)
+    ingredients = sorted(item["name"] for item in data["ingredients"])
+    print(f"{'legacy' if args.legacy else 'atomic'} writes, {args.threads} threads, {elapsed:.1f} s")
+    print(f"  ingredients: {len(ingredients)} of {len(expected_ingredients)} expected, "
+          f"{len(added_users & set(data['users']))} of {len(added_users)} added users present")
+    for name, ok in checks.items():
+        print(f"  {name:<20} {'ok' if ok else 'LOST UPDATES'}")
+    for error in errors[:5]:
+        print(f"  error: {error}")
+    sys.exit(0 if all(checks.values()) and not errors else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,73 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
+import threading
 
-cred = credentials.Certificate("./firebase/serviceAccount.json")
-firebase_admin.initialize_app(cred)
+SERVICE_ACCOUNT_PATH = "./firebase/serviceAccount.json"
 
-db = firestore.client()
\ No newline at end of file
+# firebase_admin is slow to import and needs the service account file, so the app
+# and the clients are only set up when the first request talks to Firestore.
+# Importing the backend (tests, scripts, serve.py's parent process) never does.
+_init_lock = threading.Lock()
+
+
+def _initialize_app():
+    import firebase_admin
+    from firebase_admin import credentials
+
+    with _init_lock:
+        try:
+            firebase_admin.get_app()
+        except ValueError:
+            firebase_admin.initialize_app(credentials.Certificate(SERVICE_ACCOUNT_PATH))
+
+
+def _async_client():
+    from firebase_admin import firestore_async
+
+    _initialize_app()
+    return firestore_async.client()
+
+
+def _sync_client():
+    from firebase_admin import firestore
+
+    _initialize_app()
+    return firestore.client()
+
+
+def firestore_v1():
+    """
+    google.cloud.firestore_v1, for field transforms (ArrayUnion, Increment, ...), query
+    filters and transactions. Imported on first use too, it takes a third of main's import time.
+    """
+    from google.cloud import firestore_v1
+
+    return firestore_v1
+
+
+class LazyClient:
+    """A Firestore client that is created by factory() on first use. Everything else is the client's."""
+
+    __slots__ = ("_factory", "_client", "_lock")
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The client itself, created on the first call."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+db = LazyClient(_async_client)
+
+
+def sync_client() -> LazyClient:
+    """Synchronous client, only needed for snapshot listeners (the async client has none)."""
+    return LazyClient(_sync_client)
@@ -1,15 +1,30 @@
-from fastapi import FastAPI, HTTPException, APIRouter
+from fastapi import FastAPI, HTTPException, APIRouter, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, Field
+from typing import Literal
+from contextlib import asynccontextmanager
 
 import os
 import sys
+import hmac
+import logging
+import threading
 import importlib.util
 
 from api.users import users
 from api.users import auth
 from api.households import households
 from api.ingredients import ingredients
+from api.repositories import household_repository
+from workers import PoolSaturated, recommend_pool
+import metrics
+from metrics import RECOMMEND_STAGE_SECONDS
+
+# Level of the backend's own log messages. DEBUG also logs the input and results of every recommendation
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL, format="%(levelname)s:     %(name)s: %(message)s")
+logger = logging.getLogger("main")
 
 current_script_dir = os.path.dirname(os.path.abspath(__file__)) # Get current "backend" directory
 
@@ -19,36 +34,59 @@ current_script_dir = os.path.dirname(os.path.abspath(__file__)) # Get current "b
 predict_module_path = os.path.join(current_script_dir, 'model', 'predict.py')
 
 if not os.path.exists(predict_module_path):
-    print(f"CRITICAL ERROR: predict.py not found at the expected path: {predict_module_path}")
-    print("Please ensure the path 'backend/model/predict.py' is correct relative to your main.py.")
+    logger.critical("predict.py not found at the expected path: %s", predict_module_path)
+    logger.critical("Please ensure the path 'backend/model/predict.py' is correct relative to your main.py.")
     sys.exit(1)
 
 # --- Model loading logic ---
-# Load the module directly from its file path
-try:
-    # Create a module specification
-    spec = importlib.util.spec_from_file_location("predict_module_name", predict_module_path)
-    if spec is None:
-        raise ImportError(f"Could not create module specification for {predict_module_path}")
+# predict.py imports numpy, scipy and scikit-learn and loads the model, which takes seconds.
+# It is loaded in a background thread once the app has started (see lifespan), so the backend
+# answers right away; GET /ready tells when recommendations can be served.
+predict = None
+# "loading", "ready", or why predict.py could not be loaded
+predict_status = "loading"
+# Set when load_predict() is done, whether it succeeded or not
+predict_loaded = threading.Event()
+_warmup = None
+
+def load_predict():
+    """Loads predict.py (and with it the model) from its file path and makes it the app's predict module."""
+    global predict, predict_status
+    try:
+        # Create a module specification
+        spec = importlib.util.spec_from_file_location("predict_module_name", predict_module_path)
+        if spec is None:
+            raise ImportError(f"Could not create module specification for {predict_module_path}")
 
-    # Create a new module from the specification
-    predict = importlib.util.module_from_spec(spec)
+        # Create a new module from the specification
+        module = importlib.util.module_from_spec(spec)
 
-    # Add the module to sys.modules so it behaves like a regular import
-    sys.modules[spec.name] = predict
+        # Add the module to sys.modules so it behaves like a regular import
+        sys.modules[spec.name] = module
 
-    # Execute the module's code (this will run the model loading in predict.py)
-    spec.loader.exec_module(predict)
-    print(f"Successfully loaded predict.py from: {predict_module_path}")
+        # Execute the module's code (this will run the model loading in predict.py)
+        spec.loader.exec_module(module)
+        logger.info("Successfully loaded predict.py from: %s", predict_module_path)
+        # Only published once it is complete, requests before that get a 503
+        predict = module
+        predict_status = "ready"
 
-except Exception as e:
-    print(f"CRITICAL ERROR: Failed to load predict.py from path: {predict_module_path}. Error: {e}")
-    # Set predict to None so subsequent code can check its existence and handle gracefully
-    predict = None
-    sys.exit(1) # Exit the application if loading fails
+    except Exception as e:
+        logger.critical("Failed to load predict.py from path: %s. Error: %s", predict_module_path, e)
+        predict_status = f"failed: {e}"
+    finally:
+        predict_loaded.set()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _warmup
+    if _warmup is None:
+        _warmup = threading.Thread(target=load_predict, name="model-warmup", daemon=True)
+        _warmup.start()
+    yield
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:5173",
@@ -74,10 +112,60 @@ app.include_router(api_router)
 async def root():
     return {"message": "Recipes Backend running"}
 
+# GET /ready: readiness probe. GET / answers as soon as the process is up, this only once recommendations can be served
+@app.get("/ready")
+async def ready():
+    snapshot = predict.registry.current() if predict is not None else None
+    if snapshot is None:
+        status = predict_status if predict is None else "no model loaded"
+        return JSONResponse(status_code=503, content={"ready": False, "status": status})
+    return {"ready": True, "status": predict_status, "model": snapshot.version}
+
+# Most recipes one recommendation may return. top_n goes straight into the top-k selection and the result cache
+MAX_TOP_N = 100
+
+class RecommendationFilters(BaseModel):
+    # Leave out recipes using any of these ingredients, e.g. allergens
+    exclude_ingredients: list[str] = []
+    # Only recipes using all of these ingredients
+    require_ingredients: list[str] = []
+    # Only recipes with at most this many distinct ingredients
+    max_ingredients: int | None = None
+    # Categorical recipe fields and their allowed values, e.g. {"Weekday": ["Samstag", "Sonntag"]}
+    categories: dict[str, list[str | int]] = {}
+
 # Define a Pydantic model for the request body of the /recommend endpoint
 class RecommendationRequest(BaseModel):
     ingredients: list[str]
-    top_n: int = 5
+    top_n: int = Field(5, ge=1, le=MAX_TOP_N)
+    # Recipe fields to return, e.g. ["Name", "Url"]. Defaults to all fields.
+    fields: list[str] | None = None
+    # "coverage" ranks recipes by how few ingredients are missing from the list, then by similarity
+    mode: Literal["similarity", "coverage"] = "similarity"
+    # Coverage mode only: leave out recipes missing more ingredients than this
+    max_missing: int | None = None
+    # Applied before ranking, see RecommendationFilters
+    filters: RecommendationFilters | None = None
+
+def check_model_loaded():
+    if predict is None or predict.registry.current() is None:
+        raise HTTPException(status_code=503, detail="Recommendation model components not loaded. Check GET /ready and the server logs.")
+
+def check_predict_loaded():
+    # The admin endpoints also work without a model, but not before predict.py is loaded
+    if predict is None:
+        raise HTTPException(status_code=503, detail=f"predict.py is not loaded: {predict_status}")
+
+def check_fields(fields: list[str] | None):
+    if fields is not None:
+        model = predict.registry.current().model
+        unknown = model.unknown_fields(fields)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown recipe fields: {unknown}. Available fields: {model.fields}")
+
+def pool_saturated() -> HTTPException:
+    # Rejecting right away is better than letting requests pile up until they time out
+    return HTTPException(status_code=503, detail="Too many recommendation requests, try again shortly.", headers={"Retry-After": "1"})
 
 # POST /recommend Endpoint (außerhalb von /api – das ist so gewollt)
 @app.post("/recommend")
@@ -87,20 +175,138 @@ async def recommend_items(request: RecommendationRequest):
     This endpoint utilizes the recommendation logic defined in predict.py.
     """
     # Ensure 'predict' module was successfully loaded and its components are ready
-    if predict is None or \
-       predict._vectorizer is None or \
-       predict._recipe_matrix_X is None or \
-       predict._recipes_df is None:
-        raise HTTPException(status_code=503, detail="Recommendation model components not loaded. Check server logs for errors during predict.py initialization.")
+    check_model_loaded()
+
+    check_fields(request.fields)
+    if request.mode == "coverage" and predict.registry.current().model.ingredients is None:
+        raise HTTPException(status_code=400, detail="The loaded model does not support coverage ranking. Retrain it with the current train.py.")
+    recipe_filter = None
+    if request.filters is not None:
+        filters = request.filters
+        try:
+            recipe_filter = predict.recipe_filter(filters.exclude_ingredients, filters.require_ingredients,
+                                                  filters.max_ingredients, filters.categories)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
     try:
-        # Call the recommend function from the loaded 'predict' module
-        recommended_recipes = predict.recommend(request.ingredients, request.top_n)
+        # Call the recommend function from the loaded 'predict' module, on the recommendation pool
+        # so the event loop stays free for other requests
+        if request.mode == "coverage":
+            recommended_recipes = await recommend_pool.run(predict.recommend_coverage, request.ingredients, request.top_n,
+                                                           request.fields, request.max_missing, recipe_filter)
+        else:
+            recommended_recipes = await recommend_pool.run(predict.recommend, request.ingredients, request.top_n,
+                                                           request.fields, recipe_filter)
 
         if not recommended_recipes:
             return {"message": "No recommendations found for the given ingredients.", "recommendations": []}
 
-        return {"recommendations": recommended_recipes}
+        # Rendered here instead of by FastAPI, so it can be timed as the last stage
+        with RECOMMEND_STAGE_SECONDS.time(request.mode, "serialize"):
+            return JSONResponse({"recommendations": recommended_recipes})
+    except PoolSaturated:
+        raise pool_saturated()
+    except Exception as e:
+        logger.exception("Error during recommendation in /recommend endpoint")
+        raise HTTPException(status_code=500, detail=f"An internal error occurred during recommendation: {str(e)}")
+
+
+# Most ingredient lists one batch request may hold, they are all scored in one go on a worker thread
+MAX_BATCH_QUERIES = 1000
+
+class BatchRecommendationRequest(BaseModel):
+    queries: list[list[str]] = Field(max_length=MAX_BATCH_QUERIES)
+    top_n: int = Field(5, ge=1, le=MAX_TOP_N)
+    fields: list[str] | None = None
+
+# POST /recommend/batch Endpoint, for jobs that need recommendations for many ingredient lists at once
+@app.post("/recommend/batch")
+async def recommend_batch(request: BatchRecommendationRequest):
+    """
+    Endpoint to get recipe recommendations for many ingredient lists in one call.
+    Returns one list of recommendations per query, in the same order.
+    """
+    check_model_loaded()
+
+    check_fields(request.fields)
+
+    try:
+        recommended_recipes = await recommend_pool.run(predict.recommend_many, request.queries, request.top_n, request.fields)
+        with RECOMMEND_STAGE_SECONDS.time("batch", "serialize"):
+            return JSONResponse({"results": [{"recommendations": recipes} for recipes in recommended_recipes]})
+    except PoolSaturated:
+        raise pool_saturated()
     except Exception as e:
-        print(f"Error during recommendation in /recommend endpoint: {e}")
+        logger.exception("Error during recommendation in /recommend/batch endpoint")
+        raise HTTPException(status_code=500, detail=f"An internal error occurred during batch recommendation: {str(e)}")
+
+
+# GET /api/households/recommendations: recommendations for the ingredients of the current household
+@app.get("/api/households/recommendations")
+async def household_recommendations(request: Request, top_n: int = Query(5, ge=1, le=MAX_TOP_N), fields: str | None = None):
+    """
+    Recommends recipes for the ingredients the household has, without the client sending them.
+    fields is a comma-separated list of recipe fields, e.g. "Name,Url".
+    Results are memoized per household until its ingredients change.
+    """
+    household_id = request.cookies.get('household_id')
+    if not household_id:
+        raise HTTPException(status_code=401, detail='Missing household_id cookie')
+    check_model_loaded()
+
+    field_list = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    check_fields(field_list)
+
+    household_data = await household_repository.get(household_id)
+    if household_data is None:
+        raise HTTPException(status_code=404, detail='Household not found')
+    names = [item.get('name', '') for item in household_data.get('ingredients', [])]
+    version = household_data.get('ingredients_version', 0)
+
+    try:
+        recommended_recipes = await recommend_pool.run(predict.recommend_for_household, household_id, version, names, top_n, field_list)
+    except PoolSaturated:
+        raise pool_saturated()
+    except Exception as e:
+        logger.exception("Error during recommendation in /api/households/recommendations endpoint")
         raise HTTPException(status_code=500, detail=f"An internal error occurred during recommendation: {str(e)}")
+
+    if not recommended_recipes:
+        return {"household_id": household_id, "message": "No recommendations found for the household's ingredients.", "recommendations": []}
+    with RECOMMEND_STAGE_SECONDS.time("household", "serialize"):
+        return JSONResponse({"household_id": household_id, "recommendations": recommended_recipes})
+
+
+# GET /metrics: per-stage recommendation and Firestore latency histograms of this worker, in the Prometheus text format
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# Model administration: status of the loaded recommendation model and hot reloads without a restart
+# These endpoints require MODEL_ADMIN_TOKEN in the X-Admin-Token header. Without a configured token they are closed
+def check_admin_token(request: Request):
+    token = os.environ.get("MODEL_ADMIN_TOKEN")
+    if not token:
+        raise HTTPException(status_code=403, detail="The admin endpoints are disabled, set MODEL_ADMIN_TOKEN to enable them")
+    given = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(given.encode(), token.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/admin/model")
+async def model_status(request: Request):
+    check_admin_token(request)
+    check_predict_loaded()
+    return {**predict.registry.status(), "pool": recommend_pool.status(), "cache": predict.result_cache.status()}
+
+@app.post("/admin/model/reload", status_code=202)
+async def reload_model(request: Request):
+    """
+    Loads the model files again in the background and swaps the new model in once it is ready.
+    Requests keep being served by the current model while it loads.
+    """
+    check_admin_token(request)
+    check_predict_loaded()
+    started = predict.registry.reload()
+    return {"message": "Reload started" if started else "Reload already in progress", **predict.registry.status()}
@@ -0,0 +1,149 @@
+import threading
+import time
+from bisect import bisect_left
+
+# Latency histograms of this worker process, served by GET /metrics in the
+# Prometheus text format. Recording a value is a bisect and two additions
+# under a lock, so they can be updated on every request: the stages of every
+# recommendation (predict.py, main.py) and every Firestore call of the routers.
+# Every label combination has its own Series with its own lock, so threads
+# recording different stages do not wait for each other.
+# With several workers every process has its own histograms, like the other
+# per-process counters of /admin/model.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds of the buckets in seconds, from single cheap stages up to slow Firestore calls
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+_histograms = []
+
+
+class Series:
+    """The buckets of one combination of label values, see Histogram.labels()."""
+
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        # Count per bucket, plus one for values above the last bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        bucket = bisect_left(self.buckets, seconds)
+        # Nothing in between can raise, and acquire/release is cheaper than a with block
+        self._lock.acquire()
+        self.counts[bucket] += 1
+        self.sum += seconds
+        self._lock.release()
+
+    def snapshot(self) -> tuple[list, float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Histogram:
+    """
+    Counts of observed durations per bucket, for every combination of label
+    values. A duration goes into the first bucket whose upper bound it does
+    not exceed; render() turns that into Prometheus' cumulative buckets.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...], buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple, Series] = {}
+        self._lock = threading.Lock()
+        _histograms.append(self)
+
+    def labels(self, *label_values: str) -> Series:
+        """The series of the given label values, created on first use."""
+        series = self._series.get(label_values)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(label_values, Series(self.buckets))
+        return series
+
+    def observe(self, label_values: tuple, seconds: float):
+        """Records seconds for the label values. Recording into an existing series skips labels()."""
+        series = self._series.get(label_values)
+        if series is None:
+            series = self.labels(*label_values)
+        series.observe(seconds)
+
+    def time(self, *label_values: str) -> "Timer":
+        """Context manager that observes how long its block took."""
+        return Timer(self.labels(*label_values))
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for label_values, values in series:
+            counts, total_seconds = values.snapshot()
+            labels = ",".join(f'{name}="{value}"' for name, value in zip(self.label_names, label_values))
+            prefix = labels + "," if labels else ""
+            total = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                total += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {total}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total_seconds}")
+            lines.append(f"{self.name}_count{{{labels}}} {total}")
+        return "\n".join(lines) + "\n"
+
+
+class Timer:
+    __slots__ = ("series", "start")
+
+    def __init__(self, series: Series):
+        self.series = series
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.series.observe(time.perf_counter() - self.start)
+
+
+class Stages:
+    """
+    Times the consecutive stages of one request: lap(stage) records the time
+    since the previous lap (or since the Stages were created) for stage.
+    """
+
+    __slots__ = ("histogram", "mode", "last")
+
+    def __init__(self, histogram: Histogram, mode: str):
+        self.histogram = histogram
+        self.mode = mode
+        self.last = time.perf_counter()
+
+    def lap(self, stage: str, part: str | None = None, part_seconds: float = 0.0):
+        """Records the time since the last lap for stage. part_seconds of it are recorded for part instead."""
+        now = time.perf_counter()
+        if part is not None:
+            self.histogram.observe((self.mode, part), part_seconds)
+        self.histogram.observe((self.mode, stage), now - self.last - part_seconds)
+        self.last = now
+
+
+def render() -> str:
+    """All histograms in the Prometheus text format."""
+    return "".join(histogram.render() for histogram in _histograms)
+
+
+RECOMMEND_STAGE_SECONDS = Histogram(
+    "recipes_recommend_stage_seconds",
+    "Time spent in each stage of a recommendation: cache lookup, vectorize, score, top_k, details, serialize.",
+    ("mode", "stage"),
+)
+FIRESTORE_SECONDS = Histogram(
+    "recipes_firestore_call_seconds",
+    "Duration of Firestore calls made by the routers.",
+    ("operation",),
+)
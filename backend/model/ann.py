@@ -0,0 +1,147 @@
+import os
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# --- Approximate nearest neighbor search ---
+# Exact search scores every recipe sharing a term with the query, which on
+# multi-million recipe catalogs is most of them (salt, oil, onions ...).
+# The approximate index only scores a few thousand candidates per query:
+#
+#   - every recipe row gets a SimHash signature: the signs of its projections
+#     onto n_bits random +-1 hyperplanes, packed into uint64 words. Two rows
+#     agree on a bit with probability 1 - angle / pi, so signatures that
+#     agree on many bits belong to rows with a high cosine similarity
+#   - the signature is cut into bands of BAND_BITS bits, and every band
+#     buckets the recipes by the value of their band (a CSR table over all
+#     2 ** BAND_BITS values). A query looks up its own bucket in every band,
+#     plus the buckets one bit away with probe_radius=1
+#   - if that finds more than max_candidates recipes, the ones closest to the
+#     query in Hamming distance are kept
+#   - candidates are scored exactly and ranked like the exact search
+#
+# Planes and buckets are built by train.py (--ann) and stored in the artifact.
+# The query side knobs trade recall for latency, see benchmarks/bench_ann.py.
+BAND_BITS = 16
+DEFAULT_BITS = 256
+DEFAULT_SEED = 0
+
+# Bands looked up per query, 0 for all of them. Fewer bands are faster and find fewer neighbors
+ANN_BANDS = int(os.environ.get("ANN_BANDS", "0"))
+# 0 looks up the query's own bucket in every band, 1 also the BAND_BITS buckets one bit away
+ANN_PROBE_RADIUS = int(os.environ.get("ANN_PROBE_RADIUS", "1"))
+# Candidates scored exactly per query, the ones closest in Hamming distance if the buckets hold more
+ANN_MAX_CANDIDATES = int(os.environ.get("ANN_MAX_CANDIDATES", "4000"))
+
+# Rows projected at once while building, bounds the dense (rows x n_bits) block
+_BUILD_CHUNK_SIZE = 65_536
+# XOR masks of the keys one bit away from a band value
+_NEIGHBOR_MASKS = np.array([0] + [1 << bit for bit in range(BAND_BITS)], dtype=np.uint16)
+
+
+if hasattr(np, "bitwise_count"):
+    _bit_counts = np.bitwise_count
+else:
+    # numpy < 2 has no bitwise_count
+    def _bit_counts(words: np.ndarray) -> np.ndarray:
+        """Number of set bits of every uint64 word, as uint8 like np.bitwise_count."""
+        bits = np.unpackbits(words.view(np.uint8), axis=-1)
+        return bits.reshape(words.shape + (64,)).sum(axis=-1, dtype=np.uint8)
+
+
+def random_planes(n_terms: int, n_bits: int, seed: int) -> np.ndarray:
+    """(n_terms, n_bits) random +-1 hyperplanes, the same for the same arguments."""
+    rng = np.random.default_rng(seed)
+    return (rng.integers(0, 2, size=(n_terms, n_bits), dtype=np.int8) * 2 - 1).astype(np.int8)
+
+
+def signatures(matrix: csr_matrix, planes: np.ndarray) -> np.ndarray:
+    """(rows, n_bits / 64) uint64 SimHash signatures of the rows of matrix."""
+    matrix = csr_matrix(matrix)
+    n_terms = planes.shape[0]
+    if matrix.shape[1] > n_terms:
+        # Terms newer than the planes (from a later delta) do not count
+        matrix = matrix[:, :n_terms]
+    planes = planes.astype(np.float32)
+    parts = []
+    for start in range(0, matrix.shape[0], _BUILD_CHUNK_SIZE):
+        bits = (matrix[start:start + _BUILD_CHUNK_SIZE] @ planes) > 0
+        parts.append(np.packbits(bits, axis=1, bitorder="little"))
+    packed = np.concatenate(parts) if parts else np.empty((0, planes.shape[1] // 8), dtype=np.uint8)
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+
+class SimHashIndex:
+    """
+    Random hyperplane LSH over the rows of a recipe matrix, see the comment at
+    the top of ann.py. band_indptr[b, key]:band_indptr[b, key + 1] are the
+    positions in band_recipes[b] of the recipes whose band b equals key.
+    """
+
+    __slots__ = ("planes", "signatures", "band_indptr", "band_recipes", "bands", "probe_radius", "max_candidates")
+
+    def __init__(self, planes: np.ndarray, signatures: np.ndarray, band_indptr: np.ndarray, band_recipes: np.ndarray):
+        self.planes = np.asarray(planes)
+        self.signatures = np.asarray(signatures)
+        self.band_indptr = np.asarray(band_indptr)
+        self.band_recipes = np.asarray(band_recipes)
+        self.bands = ANN_BANDS or self.n_bands
+        self.probe_radius = ANN_PROBE_RADIUS
+        self.max_candidates = ANN_MAX_CANDIDATES
+
+    @classmethod
+    def build(cls, matrix: csr_matrix, n_bits: int = DEFAULT_BITS, seed: int = DEFAULT_SEED) -> "SimHashIndex":
+        if n_bits <= 0 or n_bits % 64:
+            raise ValueError(f"The number of signature bits must be a positive multiple of 64, got {n_bits}")
+        planes = random_planes(matrix.shape[1], n_bits, seed)
+        packed = signatures(matrix, planes)
+        keys = packed.view(np.uint16)
+        n_bands = keys.shape[1]
+        band_indptr = np.zeros((n_bands, (1 << BAND_BITS) + 1), dtype=np.int64)
+        band_recipes = np.empty((n_bands, keys.shape[0]), dtype=np.int32)
+        for band in range(n_bands):
+            band_recipes[band] = np.argsort(keys[:, band], kind="stable")
+            band_indptr[band, 1:] = np.cumsum(np.bincount(keys[:, band], minlength=1 << BAND_BITS))
+        return cls(planes, packed, band_indptr, band_recipes)
+
+    @property
+    def n_bits(self) -> int:
+        return self.planes.shape[1]
+
+    @property
+    def n_bands(self) -> int:
+        return self.band_indptr.shape[0]
+
+    def signature(self, query: csr_matrix) -> np.ndarray:
+        """The signature of one (1, n_features) query."""
+        query = csr_matrix(query)
+        known = query.indices < self.planes.shape[0]
+        projection = query.data[known] @ self.planes[query.indices[known]].astype(np.float64)
+        return np.packbits(projection > 0, bitorder="little").view(np.uint64)
+
+    def candidates(self, query: csr_matrix) -> np.ndarray:
+        """Sorted ids of the recipes sharing a (probed) bucket with the query, at most max_candidates."""
+        signature = self.signature(query)
+        bands = np.arange(min(self.bands, self.n_bands))
+        masks = _NEIGHBOR_MASKS[:1 + BAND_BITS * min(self.probe_radius, 1)]
+        keys = (signature.view(np.uint16)[bands, None] ^ masks).astype(np.int64)
+        starts = self.band_indptr[bands[:, None], keys].ravel()
+        ends = self.band_indptr[bands[:, None], keys + 1].ravel()
+        rows = np.repeat(bands, masks.size)
+        found = [self.band_recipes[row, start:end]
+                 for row, start, end in zip(rows.tolist(), starts.tolist(), ends.tolist()) if end > start]
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        # Sorting and dropping repeats is a lot faster than np.unique on these sizes
+        hits = np.sort(np.concatenate(found))
+        candidates = hits[np.concatenate(([True], hits[1:] != hits[:-1]))].astype(np.int64)
+
+        if candidates.size > self.max_candidates:
+            differing = _bit_counts(self.signatures[candidates] ^ signature)
+            # Summing the few word columns one by one beats a reduction along the short axis
+            distances = differing[:, 0].astype(np.int32)
+            for word in range(1, differing.shape[1]):
+                distances += differing[:, word]
+            closest = np.argpartition(distances, self.max_candidates - 1)[:self.max_candidates]
+            candidates = np.sort(candidates[closest])
+        return candidates
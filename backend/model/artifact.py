@@ -0,0 +1,379 @@
+import json
+import os
+import shutil
+import time
+from collections import Counter
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from ann import BAND_BITS, SimHashIndex
+from coverage import IngredientSets
+from filters import CategoryColumn
+from index import InvertedIndex
+from normalize import NORMALIZER_VERSION, ingredient_name, normalize_tokens
+from scoring import Scoring, document_frequencies
+
+# --- On-disk model format ---
+# A model is a directory of raw .npy files plus a manifest.json. Everything is
+# loaded with np.load(mmap_mode='r'), so all workers on a machine share one
+# page-cached copy and loading does not read the arrays at all.
+#
+#   manifest.json                    format and normalizer version, shapes, text fields
+#   indptr.npy, indices.npy          CSR structure of the recipe matrix
+#   counts.npy                       raw term counts (int32)
+#   weights.npy                      weights used for scoring (float64), see scoring.py
+#   idf.npy                          idf of the terms in vocabulary.npy (tfidf and bm25 models only)
+#   postings_indptr.npy, postings.npy, term_max_weight.npy   inverted index
+#   vocabulary.npy, vocabulary_offsets.npy                   terms as one utf-8 blob
+#   ingredient_indptr.npy, ingredient_ids.npy                ingredient ids of every recipe (coverage ranking)
+#   ingredient_postings_indptr.npy, ingredient_postings.npy  recipes of every ingredient
+#   ingredient_names.npy, ingredient_names_offsets.npy       ingredient names as one utf-8 blob
+#   ann_planes.npy, ann_signatures.npy                       approximate index (models trained with --ann)
+#   ann_band_indptr.npy, ann_band_recipes.npy                its LSH buckets, see ann.py
+#   category_<i>_codes.npy                                   value of every recipe for categorical field i
+#   category_<i>.npy, category_<i>_offsets.npy               its values as one utf-8 blob
+#   <field>.npy, <field>_offsets.npy                         one utf-8 blob per text field
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+TEXT_FIELDS = ["Name", "Url", "Ingredients", "Instructions"]
+# Filter terms whose compounds (see Vocabulary.compounds) are remembered per model
+MAX_CACHED_COMPOUNDS = 10_000
+
+def text_value(value) -> str:
+    """How a recipe field is stored: missing values (None or NaN from pandas) become empty strings."""
+    return "" if value is None or value != value else str(value)
+
+
+def ingredients_text(recipe: dict) -> str:
+    """A recipe's ingredient list as one string, the text that gets vectorized."""
+    return ", ".join(recipe.get("Ingredients") or [])
+
+
+def ingredient_names(recipe: dict) -> set[str]:
+    """The distinct ingredients of a recipe."""
+    return {name for name in map(ingredient_name, recipe.get("Ingredients") or []) if name}
+
+
+class TextColumn:
+    """
+    Strings stored back to back in one utf-8 blob, string i is
+    blob[offsets[i]:offsets[i + 1]].
+    """
+
+    __slots__ = ("blob", "offsets", "view")
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        # np.asarray drops the np.memmap subclass (still no copy), which makes slicing a lot cheaper
+        self.blob = np.asarray(blob)
+        self.offsets = np.asarray(offsets)
+        self.view = memoryview(self.blob)
+
+    def __len__(self) -> int:
+        return self.offsets.shape[0] - 1
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self.view[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    @staticmethod
+    def encode(values) -> tuple[np.ndarray, np.ndarray]:
+        encoded = [text_value(value).encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+class Vocabulary:
+    """
+    Maps ingredient text to term count vectors, the same way training does
+    (see normalize.py). Term ids are positions in the sorted term list.
+    """
+
+    def __init__(self, terms: list[str]):
+        self.terms = terms
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self._compounds = {}
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def compounds(self, term: str) -> list[int]:
+        """
+        Ids of the term and of every term it starts or ends a compound of,
+        e.g. "erdnuss" -> "erdnuss", "erdnussbutter"; "ei" -> "ei", "eigelb", "hühnerei".
+        """
+        ids = self._compounds.get(term)
+        if ids is None:
+            ids = [i for i, other in enumerate(self.terms) if other.startswith(term) or other.endswith(term)]
+            if len(self._compounds) < MAX_CACHED_COMPOUNDS:
+                self._compounds[term] = ids
+        return ids
+
+    def transform(self, texts: list[str]) -> csr_matrix:
+        indptr = [0]
+        indices = []
+        data = []
+        for text in texts:
+            counts = Counter(
+                self.term_ids[term] for term in normalize_tokens(text) if term in self.term_ids
+            )
+            for term_id in sorted(counts):
+                indices.append(term_id)
+                data.append(counts[term_id])
+            indptr.append(len(indices))
+        return csr_matrix(
+            (np.array(data, dtype=np.int64), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int32)),
+            shape=(len(texts), len(self.terms)),
+        )
+
+
+class Artifact:
+    """Everything predict.py needs from a trained model directory."""
+
+    def __init__(self, path: str, manifest: dict, vocabulary: Vocabulary, matrix: csr_matrix,
+                 counts: csr_matrix, index: InvertedIndex, columns: dict[str, TextColumn], load_seconds: float,
+                 idf: np.ndarray | None = None, ingredients: IngredientSets | None = None,
+                 ingredient_names: list[str] | None = None, ann: SimHashIndex | None = None,
+                 categories: dict[str, CategoryColumn] | None = None):
+        self.path = path
+        self.manifest = manifest
+        self.scoring = Scoring.from_manifest(manifest)
+        # idf of this artifact's own vocabulary terms, None for count models
+        self.idf = idf
+        # Ingredient sets for coverage ranking and the names of this artifact's own ingredient ids,
+        # None for models trained before coverage ranking existed
+        self.ingredients = ingredients
+        self.ingredient_names = ingredient_names
+        self.vocabulary = vocabulary
+        self.matrix = matrix
+        self.counts = counts
+        self.index = index
+        # Approximate index, None unless the model was trained with one
+        self.ann = ann
+        # Categorical fields (Weekday, Month, ...) for filtering, in manifest order
+        self.categories = categories or {}
+        self.columns = columns
+        self.load_seconds = load_seconds
+
+    @property
+    def n_recipes(self) -> int:
+        return self.matrix.shape[0]
+
+
+def _index_dtype(nnz: int):
+    # indices and indptr share one dtype, otherwise scipy copies them on load
+    return np.int32 if nnz < np.iinfo(np.int32).max else np.int64
+
+
+class ArtifactWriter:
+    """
+    Writes a model directory piece by piece, so a trainer never has to hold
+    every recipe in memory. Text fields are appended chunk by chunk, the
+    matrix is written once at the end.
+
+    Files go to a temporary directory that is swapped in by close(), so
+    readers never see a half written model.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+
+        self.n_recipes = 0
+        self.manifest = {}
+        self._text_parts = {field: open(self._file(f"{field.lower()}.part"), "wb") for field in TEXT_FIELDS}
+        self._text_offsets = {field: [np.zeros(1, dtype=np.int64)] for field in TEXT_FIELDS}
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.tmp_path, name)
+
+    def save(self, name: str, array: np.ndarray):
+        np.save(self._file(f"{name}.npy"), array)
+
+    def append_text(self, columns: dict[str, list]):
+        """Appends the text fields of the next recipes, in recipe order."""
+        n_rows = None
+        for field in TEXT_FIELDS:
+            blob, offsets = TextColumn.encode(columns[field])
+            self._text_parts[field].write(blob.tobytes())
+            self._text_offsets[field].append(offsets[1:] + self._text_offsets[field][-1][-1])
+            n_rows = len(offsets) - 1
+        self.n_recipes += n_rows
+
+    def write_matrix(self, terms: list[str], counts: csr_matrix, scoring: Scoring | None = None,
+                     idf: np.ndarray | None = None) -> csr_matrix:
+        """
+        Writes the vocabulary, the recipe matrix and the inverted index derived from it,
+        and returns the weights matrix. scoring defaults to a count model. idf covers
+        every column of counts, only the entries of the last len(terms) columns (this
+        artifact's own terms) are saved.
+        """
+        counts = csr_matrix(counts)
+        counts.sort_indices()
+        scoring = scoring or Scoring()
+        weights = scoring.weigh(counts, idf)
+        index = InvertedIndex.from_matrix(weights)
+        index_dtype = _index_dtype(counts.nnz)
+
+        self.save("indptr", counts.indptr.astype(index_dtype))
+        self.save("indices", counts.indices.astype(index_dtype))
+        self.save("counts", counts.data.astype(np.int32))
+        self.save("weights", weights.data)
+        self.save("postings_indptr", index.indptr)
+        self.save("postings", index.postings)
+        self.save("term_max_weight", index.max_weights)
+
+        blob, offsets = TextColumn.encode(terms)
+        self.save("vocabulary", blob)
+        self.save("vocabulary_offsets", offsets)
+        if scoring.uses_idf:
+            self.save("idf", np.asarray(idf[len(idf) - len(terms):], dtype=np.float64))
+
+        self.manifest.update({"n_terms": counts.shape[1], "nnz": int(counts.nnz), "scoring": scoring.to_manifest(),
+                              "normalizer_version": NORMALIZER_VERSION})
+        return weights
+
+    def write_ingredients(self, names: list[str], sets: csr_matrix):
+        """
+        Writes the ingredient sets of the recipes, a (recipes x ingredients) matrix.
+        names are the names of the last len(names) ingredient ids, the ones this artifact introduces.
+        """
+        ingredients = IngredientSets.from_matrix(sets)
+        self.save("ingredient_indptr", ingredients.indptr)
+        self.save("ingredient_ids", ingredients.ids)
+        self.save("ingredient_postings_indptr", ingredients.postings_indptr)
+        self.save("ingredient_postings", ingredients.postings)
+        blob, offsets = TextColumn.encode(names)
+        self.save("ingredient_names", blob)
+        self.save("ingredient_names_offsets", offsets)
+        self.manifest["n_ingredients"] = sets.shape[1]
+
+    def write_categories(self, columns: dict[str, CategoryColumn]):
+        """Writes the categorical fields of the recipes, see filters.py."""
+        for i, column in enumerate(columns.values()):
+            self.save(f"category_{i}_codes", column.codes)
+            blob, offsets = TextColumn.encode(column.values)
+            self.save(f"category_{i}", blob)
+            self.save(f"category_{i}_offsets", offsets)
+        self.manifest["categories"] = list(columns)
+
+    def write_ann(self, weights: csr_matrix, n_bits: int, seed: int):
+        """Builds and writes the approximate index over the (normalized) recipe weights, see ann.py."""
+        ann = SimHashIndex.build(weights, n_bits, seed)
+        self.save("ann_planes", ann.planes)
+        self.save("ann_signatures", ann.signatures)
+        self.save("ann_band_indptr", ann.band_indptr)
+        self.save("ann_band_recipes", ann.band_recipes)
+        self.manifest["ann"] = {"bits": n_bits, "band_bits": BAND_BITS, "seed": seed}
+
+    def close(self):
+        for field in TEXT_FIELDS:
+            name = field.lower()
+            self._text_parts[field].close()
+            part_path = self._file(f"{name}.part")
+
+            # Same bytes np.save would write, but the blob is streamed from the part file
+            with open(self._file(f"{name}.npy"), "wb") as f, open(part_path, "rb") as part:
+                header = {"descr": np.dtype(np.uint8).str, "fortran_order": False,
+                          "shape": (os.path.getsize(part_path),)}
+                np.lib.format.write_array_header_1_0(f, header)
+                shutil.copyfileobj(part, f)
+            os.remove(part_path)
+            self.save(f"{name}_offsets", np.concatenate(self._text_offsets[field]))
+
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "created_at": time.time(),
+            "n_recipes": self.n_recipes,
+            **self.manifest,
+            "text_fields": TEXT_FIELDS,
+        }
+        with open(self._file(MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        # Swap the new directory in. Processes that still have the old files mapped keep working,
+        # a load that overlaps with the two renames is retried by segments.load_model().
+        old_path = f"{self.path}.old-{os.getpid()}"
+        if os.path.exists(self.path):
+            os.rename(self.path, old_path)
+        os.rename(self.tmp_path, self.path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+
+def write_artifact(path: str, terms: list[str], counts: csr_matrix, columns: dict[str, list], mode: str = "count",
+                   recipe_ingredients: list[list[str]] | None = None):
+    """
+    Writes a complete model directory from in-memory data.
+    recipe_ingredients are the ingredient lines of every recipe, for coverage ranking.
+    """
+    counts = csr_matrix(counts)
+    scoring = Scoring.fit(mode, counts)
+    writer = ArtifactWriter(path)
+    writer.append_text(columns)
+    writer.write_matrix(terms, counts, scoring, scoring.idf(document_frequencies(counts)))
+    if recipe_ingredients is not None:
+        sets = [ingredient_names({"Ingredients": lines}) for lines in recipe_ingredients]
+        names = sorted(set().union(*sets))
+        ids = {name: i for i, name in enumerate(names)}
+        indices = [ids[name] for recipe in sets for name in recipe]
+        indptr = np.cumsum([0] + [len(recipe) for recipe in sets])
+        writer.write_ingredients(names, csr_matrix(
+            (np.ones(len(indices), dtype=np.int8), np.array(indices, dtype=np.int32), indptr),
+            shape=(len(sets), len(names))))
+    writer.close()
+
+
+def read_manifest(path: str) -> dict:
+    with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_artifact(path: str, n_terms: int | None = None) -> Artifact:
+    """
+    Memory-maps a model directory written by write_artifact.
+    n_terms widens the matrices to a larger (combined) vocabulary without copying them.
+    """
+    start = time.perf_counter()
+    manifest = read_manifest(path)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model format version {manifest.get('format_version')}, expected {FORMAT_VERSION}")
+    if manifest.get("normalizer_version") != NORMALIZER_VERSION:
+        # Queries would be normalized differently from the recipes
+        raise ValueError(f"Model was trained with ingredient normalizer version {manifest.get('normalizer_version')}, "
+                         f"expected {NORMALIZER_VERSION}. Retrain it.")
+
+    def load(name):
+        return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+    shape = (manifest["n_recipes"], n_terms or manifest["n_terms"])
+    indptr, indices = load("indptr"), load("indices")
+    matrix = csr_matrix((load("weights"), indices, indptr), shape=shape, copy=False)
+    counts = csr_matrix((load("counts"), indices, indptr), shape=shape, copy=False)
+    index = InvertedIndex(load("postings_indptr"), load("postings"), load("term_max_weight"))
+
+    vocabulary_column = TextColumn(load("vocabulary"), load("vocabulary_offsets"))
+    vocabulary = Vocabulary([vocabulary_column[i] for i in range(len(vocabulary_column))])
+    columns = {field: TextColumn(load(field.lower()), load(f"{field.lower()}_offsets")) for field in manifest["text_fields"]}
+    idf = load("idf") if os.path.exists(os.path.join(path, "idf.npy")) else None
+
+    ingredients = names = None
+    if "n_ingredients" in manifest:
+        ingredients = IngredientSets(load("ingredient_indptr"), load("ingredient_ids"),
+                                     load("ingredient_postings_indptr"), load("ingredient_postings"))
+        names_column = TextColumn(load("ingredient_names"), load("ingredient_names_offsets"))
+        names = [names_column[i] for i in range(len(names_column))]
+
+    ann = None
+    if "ann" in manifest:
+        ann = SimHashIndex(load("ann_planes"), load("ann_signatures"), load("ann_band_indptr"), load("ann_band_recipes"))
+
+    categories = {}
+    for i, field in enumerate(manifest.get("categories", [])):
+        values_column = TextColumn(load(f"category_{i}"), load(f"category_{i}_offsets"))
+        categories[field] = CategoryColumn(load(f"category_{i}_codes"), [values_column[j] for j in range(len(values_column))])
+
+    return Artifact(path, manifest, vocabulary, matrix, counts, index, columns, time.perf_counter() - start,
+                    idf, ingredients, names, ann, categories)
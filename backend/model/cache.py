@@ -0,0 +1,103 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def canonical_ingredients(ingredients: list[str]) -> tuple[str, ...]:
+    """
+    The cache key form of an ingredient list: lowercased, stripped, without
+    duplicates or empty entries, sorted. Tokenization lowercases anyway and
+    the recipe vectors do not depend on word order, so only repeated
+    ingredients can change the result, and a pantry lists each one once.
+    """
+    return tuple(sorted({ingredient.strip().lower() for ingredient in ingredients} - {""}))
+
+
+def entry_size(value) -> int:
+    """Approximate memory used by a key or value, in bytes."""
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(entry_size(item) for item in value)
+    if getattr(value, "base", None) is not None:
+        # getsizeof leaves out the buffer of numpy arrays that are views
+        return sys.getsizeof(value) + value.nbytes
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """
+    LRU cache with a time to live and a memory budget.
+
+    Entries are evicted least recently used first once their total size
+    exceeds max_bytes, and are ignored after ttl seconds. Safe to use from
+    several threads.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple, tuple[float, int, object]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple):
+        """Returns the cached value for key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, size, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.size -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value):
+        size = entry_size(key) + entry_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.invalidations += 1
+
+    def status(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
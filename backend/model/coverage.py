@@ -0,0 +1,87 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+class IngredientSets:
+    """
+    The distinct ingredients of every recipe, for ranking by pantry coverage.
+
+    Recipe r uses the sorted ingredient ids ids[indptr[r]:indptr[r + 1]].
+    postings is the inverse, ingredient i occurs in the sorted recipe ids
+    postings[postings_indptr[i]:postings_indptr[i + 1]]. How many of a
+    pantry's ingredients every recipe has is then one bincount over the
+    posting lists of the pantry's ingredients, and the number of missing
+    ingredients is the recipe's size minus that.
+    """
+
+    __slots__ = ("indptr", "ids", "postings_indptr", "postings", "_sizes", "_max_size")
+
+    def __init__(self, indptr: np.ndarray, ids: np.ndarray, postings_indptr: np.ndarray, postings: np.ndarray):
+        # np.asarray drops the np.memmap subclass (still no copy), slices of plain arrays are a lot cheaper
+        self.indptr = np.asarray(indptr)
+        self.ids = np.asarray(ids)
+        self.postings_indptr = np.asarray(postings_indptr)
+        self.postings = np.asarray(postings)
+        self._sizes = None
+        self._max_size = None
+
+    @classmethod
+    def from_matrix(cls, sets: csr_matrix) -> "IngredientSets":
+        """Builds the sets from a (recipes x ingredients) matrix, any non-zero entry means the recipe uses the ingredient."""
+        sets = csr_matrix(sets)
+        sets.sort_indices()
+        csc = sets.tocsc()
+        csc.sort_indices()
+        return cls(sets.indptr.astype(np.int64), sets.indices.astype(np.int32),
+                   csc.indptr.astype(np.int64), csc.indices.astype(np.int32))
+
+    def to_matrix(self, n_ingredients: int) -> csr_matrix:
+        """The sets as a (recipes x n_ingredients) matrix of ones."""
+        return csr_matrix((np.ones(self.ids.size, dtype=np.int8), self.ids, self.indptr),
+                          shape=(self.n_recipes, n_ingredients))
+
+    @property
+    def n_recipes(self) -> int:
+        return self.indptr.shape[0] - 1
+
+    @property
+    def n_ingredients(self) -> int:
+        """Ingredient ids this artifact has posting lists for."""
+        return self.postings_indptr.shape[0] - 1
+
+    @property
+    def sizes(self) -> np.ndarray:
+        """Number of distinct ingredients of every recipe."""
+        if self._sizes is None:
+            self._sizes = np.diff(self.indptr)
+        return self._sizes
+
+    @property
+    def max_size(self) -> int:
+        if self._max_size is None:
+            self._max_size = int(self.sizes.max()) if self.n_recipes else 0
+        return self._max_size
+
+    def recipes_with(self, ingredient: int) -> np.ndarray:
+        """Sorted ids of the recipes using an ingredient."""
+        if ingredient >= self.n_ingredients:
+            return np.empty(0, dtype=np.int32)
+        return self.postings[self.postings_indptr[ingredient]:self.postings_indptr[ingredient + 1]]
+
+    def covered(self, pantry_ids: np.ndarray) -> np.ndarray:
+        """How many of the pantry's ingredients (unique ids) every recipe uses."""
+        known = pantry_ids[pantry_ids < self.n_ingredients]
+        if known.size == 0:
+            return np.zeros(self.n_recipes, dtype=np.int64)
+        hits = np.concatenate([self.postings[start:end] for start, end in
+                               zip(self.postings_indptr[known].tolist(), self.postings_indptr[known + 1].tolist())])
+        return np.bincount(hits, minlength=self.n_recipes)
+
+    def missing(self, recipe: int, pantry_ids: np.ndarray) -> np.ndarray:
+        """Ingredient ids of a recipe that are not in the pantry (sorted, unique ids)."""
+        return np.setdiff1d(self.ids[self.indptr[recipe]:self.indptr[recipe + 1]], pantry_ids, assume_unique=True)
+
+
+def coverage_order(ids: np.ndarray, missing: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """Fewest missing ingredients first, then highest score, then highest id, like every other ranking."""
+    return np.lexsort((-ids, -scores, missing))
@@ -0,0 +1,306 @@
+import threading
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.preprocessing import normalize
+
+from ann import SimHashIndex
+from index import InvertedIndex
+
+# Upper bounds are summed in a different order than the real dot products,
+# so leave a little room for floating point rounding before pruning
+_BOUND_SLACK = 1e-9
+
+# search_many scores at most this many queries per sparse matrix-matrix product,
+# and keeps the dense (queries x recipes) block of a chunk under BATCH_MAX_SCORES entries
+BATCH_CHUNK_SIZE = 256
+BATCH_MAX_SCORES = 8_000_000
+
+# Seconds each thread has spent in top_k(), see top_k_seconds()
+_top_k_time = threading.local()
+
+
+def top_k_seconds() -> float:
+    """
+    Seconds the current thread has spent in top_k() so far. The searches
+    select the top k as part of scoring, the difference before and after
+    one tells how much of it was the selection (see predict.py).
+    """
+    return getattr(_top_k_time, "seconds", 0.0)
+
+
+def top_k(scores: np.ndarray, k: int, ids: np.ndarray | None = None) -> np.ndarray:
+    """
+    Returns the positions of the k highest scores, best first.
+
+    Ties are broken by the higher id first (ids default to the positions
+    themselves), so the order is the same as
+    np.argsort(scores, kind="stable")[::-1][:k] on the full catalog, but
+    only the top k entries are ever sorted.
+    """
+    start = time.perf_counter()
+    try:
+        return _top_k(scores, k, ids)
+    finally:
+        _top_k_time.seconds = top_k_seconds() + time.perf_counter() - start
+
+
+def _top_k(scores: np.ndarray, k: int, ids: np.ndarray | None) -> np.ndarray:
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if ids is None:
+        ids = np.arange(n)
+
+    if k < n:
+        # argpartition puts the k largest scores into the last k slots (unordered)
+        partition = np.argpartition(scores, n - k)[n - k:]
+        threshold = scores[partition].min()
+
+        # Everything above the threshold is in; ties at the threshold are
+        # resolved by taking the highest ids first
+        above = np.flatnonzero(scores > threshold)
+        ties = np.flatnonzero(scores == threshold)
+        ties = ties[np.argsort(-ids[ties], kind="stable")][:k - above.size]
+        candidates = np.concatenate([above, ties])
+    else:
+        candidates = np.arange(n)
+
+    # Sort only the k candidates: score descending, then id descending
+    order = np.lexsort((-ids[candidates], -scores[candidates]))
+    return candidates[order]
+
+
+class ScoringEngine:
+    """
+    Exact cosine similarity scoring over the recipe matrix.
+
+    The recipe matrix is L2-normalized once when the engine is built, so a
+    query only needs to normalize its own vector and do a single sparse
+    matrix-vector product. With an inverted index, only recipes sharing a
+    token with the query are scored. With an approximate index (see ann.py),
+    searches can be asked to only score the candidates it finds.
+    """
+
+    def __init__(self, matrix: csr_matrix, normalized: bool = False, index: InvertedIndex | None = None,
+                 ann: SimHashIndex | None = None):
+        matrix = csr_matrix(matrix)
+        if not normalized:
+            matrix = normalize(matrix, norm="l2", copy=True)
+        self.matrix = matrix
+        self.index = index
+        self.ann = ann
+
+    @property
+    def n_recipes(self) -> int:
+        return self.matrix.shape[0]
+
+    def score(self, query_vector: csr_matrix) -> np.ndarray:
+        """Cosine similarity of a (1, n_features) query against every recipe."""
+        query = normalize(query_vector, norm="l2", copy=True)
+        return self.matrix @ query.toarray().ravel()
+
+    def score_rows(self, query_vector: csr_matrix, rows: np.ndarray) -> np.ndarray:
+        """Scores of a (1, n_features) query against the given recipes only."""
+        query = normalize(query_vector, norm="l2", copy=True)
+        return self.matrix[rows] @ query.toarray().ravel()
+
+    def search(self, query_vector: csr_matrix, top_n: int = 5, approximate: bool = False,
+               allowed: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (indices, scores) of the top_n most similar recipes.
+        approximate uses the approximate index if the engine has one.
+        allowed is a boolean mask of the recipes that may be returned, the others are never scored.
+        """
+        if allowed is not None:
+            return self._search_allowed(query_vector, top_n, approximate, allowed)
+        if approximate and self.ann is not None:
+            result = self._search_ann(query_vector, top_n)
+            if result is not None:
+                return result
+        if self.index is not None:
+            return self._search_index(query_vector, top_n)
+
+        scores = self.score(query_vector)
+        indices = top_k(scores, top_n)
+        return indices, scores[indices]
+
+    def search_many(self, query_matrix: csr_matrix, top_n: int = 5,
+                    approximate: bool = False) -> list[tuple[np.ndarray, np.ndarray]]:
+        """
+        Batched search: one (indices, scores) pair per row of query_matrix.
+
+        All queries of a chunk are scored with a single sparse matrix-matrix
+        product and the top_n of every row is picked with one lexsort over the
+        non-zero scores, instead of looping over the queries. Approximate
+        searches only score a few candidates each and are run one by one.
+        """
+        if approximate and self.ann is not None:
+            query_matrix = csr_matrix(query_matrix)
+            return [self.search(query_matrix[row], top_n, approximate=True) for row in range(query_matrix.shape[0])]
+        queries = normalize(csr_matrix(query_matrix), norm="l2", copy=True)
+        k = min(top_n, self.n_recipes)
+        chunk_size = max(1, min(BATCH_CHUNK_SIZE, BATCH_MAX_SCORES // max(self.n_recipes, 1)))
+        results = []
+        for start in range(0, queries.shape[0], chunk_size):
+            chunk = queries[start:start + chunk_size]
+            results.extend(self._search_chunk(chunk, k))
+        return results
+
+    def _search_chunk(self, queries: csr_matrix, k: int) -> list[tuple[np.ndarray, np.ndarray]]:
+        n_queries = queries.shape[0]
+        if k <= 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0)) for _ in range(n_queries)]
+
+        # (n_queries, n_recipes), only recipes sharing a token with a query are stored.
+        # Computed as X @ Q.T so every score is summed in the same order as in search().
+        scores = (self.matrix @ queries.T).T.tocsr()
+        counts = np.diff(scores.indptr)
+        rows = np.repeat(np.arange(n_queries), counts)
+
+        # k-th best score of every row in one vectorized partition, then only
+        # entries reaching it need to be sorted
+        if k < self.n_recipes:
+            dense = scores.toarray()
+            thresholds = np.partition(dense, self.n_recipes - k, axis=1)[:, self.n_recipes - k]
+            del dense
+            reaching = scores.data >= thresholds[rows]
+        else:
+            reaching = np.ones(scores.nnz, dtype=bool)
+        rows, indices, data = rows[reaching], scores.indices[reaching], scores.data[reaching]
+
+        # Per row: score descending, then recipe index descending
+        order = np.lexsort((-indices, -data, rows))
+        counts = np.bincount(rows, minlength=n_queries)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        rank = np.arange(order.size) - np.repeat(starts, counts)
+        keep = order[rank < k]
+        kept_indptr = np.concatenate([[0], np.cumsum(np.minimum(counts, k))])
+        kept_indices = indices[keep].astype(np.int64)
+        kept_scores = data[keep]
+
+        results = []
+        for row in range(n_queries):
+            indices = kept_indices[kept_indptr[row]:kept_indptr[row + 1]]
+            row_scores = kept_scores[kept_indptr[row]:kept_indptr[row + 1]]
+            if indices.size < k:
+                indices, row_scores = self._fill_zero_scores(indices, row_scores, k)
+            results.append((indices, row_scores))
+        return results
+
+    def _fill_zero_scores(self, indices: np.ndarray, scores: np.ndarray, k: int,
+                          allowed: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Pads a result that has fewer than k matches with zero-score recipes,
+        highest index first, the same way the brute-force ranking does.
+        """
+        if allowed is not None:
+            fill = np.flatnonzero(allowed)[::-1]
+            fill = fill[~np.isin(fill, indices)][:k - indices.size]
+            return np.concatenate([indices, fill]), np.concatenate([scores, np.zeros(fill.size)])
+        seen = set(indices.tolist())
+        fill = []
+        recipe_id = self.n_recipes - 1
+        while len(fill) < k - indices.size:
+            if recipe_id not in seen:
+                fill.append(recipe_id)
+            recipe_id -= 1
+        return (np.concatenate([indices, np.array(fill, dtype=np.int64)]),
+                np.concatenate([scores, np.zeros(len(fill))]))
+
+    def _search_index(self, query_vector: csr_matrix, top_n: int,
+                      allowed: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        MaxScore-style search over the inverted index.
+
+        Terms are visited from the highest to the lowest upper bound. Once the
+        bounds of the terms left can no longer reach the current top_n
+        threshold, recipes that only appear in those terms' posting lists
+        cannot make it into the result and are never scored. Candidates are
+        scored exactly like the brute-force path, so the ranking is identical.
+        Recipes outside allowed are dropped from the posting lists before scoring.
+        """
+        k = min(top_n, self.n_recipes if allowed is None else int(np.count_nonzero(allowed)))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        query = normalize(query_vector, norm="l2", copy=True)
+        query_dense = query.toarray().ravel()
+
+        # Terms added after the index was built (newer delta vocabulary) cannot match any recipe here
+        in_index = query.indices < self.index.n_terms
+        terms = query.indices[in_index]
+
+        upper_bounds = query.data[in_index] * self.index.max_weights[terms]
+        order = np.argsort(-upper_bounds, kind="stable")
+        # remaining[i] = best score a recipe could get from terms order[i:] alone
+        remaining = np.cumsum(upper_bounds[order][::-1])[::-1]
+
+        candidates = np.empty(0, dtype=np.int64)
+        candidate_scores = np.empty(0, dtype=np.float64)
+        for position, term in enumerate(terms[order]):
+            if candidates.size >= k:
+                threshold = np.partition(candidate_scores, candidates.size - k)[candidates.size - k]
+                if remaining[position] * (1 + _BOUND_SLACK) < threshold:
+                    break
+
+            new = self.index.postings_for(term)
+            if allowed is not None:
+                new = new[allowed[new]]
+            new = np.setdiff1d(new, candidates, assume_unique=True)
+            if new.size == 0:
+                continue
+            candidates = np.concatenate([candidates, new])
+            candidate_scores = np.concatenate([candidate_scores, self.matrix[new] @ query_dense])
+
+        best = top_k(candidate_scores, k, ids=candidates)
+        indices, scores = candidates[best], candidate_scores[best]
+
+        if indices.size < k:
+            # Fewer matches than requested
+            indices, scores = self._fill_zero_scores(indices, scores, k, allowed)
+
+        return indices, scores
+
+    def _search_ann(self, query_vector: csr_matrix, top_n: int) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        Scores only the candidates of the approximate index, exactly and ranked
+        like the exact search. None if they are fewer than top_n, the exact
+        search answers those queries.
+        """
+        k = min(top_n, self.n_recipes)
+        candidates = self.ann.candidates(query_vector)
+        if candidates.size < k:
+            return None
+        scores = self.score_rows(query_vector, candidates)
+        best = top_k(scores, k, ids=candidates)
+        return candidates[best], scores[best]
+
+    def _search_allowed(self, query_vector: csr_matrix, top_n: int, approximate: bool,
+                        allowed: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """search() among the allowed recipes only."""
+        rows = np.flatnonzero(allowed)
+        k = min(top_n, rows.size)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        if approximate and self.ann is not None:
+            candidates = self.ann.candidates(query_vector)
+            candidates = candidates[allowed[candidates]]
+            if candidates.size >= k:
+                scores = self.score_rows(query_vector, candidates)
+                best = top_k(scores, k, ids=candidates)
+                return candidates[best], scores[best]
+
+        if self.index is not None:
+            # Walking the posting lists pays off unless the filter leaves fewer recipes than they hold
+            terms = query_vector.indices[query_vector.indices < self.index.n_terms]
+            postings = int((self.index.indptr[terms + 1] - self.index.indptr[terms]).sum())
+            if rows.size > postings:
+                return self._search_index(query_vector, top_n, allowed)
+
+        scores = self.score_rows(query_vector, rows)
+        best = top_k(scores, k, ids=rows)
+        return rows[best], scores[best]
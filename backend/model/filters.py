@@ -0,0 +1,125 @@
+import numpy as np
+
+from coverage import IngredientSets
+from index import InvertedIndex
+
+# Top-level recipe fields other than the text fields are stored as categorical
+# columns (Weekday, Month, ...) as long as they have at most this many distinct
+# values, see train.py
+CATEGORY_MAX_VALUES = 1_000
+
+
+def is_category_value(value) -> bool:
+    """Whether a recipe field's value can be part of a categorical column."""
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+class CategoryColumn:
+    """
+    One categorical recipe field. Recipe r has the value values[codes[r]],
+    values are sorted and distinct.
+    """
+
+    __slots__ = ("codes", "values", "_value_codes")
+
+    def __init__(self, codes: np.ndarray, values: list[str]):
+        self.codes = np.asarray(codes)
+        self.values = values
+        self._value_codes = {value: code for code, value in enumerate(values)}
+
+    @classmethod
+    def encode(cls, values: list[str]) -> "CategoryColumn":
+        """The column of one value (as text, see artifact.text_value) per recipe."""
+        distinct = sorted(set(values))
+        codes = {value: code for code, value in enumerate(distinct)}
+        return cls(np.array([codes[value] for value in values], dtype=np.uint16), distinct)
+
+    @classmethod
+    def from_codes(cls, codes: np.ndarray, values: list[str]) -> "CategoryColumn":
+        """The column of codes into values given in any order. Values no recipe has are dropped."""
+        used = sorted(np.unique(codes).tolist(), key=values.__getitem__)
+        new_codes = np.zeros(len(values), dtype=np.uint16)
+        new_codes[used] = np.arange(len(used))
+        return cls(new_codes[codes], [values[code] for code in used])
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    def __getitem__(self, recipe: int) -> str:
+        return self.values[self.codes[recipe]]
+
+    def mask(self, wanted) -> np.ndarray:
+        """Which recipes have one of the wanted values."""
+        lookup = np.zeros(len(self.values), dtype=bool)
+        lookup[[self._value_codes[value] for value in wanted if value in self._value_codes]] = True
+        return lookup[self.codes]
+
+
+class RecipeFilter:
+    """
+    Conditions every recommended recipe has to meet. Searches turn the filter
+    into a boolean mask over the recipes before anything is scored (see
+    SegmentedModel.filter_masks), so a filter that leaves few recipes makes
+    a search cheaper.
+
+    Ingredients are terms (see normalize.normalize_tokens), matched against
+    the inverted index, so excluding "erdnuss" also drops recipes with
+    "gesalzene Erdnüsse" or "Erdnussbutter": an excluded term drops every
+    recipe with a term it starts or ends (see Vocabulary.compounds). That
+    errs on the side of dropping too much, exclusions are mostly allergens.
+    A recipe has to contain every required term itself.
+    Categories map a categorical field to the values a recipe may have.
+    """
+
+    __slots__ = ("exclude", "require", "max_ingredients", "categories")
+
+    def __init__(self, exclude=(), require=(), max_ingredients: int | None = None,
+                 categories: dict[str, list] | None = None):
+        self.exclude = tuple(sorted(set(exclude)))
+        self.require = tuple(sorted(set(require)))
+        self.max_ingredients = max_ingredients
+        self.categories = tuple(sorted((field, tuple(sorted({str(value) for value in values})))
+                                       for field, values in (categories or {}).items()))
+
+    def __bool__(self) -> bool:
+        return bool(self.exclude or self.require or self.max_ingredients is not None or self.categories)
+
+    @property
+    def uses_ingredient_sets(self) -> bool:
+        """Whether the filter needs the ingredient sets of the model."""
+        return self.max_ingredients is not None
+
+    def key(self) -> tuple:
+        """A hashable form of the filter, for cache keys."""
+        return self.exclude, self.require, self.max_ingredients, self.categories
+
+    def mask(self, n_recipes: int, sets: IngredientSets | None, categories: dict[str, CategoryColumn],
+             index: InvertedIndex, excluded: list[int], required: list[int | None]) -> np.ndarray:
+        """
+        Which of n_recipes recipes (of one artifact) meet every condition.
+        excluded are the ids of the excluded terms and their compounds, required
+        the ids of the required terms (None if the model does not know one).
+        """
+        allowed = np.ones(n_recipes, dtype=bool)
+        if self.max_ingredients is not None:
+            allowed &= sets.sizes <= self.max_ingredients
+        for term in excluded:
+            allowed[_postings(index, term)] = False
+        if None in required:
+            # No recipe has a term the model has never seen
+            allowed[:] = False
+        else:
+            for term in required:
+                has_term = np.zeros(n_recipes, dtype=bool)
+                has_term[_postings(index, term)] = True
+                allowed &= has_term
+        for field, values in self.categories:
+            allowed &= categories[field].mask(values)
+        return allowed
+
+
+def _postings(index: InvertedIndex, term: int) -> np.ndarray:
+    # Terms introduced by a later delta are not in an earlier segment's index
+    if term >= index.n_terms:
+        return np.empty(0, dtype=np.int32)
+    return index.postings_for(term)
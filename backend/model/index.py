@@ -0,0 +1,41 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+class InvertedIndex:
+    """
+    Vocabulary term -> posting list of recipe ids.
+
+    The posting lists are stored back to back in one int32 array, term t owns
+    postings[indptr[t]:indptr[t + 1]] (sorted recipe ids). max_weights[t] is the
+    largest normalized weight term t has in any recipe, which gives an upper
+    bound on how much the term can add to a cosine score.
+    """
+
+    def __init__(self, indptr: np.ndarray, postings: np.ndarray, max_weights: np.ndarray):
+        self.indptr = indptr
+        self.postings = postings
+        self.max_weights = max_weights
+
+    @property
+    def n_terms(self) -> int:
+        return self.indptr.shape[0] - 1
+
+    def postings_for(self, term: int) -> np.ndarray:
+        return self.postings[self.indptr[term]:self.indptr[term + 1]]
+
+    @classmethod
+    def from_matrix(cls, matrix: csr_matrix) -> "InvertedIndex":
+        """Builds the index from the (already normalized) recipe matrix."""
+        csc = matrix.tocsc()
+        csc.sort_indices()
+        indptr = csc.indptr.astype(np.int64)
+        postings = csc.indices.astype(np.int32)
+
+        lengths = np.diff(indptr)
+        max_weights = np.zeros(lengths.shape[0], dtype=np.float64)
+        non_empty = lengths > 0
+        if non_empty.any():
+            max_weights[non_empty] = np.maximum.reduceat(csc.data, indptr[:-1][non_empty])
+
+        return cls(indptr, postings, max_weights)
@@ -0,0 +1,145 @@
+import re
+from functools import lru_cache
+
+# --- Ingredient normalization ---
+# Training (train.py, update.py) and queries (Vocabulary.transform, pantry
+# names for coverage ranking) turn ingredient text into terms with the same
+# steps, so "2 EL gehackte Tomaten", "Tomate" and "Paradeiser" all end up as
+# the term "tomate":
+#
+#   1. lowercase and split into tokens (CountVectorizer's default pattern)
+#   2. drop quantities (tokens starting with a digit, like "500g"), units,
+#      preparation words and filler words
+#   3. strip plural endings (German and English)
+#   4. map synonyms and regional names to one term
+#
+# Steps 2-4 only look at one token at a time, so they are compiled into a
+# lookup table: the fixed words are in it from the start, every other token
+# is added the first time it is seen.
+#
+# A model stores the NORMALIZER_VERSION it was trained with, and is only
+# loaded by code with the same version. Bump it whenever a word list or a
+# rule below changes, and retrain.
+NORMALIZER_VERSION = 2
+
+TOKEN_PATTERN = r"(?u)\b\w\w+\b"
+_token_re = re.compile(TOKEN_PATTERN)
+
+# Quantities and units
+UNIT_WORDS = frozenset([
+    "mg", "kg", "ml", "cl", "dl", "liter", "el", "tl", "msp", "prise", "prisen", "stück", "stk", "zehe", "zehen",
+    "dose", "dosen", "pck", "pkt", "packung", "packungen", "päckchen", "bund", "becher", "tasse", "tassen", "glas",
+    "gläser", "scheibe", "scheiben", "schuss", "spritzer", "handvoll", "würfel", "beutel", "flasche", "kopf", "stange",
+    "stangen", "zweig", "zweige", "blatt", "blätter",
+    "cup", "cups", "tbsp", "tsp", "tablespoon", "tablespoons", "teaspoon", "teaspoons", "oz", "ounce", "ounces",
+    "lb", "lbs", "pound", "pounds", "gram", "grams", "pinch", "can", "cans", "clove", "cloves", "slice", "slices",
+])
+# Words that describe how an ingredient is prepared or how much of it is used, not what it is
+DESCRIPTORS = frozenset([
+    "frisch", "frische", "frischer", "frisches", "gehackt", "gehackte", "gehackter", "gewürfelt", "gewürfelte",
+    "gerieben", "geriebene", "geriebener", "geschält", "geschälte", "gekocht", "gekochte", "fein", "feine",
+    "grob", "klein", "kleine", "kleiner", "groß", "große", "großer", "gross", "grosse", "mittelgroß", "mittelgroße",
+    "etwas", "evtl", "ca", "etwa", "nach", "belieben", "bedarf", "geschmack", "und", "oder", "mit", "von", "für",
+    "zum", "zur", "tk", "roma",
+    "fresh", "chopped", "diced", "minced", "sliced", "grated", "peeled", "large", "small", "medium", "finely",
+    "roughly", "and", "or", "of", "to", "taste",
+])
+# Plurals the suffix rules in stem() get wrong
+PLURALS = {
+    "eier": "ei", "eiern": "ei", "kräuter": "kraut", "äpfel": "apfel", "äpfeln": "apfel", "nüsse": "nuss",
+    "walnüsse": "walnuss", "haselnüsse": "haselnuss", "erdnüsse": "erdnuss", "tomatoes": "tomato",
+    "potatoes": "potato", "leaves": "leaf", "chilis": "chili", "chilies": "chili", "chillies": "chili",
+    "cookies": "cookie", "peas": "pea",
+}
+# Endings of words that are not plurals, or whose plural looks the same
+_SINGULAR_ENDINGS = ("chen", "lein", "ss", "us", "is", "as", "os")
+# Synonyms, regional and English names, mapped to one term. Keys and values
+# are written as singulars, they go through stem() when the table is built.
+SYNONYMS = {
+    "paradeiser": "tomate", "tomato": "tomate", "kirschtomate": "tomate", "cocktailtomate": "tomate",
+    "strauchtomate": "tomate", "erdapfel": "kartoffel", "potato": "kartoffel", "möhre": "karotte",
+    "mohrrübe": "karotte", "carrot": "karotte", "onion": "zwiebel", "knoblauchzehe": "knoblauch",
+    "garlic": "knoblauch", "obers": "sahne", "schlagobers": "sahne", "schlagsahne": "sahne", "cream": "sahne",
+    "topfen": "quark", "faschiertes": "hackfleisch", "hack": "hackfleisch", "porree": "lauch", "leek": "lauch",
+    "karfiol": "blumenkohl", "melanzani": "aubergine", "eggplant": "aubergine", "zucchino": "zucchini",
+    "marille": "aprikose", "kren": "meerrettich", "semmelbrösel": "paniermehl", "egg": "ei", "flour": "mehl",
+    "sugar": "zucker", "salt": "salz", "pepper": "pfeffer", "milk": "milch", "oil": "öl", "water": "wasser",
+    "rice": "reis", "cheese": "käse", "honey": "honig", "vinegar": "essig", "mustard": "senf",
+    "basil": "basilikum", "parsley": "petersilie", "chicken": "hähnchen", "hühnchen": "hähnchen",
+}
+# Tokens that are added to the table at most, so arbitrary pantry input cannot grow it without bounds
+MAX_TABLE_SIZE = 1_000_000
+
+
+def tokenize(text: str) -> list[str]:
+    """Splits ingredient text into lowercase tokens, before normalization."""
+    return _token_re.findall(text.lower())
+
+
+def stem(token: str) -> str:
+    """Strips the plural ending of a German or English ingredient word."""
+    if token in PLURALS:
+        return PLURALS[token]
+    if len(token) <= 3 or token.endswith(_SINGULAR_ENDINGS):
+        return token
+    # eggs -> egg, figs -> fig
+    if len(token) == 4:
+        return token[:-1] if token.endswith("s") else token
+    # berries -> berry
+    if token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith("oes"):
+        return token[:-2]
+    # zwiebeln -> zwiebel, tomaten -> tomate
+    if token.endswith(("en", "ln", "rn")):
+        return token[:-1]
+    # champignons -> champignon, onions -> onion
+    if token.endswith("s"):
+        return token[:-1]
+    return token
+
+
+def _term(token: str) -> str | None:
+    if token in UNIT_WORDS or token in DESCRIPTORS or token[0].isdigit():
+        return None
+    term = stem(token)
+    return _synonyms.get(term, term)
+
+
+# Stemmed synonym -> stemmed term, then the table with every fixed word in it
+_synonyms = {stem(word): stem(term) for word, term in SYNONYMS.items()}
+_table = {word: _term(word) for word in [*UNIT_WORDS, *DESCRIPTORS, *PLURALS, *SYNONYMS]}
+_missing = object()
+
+
+def normalize_token(token: str) -> str | None:
+    """The term for a lowercase token, or None if the token is dropped."""
+    term = _table.get(token, _missing)
+    if term is _missing:
+        term = _term(token)
+        if len(_table) < MAX_TABLE_SIZE:
+            _table[token] = term
+    return term
+
+
+def normalize_tokens(text: str) -> list[str]:
+    """The terms of some ingredient text, in order, the way training and queries see them."""
+    table = _table
+    terms = []
+    for token in _token_re.findall(text.lower()):
+        term = table.get(token, _missing)
+        if term is _missing:
+            term = normalize_token(token)
+        if term is not None:
+            terms.append(term)
+    return terms
+
+
+@lru_cache(maxsize=100_000)
+def ingredient_name(line: str) -> str:
+    """
+    The ingredient an ingredient line or a pantry entry is about, e.g.
+    "500 g frische Tomaten" -> "tomate". Lines and pantry entries are
+    normalized the same way, so "Tomaten" in a pantry matches that line.
+    """
+    return " ".join(normalize_tokens(line))
@@ -1,114 +1,301 @@
-import joblib
+import logging
+import os
+import sys
 import numpy as np
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import CountVectorizer # Optional: for type hinting
-from scipy.sparse._csr import csr_matrix # Optional: for type hinting
+
+# predict.py is loaded by file path from main.py, so make sure its sibling modules are importable,
+# and the backend's own modules (metrics.py) when it is run directly
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import RECOMMEND_STAGE_SECONDS, Stages
+from engine import top_k_seconds
+from normalize import ingredient_name, normalize_tokens
+from cache import ResultCache, canonical_ingredients
+from filters import RecipeFilter
+from registry import ModelRegistry
 
 # --- Configuration ---
-MODEL_PATH = "model\model.pkl"
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+# Model directory written by train.py, next to this file unless MODEL_ARTIFACT_PATH says otherwise
+ARTIFACT_PATH = os.environ.get("MODEL_ARTIFACT_PATH", os.path.join(MODEL_DIR, "artifact"))
+# Seconds between checks for a retrained or updated model, 0 disables the watcher
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", "10"))
+# Memory budget and lifetime of cached recommendation results
+RECOMMEND_CACHE_BYTES = int(os.environ.get("RECOMMEND_CACHE_BYTES", str(32 << 20)))
+RECOMMEND_CACHE_TTL = float(os.environ.get("RECOMMEND_CACHE_TTL", "600"))
+# "exact" scores every candidate recipe. "ann" searches with the approximate index of models trained
+# with one (train.py --ann), which is faster on large catalogs but can miss recipes, so it has to be chosen
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "exact")
+APPROXIMATE = SEARCH_BACKEND == "ann"
+
+logger = logging.getLogger(__name__)
 
 # --- Load Objects ---
-_vectorizer: CountVectorizer | None = None
-_recipe_matrix_X: csr_matrix | None = None
-_recipes_df: pd.DataFrame | None = None
+# Holds the current model snapshot (base artifact plus delta segments) and swaps in new ones on reload
+registry = ModelRegistry(ARTIFACT_PATH)
 
 try:
-    print(f"Attempting to load data bundle from: {MODEL_PATH}")
-    # Load the tuple saved by train.py
-    loaded_data = joblib.load(MODEL_PATH)
-
-    if isinstance(loaded_data, tuple) and len(loaded_data) == 3:
-        # Unpack based on the known order from train.py
-        _vectorizer, _recipe_matrix_X, _recipes_df = loaded_data
-        print("Successfully unpacked vectorizer, recipe matrix (X), and recipes DataFrame.")
-
-        # Basic validation of types
-        if not isinstance(_vectorizer, CountVectorizer):
-            print(f"Warning: Expected CountVectorizer at index 0, got {type(_vectorizer)}")
-        if not isinstance(_recipe_matrix_X, csr_matrix):
-            print(f"Warning: Expected csr_matrix at index 1, got {type(_recipe_matrix_X)}")
-        if not isinstance(_recipes_df, pd.DataFrame):
-            print(f"Warning: Expected DataFrame at index 2, got {type(_recipes_df)}")
-
-    else:
-        raise TypeError(f"Loaded data is not the expected tuple of 3 items. Type: {type(loaded_data)}")
+    logger.info("Attempting to load model artifact from: %s", ARTIFACT_PATH)
+    # Arrays are memory-mapped, nothing is read until a request needs it
+    loaded = registry.load()
+    logger.info("Loaded model %s (format v%s) with %d recipes and %d terms in %.1f ms.", loaded.version,
+                loaded.model.base.manifest['format_version'], loaded.model.n_recipes, len(loaded.model.vocabulary),
+                loaded.load_seconds * 1000)
 
 except FileNotFoundError as e:
-    print(f"CRITICAL ERROR loading file: {e}. Recommendation functionality will be disabled.")
-except TypeError as e:
-    print(f"CRITICAL ERROR during unpacking or type checking: {e}")
+    logger.critical("Error loading file: %s. Recommendation functionality will be disabled until a model is trained.", e)
+except ValueError as e:
+    logger.critical("Error reading model artifact: %s", e)
 except Exception as e:
-    print(f"CRITICAL ERROR during loading: {e}.")
-    # Ensure variables are None if loading fails
-    _vectorizer = _recipe_matrix_X = _recipes_df = None
+    logger.critical("Error during loading: %s.", e)
+
+# Households ask for the same pantry over and over, so the matching recipe ids are cached per
+# canonical ingredient list and top_n. Entries also carry the model generation, and are dropped on reload.
+result_cache = ResultCache(RECOMMEND_CACHE_BYTES, RECOMMEND_CACHE_TTL)
+registry.on_swap(lambda snapshot: result_cache.clear())
+
+if MODEL_WATCH_INTERVAL > 0:
+    registry.watch(MODEL_WATCH_INTERVAL)
+
+# --- Recommendation Functions ---
+def recipe_filter(exclude_ingredients: list[str] = (), require_ingredients: list[str] = (),
+                  max_ingredients: int | None = None, categories: dict[str, list] | None = None) -> RecipeFilter | None:
+    """
+    The filter for the given request parameters, None if they do not filter anything.
+    Ingredient names are split into terms like queries, see RecipeFilter.
+    Raises ValueError if the loaded model cannot apply the filter.
+    """
+    exclude = [term for name in exclude_ingredients for term in normalize_tokens(name)]
+    require = [term for name in require_ingredients for term in normalize_tokens(name)]
+    result = RecipeFilter(exclude, require, max_ingredients, categories)
+    if not result:
+        return None
+
+    snapshot = registry.current()
+    if snapshot is None:
+        return result
+    if result.uses_ingredient_sets and snapshot.model.ingredients is None:
+        raise ValueError("The loaded model has no ingredient sets, retrain it to filter by max_ingredients.")
+    unknown = [field for field, _ in result.categories if field not in snapshot.model.categories]
+    if unknown:
+        raise ValueError(f"Unknown categorical fields: {unknown}. Available fields: {snapshot.model.categories}")
+    return result
 
-# --- Recommendation Function ---
-def recommend(ingredients: list[str], top_n: int = 5):
+def recommend(ingredients: list[str], top_n: int = 5, fields: list[str] | None = None,
+              recipe_filter: RecipeFilter | None = None):
     """
     Recommends recipes based on cosine similarity between input ingredients
     and recipes in the database, including full instructions.
+    fields limits the returned recipe fields (default: all of them).
+    recipe_filter (see recipe_filter()) limits the recipes that are considered.
     """
     # Check if necessary components are loaded
-    if _vectorizer is None or _recipe_matrix_X is None or _recipes_df is None:
-        print("Error: Required components (vectorizer, recipe matrix, df) not loaded. Cannot recommend.")
+    # Use one snapshot for the whole request, even if a reload swaps in a new model meanwhile
+    snapshot = registry.current()
+    if snapshot is None:
+        logger.error("Model not loaded. Cannot recommend.")
         return [] # Return empty list or raise an error
 
+    # Timings of every stage go to GET /metrics
+    stages = Stages(RECOMMEND_STAGE_SECONDS, "similarity")
+    # Sorted, lowercased and deduplicated, so the same pantry always hits the same cache entry
+    ingredients = canonical_ingredients(ingredients)
     if not ingredients:
-        print("Input ingredients list is empty.")
+        logger.info("Input ingredients list is empty.")
         return []
 
     try:
-        # 1. Preprocess User Input Ingredients
-        # Combine ingredients into a single string, like in training
-        input_text = ", ".join(ingredients)
-        print(f"Processing input: '{input_text}'")
+        top_n_indices = _search(snapshot, ingredients, top_n, stages, recipe_filter)
 
-        # Transform using the loaded vectorizer
-        input_vector = _vectorizer.transform([input_text])
-        print(f"Input vector shape: {input_vector.shape}") # Should be (1, num_features)
+        # 4. Retrieve Recipe Details
+        recipes = snapshot.model.get(top_n_indices, fields)
+        stages.lap("details")
+        return recipes
 
-        # 2. Calculate Cosine Similarity
-        # Compare input_vector (1 row) with all recipe vectors in _recipe_matrix_X (many rows)
-        cosine_sim = cosine_similarity(input_vector, _recipe_matrix_X)
-        # Result is typically [[sim1, sim2, ...]], so extract the first (only) row
-        similarity_scores = cosine_sim[0]
-        print(f"Calculated {len(similarity_scores)} similarity scores.")
+    except Exception:
+        logger.exception("Error during recommendation for ingredients %s", ingredients)
+        return [] # Return empty list on error
+
+def _search(snapshot, ingredients: tuple, top_n: int, stages: Stages, recipe_filter: RecipeFilter | None = None):
+    """The indices of the top_n recipes for canonical ingredients, from the result cache if possible."""
+    if recipe_filter is None:
+        cache_key = (ingredients, top_n, snapshot.generation)
+    else:
+        cache_key = (ingredients, top_n, recipe_filter.key(), snapshot.generation)
+    top_n_indices = result_cache.get(cache_key)
+    stages.lap("cache")
+    if top_n_indices is not None:
+        logger.debug("Cache hit for input: %s", ingredients)
+        return top_n_indices
 
-        # 3. Get Top N Recommendations
-        # Get indices of recipes sorted by similarity (highest first)
-        # argsort gives indices from lowest to highest, so we reverse it with [::-1]
-        top_indices = np.argsort(similarity_scores)[::-1]
+    # 1. Preprocess User Input Ingredients
+    # Combine ingredients into a single string, like in training
+    input_text = ", ".join(ingredients)
 
-        # Filter out recipes with 0 similarity? (Optional)
-        # top_indices = [i for i in top_indices if similarity_scores[i] > 0]
+    # Transform using the loaded vectorizer
+    input_vector = snapshot.model.vectorize([input_text])
+    stages.lap("vectorize")
 
-        # Get the top N indices
-        top_n_indices = top_indices[:top_n]
-        print(f"Top {top_n} indices: {top_n_indices}")
-        print(f"Top {top_n} scores: {similarity_scores[top_n_indices]}")
+    # 2. + 3. Score against the pre-normalized matrix and select the Top N
+    # Only the top_n best scores are sorted, not the whole catalog. The selection happens
+    # inside the search, top_k_seconds() tells how long it took
+    selecting = top_k_seconds()
+    top_n_indices, top_n_scores = snapshot.model.search(input_vector, top_n, APPROXIMATE, recipe_filter)
+    stages.lap("score", "top_k", top_k_seconds() - selecting)
+    logger.debug("Input '%s', vector shape %s, top %d indices %s, scores %s",
+                 input_text, input_vector.shape, top_n, top_n_indices, top_n_scores)
+    result_cache.put(cache_key, top_n_indices)
+    return top_n_indices
 
+def recommend_coverage(ingredients: list[str], top_n: int = 5, fields: list[str] | None = None,
+                       max_missing: int | None = None, recipe_filter: RecipeFilter | None = None) -> list[dict]:
+    """
+    Recommends the recipes that can be cooked with the fewest extra ingredients:
+    ranked by the number of the recipe's ingredients missing from the pantry,
+    then by similarity. Only recipes using at least one pantry ingredient are
+    considered, and none that miss more than max_missing ingredients or do
+    not meet recipe_filter. Every recipe comes with "missing", the names of the ingredients it still needs.
+    """
+    snapshot = registry.current()
+    if snapshot is None:
+        logger.error("Model not loaded. Cannot recommend.")
+        return []
+    if snapshot.model.ingredients is None:
+        raise ValueError("The loaded model has no ingredient sets, retrain it to use coverage ranking.")
 
-        # 4. Retrieve Recipe Details from DataFrame
-        # Use the indices to get rows from the loaded DataFrame
-        # .iloc is used for integer-location based indexing
-        recommended_recipes_df = _recipes_df.iloc[top_n_indices]
+    ingredients = canonical_ingredients(ingredients)
+    if not ingredients:
+        logger.info("Input ingredients list is empty.")
+        return []
+
+    try:
+        stages = Stages(RECOMMEND_STAGE_SECONDS, "coverage")
+        cache_key = ("coverage", ingredients, top_n, max_missing, recipe_filter and recipe_filter.key(),
+                     snapshot.generation)
+        cached = result_cache.get(cache_key)
+        stages.lap("cache")
+        if cached is not None:
+            logger.debug("Cache hit for coverage input: %s", ingredients)
+            top_n_indices, missing = cached
+        else:
+            model = snapshot.model
+            pantry_ids = model.pantry_ids(ingredient_name(name) for name in ingredients)
+            input_vector = model.vectorize([", ".join(ingredients)])
+            stages.lap("vectorize")
+            selecting = top_k_seconds()
+            top_n_indices, missing_counts, top_n_scores = model.search_coverage(
+                input_vector, pantry_ids, top_n, max_missing, recipe_filter)
+            stages.lap("score", "top_k", top_k_seconds() - selecting)
+            logger.debug("Top %d coverage indices: %s, missing: %s, scores: %s",
+                         top_n, top_n_indices, missing_counts, top_n_scores)
+            missing = tuple(tuple(names) for names in model.missing_ingredients(top_n_indices, pantry_ids))
+            result_cache.put(cache_key, (top_n_indices, missing))
 
-        # Convert relevant columns to a list of dictionaries
-        # Now including 'Instructions'
-        results = recommended_recipes_df[['Name', 'Url', 'Ingredients', 'Instructions']].to_dict(orient='records')
+        recipes = snapshot.model.get(top_n_indices, fields)
+        for recipe, names in zip(recipes, missing):
+            recipe["missing"] = list(names)
+        stages.lap("details")
+        return recipes
 
+    except Exception:
+        logger.exception("Error during coverage recommendation for ingredients %s", ingredients)
+        return []
+
+def recommend_for_household(household_id: str, version: int, ingredients: list[str], top_n: int = 5,
+                            fields: list[str] | None = None):
+    """
+    recommend() for the pantry of a household. version is the household's
+    ingredients_version, which every ingredient change increments: as long as
+    it stays the same, the ingredients are not even canonicalized again, the
+    memoized result is returned without vectorizing or scoring anything.
+    """
+    snapshot = registry.current()
+    if snapshot is None:
+        logger.error("Model not loaded. Cannot recommend.")
+        return []
+
+    try:
+        stages = Stages(RECOMMEND_STAGE_SECONDS, "household")
+        memo_key = ("household", household_id, version, top_n, snapshot.generation)
+        top_n_indices = result_cache.get(memo_key)
+        if top_n_indices is None:
+            canonical = canonical_ingredients(ingredients)
+            if not canonical:
+                logger.info("Household %s has no ingredients.", household_id)
+                return []
+            top_n_indices = _search(snapshot, canonical, top_n, stages)
+            result_cache.put(memo_key, top_n_indices)
+        else:
+            stages.lap("cache")
+        recipes = snapshot.model.get(top_n_indices, fields)
+        stages.lap("details")
+        return recipes
+
+    except Exception:
+        logger.exception("Error during recommendation for household %s", household_id)
+        return []
+
+def recommend_many(ingredient_lists: list[list[str]], top_n: int = 5, fields: list[str] | None = None) -> list[list[dict]]:
+    """
+    Batched version of recommend(): one list of recipes per ingredient list.
+    All queries are vectorized with one transform call and scored together,
+    which is much cheaper than calling recommend() in a loop.
+    """
+    # Use one snapshot for the whole request, even if a reload swaps in a new model meanwhile
+    snapshot = registry.current()
+    if snapshot is None:
+        logger.error("Model not loaded. Cannot recommend.")
+        return [[] for _ in ingredient_lists]
+
+    # Empty ingredient lists get no recommendations, same as recommend()
+    canonical = [canonical_ingredients(ingredients) for ingredients in ingredient_lists]
+    positions = [i for i, ingredients in enumerate(canonical) if ingredients]
+    results = [[] for _ in ingredient_lists]
+    if not positions:
         return results
 
-    except Exception as e:
-        print(f"Error during recommendation for ingredients {ingredients}: {e}")
-        # import traceback # Uncomment for detailed error stack
-        # print(traceback.format_exc()) # Uncomment for detailed error stack
-        return [] # Return empty list on error
+    try:
+        stages = Stages(RECOMMEND_STAGE_SECONDS, "batch")
+        # Only queries that are not cached are scored, each distinct one once
+        found = {}
+        for i in positions:
+            if canonical[i] not in found:
+                found[canonical[i]] = result_cache.get((canonical[i], top_n, snapshot.generation))
+        missing = [ingredients for ingredients, indices in found.items() if indices is None]
+        stages.lap("cache")
+
+        if missing:
+            input_matrix = snapshot.model.vectorize([", ".join(ingredients) for ingredients in missing])
+            stages.lap("vectorize")
+            logger.debug("Processing %d queries (%d cached), input matrix shape: %s",
+                         len(missing), len(found) - len(missing), input_matrix.shape)
+            selecting = top_k_seconds()
+            searched = snapshot.model.search_many(input_matrix, top_n, APPROXIMATE)
+            stages.lap("score", "top_k", top_k_seconds() - selecting)
+            for ingredients, (indices, _) in zip(missing, searched):
+                found[ingredients] = indices
+                result_cache.put((ingredients, top_n, snapshot.generation), indices)
+
+        # Fetch the details of every query's recipes in one lookup, then split them up again
+        matches = [found[canonical[i]] for i in positions]
+        details = snapshot.model.get(np.concatenate(matches), fields) if matches else []
+        offset = 0
+        for position, indices in zip(positions, matches):
+            results[position] = details[offset:offset + len(indices)]
+            offset += len(indices)
+        stages.lap("details")
+
+        return results
+
+    except Exception:
+        logger.exception("Error during batch recommendation for %d queries", len(ingredient_lists))
+        return [[] for _ in ingredient_lists]
 
 # Example usage (if you want to test it here):
 if __name__ == '__main__':
-    if _recipes_df is not None:
+    logging.basicConfig(level=logging.INFO)
+    if registry.current() is not None:
         print("\n--- Example Recommendation ---")
         sample_ingredients = ["tomato", "onion", "garlic"]
         recommendations = recommend(sample_ingredients)
@@ -121,4 +308,4 @@ if __name__ == '__main__':
         else:
             print("No recommendations found.")
     else:
-        print("Model data not loaded. Cannot run example.")
\ No newline at end of file
+        print("Model data not loaded. Cannot run example.")
@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+from segments import SegmentedModel, fingerprint, load_model
+
+logger = logging.getLogger(__name__)
+
+
+class ModelSnapshot:
+    """
+    One loaded model and where it came from. Snapshots are never modified:
+    a reload builds a new snapshot and swaps it in, so a request that grabbed
+    a snapshot keeps using it until it is done.
+    """
+
+    __slots__ = ("model", "version", "generation", "fingerprint", "loaded_at", "load_seconds")
+
+    def __init__(self, model: SegmentedModel, version: str, generation: int, fingerprint: tuple,
+                 loaded_at: float, load_seconds: float):
+        self.model = model
+        self.version = version
+        self.generation = generation
+        self.fingerprint = fingerprint
+        self.loaded_at = loaded_at
+        self.load_seconds = load_seconds
+
+
+class ModelRegistry:
+    """
+    Holds the current model snapshot and replaces it without a restart.
+
+    reload() loads the new model in a background thread while requests keep
+    being served from the old snapshot, then swaps it in with a single
+    reference assignment. watch() polls the artifact directory and reloads
+    when it changes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._snapshot: ModelSnapshot | None = None
+        self._generation = 0
+        self._reload_lock = threading.Lock()
+        self._listeners = []
+        self._watcher: threading.Thread | None = None
+        self.reloading = False
+        self.last_error: str | None = None
+
+    def current(self) -> ModelSnapshot | None:
+        return self._snapshot
+
+    def on_swap(self, callback):
+        """Registers callback(snapshot), called after every successful swap."""
+        self._listeners.append(callback)
+
+    def load(self) -> ModelSnapshot:
+        """Loads the model from disk and swaps it in. Raises if loading fails, the old snapshot stays active."""
+        with self._reload_lock:
+            self.reloading = True
+            try:
+                start = time.perf_counter()
+                current_fingerprint = fingerprint(self.path)
+                model = load_model(self.path)
+                created_at = datetime.fromtimestamp(model.base.manifest["created_at"], tz=timezone.utc)
+                n_deltas = len(model.segments) - 1
+
+                self._generation += 1
+                snapshot = ModelSnapshot(
+                    model=model,
+                    version=f"{created_at:%Y%m%dT%H%M%SZ}+{n_deltas}",
+                    generation=self._generation,
+                    fingerprint=current_fingerprint,
+                    loaded_at=time.time(),
+                    load_seconds=time.perf_counter() - start,
+                )
+                self._snapshot = snapshot
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                raise
+            finally:
+                self.reloading = False
+
+        for callback in self._listeners:
+            callback(snapshot)
+        return snapshot
+
+    def reload(self) -> bool:
+        """Starts a reload in a background thread. Returns False if one is already running."""
+        if self.reloading:
+            return False
+
+        def run():
+            try:
+                snapshot = self.load()
+                logger.info("Reloaded model %s in %.1f ms.", snapshot.version, snapshot.load_seconds * 1000)
+            except Exception as e:
+                logger.error("Error reloading model from %s: %s. Keeping the previous model.", self.path, e)
+
+        threading.Thread(target=run, name="model-reload", daemon=True).start()
+        return True
+
+    def watch(self, interval: float):
+        """Polls the artifact directory every interval seconds and reloads when it changed."""
+        if self._watcher is not None:
+            return
+
+        def run():
+            failed = None
+            while True:
+                time.sleep(interval)
+                try:
+                    current = fingerprint(self.path)
+                except FileNotFoundError:
+                    # The directory is being swapped by train.py or update.py, try again next time
+                    continue
+                snapshot = self._snapshot
+                if (snapshot is not None and current == snapshot.fingerprint) or current == failed or self.reloading:
+                    continue
+                try:
+                    snapshot = self.load()
+                    logger.info("Model files changed, reloaded model %s in %.1f ms.",
+                                snapshot.version, snapshot.load_seconds * 1000)
+                except Exception as e:
+                    # Do not retry the same broken files on every poll
+                    failed = current
+                    logger.error("Error reloading model from %s: %s. Keeping the previous model.", self.path, e)
+
+        self._watcher = threading.Thread(target=run, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def status(self) -> dict:
+        snapshot = self._snapshot
+        status = {"path": self.path, "loaded": snapshot is not None, "reloading": self.reloading,
+                  "last_error": self.last_error, "watching": self._watcher is not None}
+        if snapshot is not None:
+            status.update({
+                "version": snapshot.version,
+                "generation": snapshot.generation,
+                "loaded_at": datetime.fromtimestamp(snapshot.loaded_at, tz=timezone.utc).isoformat(),
+                "load_ms": round(snapshot.load_seconds * 1000, 2),
+                "recipes": snapshot.model.n_recipes,
+                "terms": len(snapshot.model.vocabulary),
+                "scoring": snapshot.model.scoring,
+                "ann": snapshot.model.ann,
+                "deltas": len(snapshot.model.segments) - 1,
+            })
+        return status
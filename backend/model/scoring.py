@@ -0,0 +1,106 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.preprocessing import normalize
+
+# --- Scoring modes ---
+# How the recipe weights in weights.npy are computed from the token counts.
+# The mode is chosen at train time and stored in the manifest. Every mode is
+# folded into the recipe matrix, so a query is still just its L2-normalized
+# token counts (see weigh_query) times the matrix, whatever the mode:
+#
+#   count   cosine similarity of the raw token counts (the original model)
+#   tfidf   cosine similarity of sublinear TF-IDF vectors (1 + ln tf, smoothed idf).
+#           The query counts get the same 1 + ln tf. The recipe rows are multiplied
+#           by idf once more, which stands in for the query's idf: scores are the
+#           TF-IDF cosine times a constant per query, so the ranking is the same.
+#   bm25    Okapi BM25 with the query's normalized counts as query term weights
+#
+# tfidf and bm25 store the idf of every term in idf.npy. A delta segment keeps
+# using the statistics of its base (number of recipes, average length), so its
+# scores can be merged with the base's; compaction computes them fresh.
+SCORING_MODES = ("count", "tfidf", "bm25")
+DEFAULT_MODE = "count"
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def document_frequencies(counts: csr_matrix) -> np.ndarray:
+    """Number of recipes every term occurs in."""
+    return np.bincount(counts.indices, minlength=counts.shape[1])
+
+
+class Scoring:
+    """The scoring mode of a model and the collection statistics it was trained with."""
+
+    __slots__ = ("mode", "n_docs", "avgdl", "k1", "b")
+
+    def __init__(self, mode: str = DEFAULT_MODE, n_docs: int = 0, avgdl: float = 0.0,
+                 k1: float = BM25_K1, b: float = BM25_B):
+        if mode not in SCORING_MODES:
+            raise ValueError(f"Unknown scoring mode {mode!r}, expected one of {SCORING_MODES}")
+        self.mode = mode
+        self.n_docs = n_docs
+        self.avgdl = avgdl
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def fit(cls, mode: str, counts: csr_matrix, k1: float = BM25_K1, b: float = BM25_B) -> "Scoring":
+        """The scoring for a model trained on counts."""
+        n_docs = counts.shape[0]
+        avgdl = float(counts.sum()) / n_docs if n_docs else 0.0
+        return cls(mode, n_docs, avgdl, k1, b)
+
+    @classmethod
+    def from_manifest(cls, manifest: dict) -> "Scoring":
+        # Models trained before scoring modes existed are count models
+        scoring = manifest.get("scoring") or {}
+        return cls(scoring.get("mode", DEFAULT_MODE), scoring.get("n_docs", 0), scoring.get("avgdl", 0.0),
+                   scoring.get("k1", BM25_K1), scoring.get("b", BM25_B))
+
+    def to_manifest(self) -> dict:
+        if self.mode == "count":
+            return {"mode": self.mode}
+        manifest = {"mode": self.mode, "n_docs": self.n_docs}
+        if self.mode == "bm25":
+            manifest.update({"avgdl": self.avgdl, "k1": self.k1, "b": self.b})
+        return manifest
+
+    @property
+    def uses_idf(self) -> bool:
+        return self.mode != "count"
+
+    def idf(self, document_frequency: np.ndarray) -> np.ndarray:
+        """idf of terms occurring in document_frequency recipes, None for count models."""
+        if not self.uses_idf:
+            return None
+        df = np.asarray(document_frequency, dtype=np.float64)
+        if self.mode == "tfidf":
+            # Same smoothing as sklearn's TfidfVectorizer
+            return np.log((1 + self.n_docs) / (1 + df)) + 1
+        # The BM25 variant that stays positive for terms in more than half of the recipes
+        return np.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+
+    def weigh_query(self, counts: csr_matrix) -> csr_matrix:
+        """The query vectors for token counts: sublinear like the recipes for tfidf, the counts themselves otherwise."""
+        if self.mode != "tfidf":
+            return counts
+        return csr_matrix((1 + np.log(counts.data), counts.indices, counts.indptr), shape=counts.shape)
+
+    def weigh(self, counts: csr_matrix, idf: np.ndarray | None) -> csr_matrix:
+        """The recipe weights for counts (sorted indices), with the same sparsity structure."""
+        tf = counts.data.astype(np.float64)
+        if self.mode == "count":
+            return normalize(csr_matrix((tf, counts.indices, counts.indptr), shape=counts.shape), norm="l2", copy=False)
+
+        term_idf = idf[counts.indices]
+        if self.mode == "tfidf":
+            vectors = csr_matrix(((1 + np.log(tf)) * term_idf, counts.indices, counts.indptr), shape=counts.shape)
+            weights = normalize(vectors, norm="l2", copy=False)
+            weights.data *= term_idf
+            return weights
+
+        # Recipe length in tokens, repeated for every entry of the row
+        lengths = np.repeat(np.asarray(counts.sum(axis=1), dtype=np.float64).ravel(), np.diff(counts.indptr))
+        norm = self.k1 * (1 - self.b + self.b * lengths / (self.avgdl or 1.0))
+        return csr_matrix((term_idf * tf * (self.k1 + 1) / (tf + norm), counts.indices, counts.indptr), shape=counts.shape)
@@ -0,0 +1,309 @@
+import os
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from artifact import MANIFEST_FILE, Artifact, Vocabulary, load_artifact, read_manifest
+from coverage import coverage_order
+from engine import ScoringEngine, top_k
+from filters import RecipeFilter
+from store import RecipeStore
+
+# --- Delta segments ---
+# Incremental updates (see update.py) do not rewrite the model. Each update
+# adds a delta segment under <artifact>/deltas/<sequence>/ in the same format
+# as the base artifact, except that:
+#   - vocabulary.npy only holds the terms the delta introduced; their ids
+#     continue after the terms of the base and all earlier deltas
+#   - deleted.npy lists the global recipe ids the delta replaces
+#   - ingredient_names.npy only holds the ingredient names the delta introduced,
+#     numbered like the vocabulary terms
+# Global recipe ids number the base rows first, then every delta's rows in
+# sequence order. Compaction merges everything back into a plain artifact.
+DELTAS_DIR = "deltas"
+
+# train.py and compaction replace the whole directory with two renames (see ArtifactWriter.close).
+# A load that overlaps with that finds no directory in between, or opens files of both models;
+# load_model() notices and loads again, up to LOAD_ATTEMPTS times.
+LOAD_ATTEMPTS = 5
+LOAD_RETRY_DELAY = 0.2
+
+
+def delta_paths(path: str) -> list[str]:
+    deltas = os.path.join(path, DELTAS_DIR)
+    if not os.path.isdir(deltas):
+        return []
+    # Half written deltas live in "<sequence>.tmp-<pid>" directories and are skipped
+    return [os.path.join(deltas, name) for name in sorted(os.listdir(deltas)) if name.isdigit()]
+
+
+def fingerprint(path: str) -> tuple:
+    """Changes whenever the model at path is retrained, compacted or gets a new delta."""
+    manifest = os.stat(os.path.join(path, MANIFEST_FILE))
+    return manifest.st_mtime_ns, tuple(os.path.basename(delta) for delta in delta_paths(path))
+
+
+class Segment:
+    __slots__ = ("artifact", "engine", "store", "offset", "deleted")
+
+    def __init__(self, artifact: Artifact, offset: int):
+        self.artifact = artifact
+        self.engine = ScoringEngine(artifact.matrix, normalized=True, index=artifact.index, ann=artifact.ann)
+        self.store = RecipeStore(artifact.columns)
+        self.offset = offset
+        # Local ids of rows replaced by a later delta, sorted
+        self.deleted = np.empty(0, dtype=np.int64)
+
+    @property
+    def n_recipes(self) -> int:
+        return self.artifact.n_recipes
+
+    def coverage(self, query_vector, pantry_ids: np.ndarray, k: int, max_missing: int | None,
+                 allowed: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (local ids, missing counts, scores) of the k recipes missing the fewest
+        pantry ingredients, among recipes using at least one of them (and allowed ones only).
+        """
+        sets = self.artifact.ingredients
+        have = sets.covered(pantry_ids)
+        missing = sets.sizes - have
+        # Recipes without any pantry ingredient (and replaced ones) get a count no real recipe reaches
+        excluded = sets.max_size + 1
+        missing[have == 0] = excluded
+        missing[self.deleted] = excluded
+        if allowed is not None:
+            missing[~allowed] = excluded
+        limit = excluded - 1 if max_missing is None else min(max_missing, excluded - 1)
+
+        # The k-th fewest missing count, read off a histogram since the counts are small integers.
+        # Recipes missing fewer are in, the ones tied with it are decided by score.
+        threshold = min(int(np.searchsorted(np.cumsum(np.bincount(missing)), k)), limit)
+        candidates = np.flatnonzero(missing <= threshold)
+        missing = missing[candidates]
+
+        scores = self.engine.score_rows(query_vector, candidates)
+        order = coverage_order(candidates, missing, scores)[:k]
+        return candidates[order], missing[order], scores[order]
+
+
+class SegmentedModel:
+    """
+    A base artifact plus its delta segments, queried as one model.
+
+    Every segment is searched with the same (combined) query vector and the
+    per-segment results are merged by score, then by global id, which is the
+    ranking a full retrain on the same recipes produces.
+    """
+
+    def __init__(self, segments: list[Segment], vocabulary: Vocabulary, ingredients: Vocabulary | None = None):
+        self.segments = segments
+        self.vocabulary = vocabulary
+        # Ingredient names and ids for coverage ranking, None if a segment has no ingredient sets
+        self.ingredients = ingredients
+        # Term -> ids of the ingredient names with that term, built on the first pantry_ids() call
+        self._ingredient_terms = None
+        self.fields = segments[0].store.fields
+        self._offsets = np.array([segment.offset for segment in segments], dtype=np.int64)
+
+    @property
+    def base(self) -> Artifact:
+        return self.segments[0].artifact
+
+    @property
+    def scoring(self) -> str:
+        return self.base.scoring.mode
+
+    @property
+    def categories(self) -> list[str]:
+        """The categorical fields recipes can be filtered by."""
+        return list(self.base.categories)
+
+    @property
+    def ann(self) -> dict | None:
+        """Settings of the base artifact's approximate index, None if it has none. Deltas are always searched exactly."""
+        return self.base.manifest.get("ann")
+
+    @property
+    def n_rows(self) -> int:
+        """Number of global ids, including replaced rows."""
+        last = self.segments[-1]
+        return last.offset + last.n_recipes
+
+    @property
+    def n_recipes(self) -> int:
+        return sum(segment.n_recipes - segment.deleted.size for segment in self.segments)
+
+    def vectorize(self, texts: list[str]) -> csr_matrix:
+        """Query vectors for ingredient texts, one row per text, weighted for the model's scoring mode."""
+        return self.base.scoring.weigh_query(self.vocabulary.transform(texts))
+
+    def unknown_fields(self, fields: list[str]) -> list[str]:
+        return self.segments[0].store.unknown_fields(fields)
+
+    def _merge(self, results: list[tuple[np.ndarray, np.ndarray]], k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Merges per-segment (local ids, scores) into the global top k."""
+        ids, scores = [], []
+        for segment, (indices, segment_scores) in zip(self.segments, results):
+            if segment.deleted.size:
+                alive = ~np.isin(indices, segment.deleted)
+                indices, segment_scores = indices[alive], segment_scores[alive]
+            ids.append(indices[:k] + segment.offset)
+            scores.append(segment_scores[:k])
+        if len(ids) == 1:
+            return ids[0], scores[0]
+
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+        best = top_k(scores, k, ids=ids)
+        return ids[best], scores[best]
+
+    def filter_masks(self, recipe_filter: RecipeFilter) -> list[np.ndarray]:
+        """The recipes of every segment that meet the filter and are not replaced, as boolean masks."""
+        excluded = sorted({term for name in recipe_filter.exclude for term in self.vocabulary.compounds(name)})
+        required = [self.vocabulary.term_ids.get(term) for term in recipe_filter.require]
+        masks = []
+        for segment in self.segments:
+            artifact = segment.artifact
+            allowed = recipe_filter.mask(segment.n_recipes, artifact.ingredients, artifact.categories, artifact.index,
+                                         excluded, required)
+            allowed[segment.deleted] = False
+            masks.append(allowed)
+        return masks
+
+    def search(self, query_vector, top_n: int = 5, approximate: bool = False,
+               recipe_filter: RecipeFilter | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (global ids, scores) of the top_n most similar recipes.
+        approximate uses the approximate index of segments that have one (see ann.py).
+        With a recipe_filter, only recipes meeting it are scored and returned.
+        """
+        if recipe_filter:
+            results = [segment.engine.search(query_vector, top_n, approximate, allowed)
+                       for segment, allowed in zip(self.segments, self.filter_masks(recipe_filter))]
+            return self._merge(results, top_n)
+        # Ask every segment for enough extra rows to make up for replaced ones
+        results = [segment.engine.search(query_vector, top_n + segment.deleted.size, approximate)
+                   for segment in self.segments]
+        return self._merge(results, top_n)
+
+    def search_many(self, query_matrix, top_n: int = 5, approximate: bool = False) -> list[tuple[np.ndarray, np.ndarray]]:
+        per_segment = [segment.engine.search_many(query_matrix, top_n + segment.deleted.size, approximate)
+                       for segment in self.segments]
+        return [self._merge(list(results), top_n) for results in zip(*per_segment)]
+
+    def pantry_ids(self, names) -> np.ndarray:
+        """
+        Sorted unique ids of the ingredients the pantry names cover (see normalize.ingredient_name).
+        A name covers every ingredient that has all of its terms, "zwiebel" covers "rote zwiebel" too.
+        """
+        if self._ingredient_terms is None:
+            ingredient_terms = {}
+            for ingredient, name in enumerate(self.ingredients.terms):
+                for term in set(name.split()):
+                    ingredient_terms.setdefault(term, []).append(ingredient)
+            self._ingredient_terms = ingredient_terms
+
+        ids = set()
+        for name in names:
+            postings = sorted((self._ingredient_terms.get(term, []) for term in set(name.split())), key=len)
+            if postings:
+                ids.update(set(postings[0]).intersection(*postings[1:]))
+        return np.array(sorted(ids), dtype=np.int64)
+
+    def search_coverage(self, query_vector, pantry_ids: np.ndarray, top_n: int = 5, max_missing: int | None = None,
+                        recipe_filter: RecipeFilter | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns (global ids, missing counts, scores) of the top_n recipes that need the
+        fewest ingredients besides the pantry, ties ranked by similarity to the pantry.
+        Only recipes using at least one pantry ingredient count, none missing more than
+        max_missing, and only ones meeting recipe_filter.
+        """
+        masks = self.filter_masks(recipe_filter) if recipe_filter else [None] * len(self.segments)
+        results = [segment.coverage(query_vector, pantry_ids, top_n, max_missing, allowed)
+                   for segment, allowed in zip(self.segments, masks)]
+        ids = np.concatenate([local_ids + segment.offset for segment, (local_ids, _, _) in zip(self.segments, results)])
+        missing = np.concatenate([missing for _, missing, _ in results])
+        scores = np.concatenate([scores for _, _, scores in results])
+        best = coverage_order(ids, missing, scores)[:top_n]
+        return ids[best], missing[best], scores[best]
+
+    def missing_ingredients(self, ids, pantry_ids: np.ndarray) -> list[list[str]]:
+        """The names of the ingredients every recipe needs besides the pantry."""
+        ids = np.asarray(ids, dtype=np.int64)
+        owners = np.searchsorted(self._offsets, ids, side="right") - 1
+        missing = []
+        for recipe_id, owner in zip(ids.tolist(), owners.tolist()):
+            segment = self.segments[owner]
+            ingredient_ids = segment.artifact.ingredients.missing(recipe_id - segment.offset, pantry_ids)
+            missing.append([self.ingredients.terms[i] for i in ingredient_ids.tolist()])
+        return missing
+
+    def get(self, ids, fields: list[str] | None = None) -> list[dict]:
+        """Recipe details for global ids, in the order given."""
+        ids = np.asarray(ids, dtype=np.int64)
+        owners = np.searchsorted(self._offsets, ids, side="right") - 1
+        records = [None] * ids.size
+        for position, segment in enumerate(self.segments):
+            positions = np.flatnonzero(owners == position)
+            if positions.size:
+                for i, record in zip(positions.tolist(), segment.store.get(ids[positions] - segment.offset, fields)):
+                    records[i] = record
+        return records
+
+
+def load_model(path: str) -> SegmentedModel:
+    """
+    Loads the base artifact at path together with all of its delta segments.
+    Loads again if the model changed on disk while it was being loaded.
+    """
+    for attempt in range(1, LOAD_ATTEMPTS + 1):
+        before = None
+        try:
+            before = fingerprint(path)
+            model = _load_segments(path)
+            if fingerprint(path) == before:
+                return model
+        except Exception:
+            # Files of two models do not fit together, which fails in all sorts of ways.
+            # Only an error on files that did not change is the model's own
+            if attempt == LOAD_ATTEMPTS or (before is not None and _fingerprint_or_none(path) == before):
+                raise
+        time.sleep(LOAD_RETRY_DELAY)
+    raise RuntimeError(f"The model at {path} kept changing while it was loaded")
+
+
+def _fingerprint_or_none(path: str) -> tuple | None:
+    try:
+        return fingerprint(path)
+    except FileNotFoundError:
+        return None
+
+
+def _load_segments(path: str) -> SegmentedModel:
+    paths = [path] + delta_paths(path)
+    # The last delta knows the full vocabulary size, every segment is widened to it
+    n_terms = read_manifest(paths[-1])["n_terms"]
+
+    segments = []
+    terms = []
+    ingredient_names = []
+    offset = 0
+    deleted = []
+    for segment_path in paths:
+        artifact = load_artifact(segment_path, n_terms)
+        segments.append(Segment(artifact, offset))
+        terms.extend(artifact.vocabulary.terms)
+        ingredient_names.extend(artifact.ingredient_names or [])
+        offset += artifact.n_recipes
+        deleted_path = os.path.join(segment_path, "deleted.npy")
+        if os.path.exists(deleted_path):
+            deleted.append(np.load(deleted_path))
+
+    if deleted:
+        deleted = np.unique(np.concatenate(deleted))
+        for segment in segments:
+            mine = deleted[(deleted >= segment.offset) & (deleted < segment.offset + segment.n_recipes)]
+            segment.deleted = mine - segment.offset
+
+    has_ingredients = all(segment.artifact.ingredients is not None for segment in segments)
+    return SegmentedModel(segments, Vocabulary(terms), Vocabulary(ingredient_names) if has_ingredients else None)
@@ -0,0 +1,46 @@
+import numpy as np
+
+from artifact import TEXT_FIELDS, TextColumn
+
+
+class RecipeStore:
+    """
+    Recipe details by row index, read straight from the artifact's text blobs.
+
+    Only the requested fields are decoded, so clients that just need Name/Url
+    never touch the (large) Instructions text.
+    """
+
+    __slots__ = ("columns", "fields")
+
+    def __init__(self, columns: dict[str, TextColumn]):
+        self.columns = columns
+        self.fields = [field for field in TEXT_FIELDS if field in columns]
+
+    def __len__(self) -> int:
+        return len(self.columns[self.fields[0]]) if self.fields else 0
+
+    def unknown_fields(self, fields: list[str]) -> list[str]:
+        return [field for field in fields if field not in self.columns]
+
+    def get(self, indices, fields: list[str] | None = None) -> list[dict]:
+        """
+        Returns one {field: value} dict per index, in the order given.
+        Raises KeyError for fields the store does not have.
+        """
+        fields = self.fields if fields is None else fields
+        unknown = self.unknown_fields(fields)
+        if unknown:
+            raise KeyError(f"Unknown recipe fields: {unknown}")
+
+        indices = np.asarray(indices, dtype=np.int64)
+        records = [{} for _ in range(indices.size)]
+        for field in fields:
+            column = self.columns[field]
+            # One fancy-index per field for all offsets, then plain slices of the blob
+            starts = column.offsets[indices].tolist()
+            ends = column.offsets[indices + 1].tolist()
+            view = column.view
+            for record, start, end in zip(records, starts, ends):
+                record[field] = bytes(view[start:end]).decode("utf-8")
+        return records
@@ -1,18 +1,221 @@
-import pandas as pd
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import joblib
+"""
+Trains the recommendation model from a recipes file and writes the artifact
+directory read by predict.py.
+
+The recipes file (a JSON array or JSON lines) is parsed incrementally and
+processed in chunks, so memory use depends on the size of the recipe
+matrix, not on the size of the input file.
+
+Usage (from backend/model):
+    python train.py [recipes.json] [--out artifact] [--chunk-size 10000] [--scoring count|tfidf|bm25]
+                    [--ann] [--ann-bits 256]
+"""
+import argparse
 import json
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+import ann
+from artifact import TEXT_FIELDS, ArtifactWriter, ingredient_names, ingredients_text, text_value
+from filters import CATEGORY_MAX_VALUES, CategoryColumn, is_category_value
+from normalize import normalize_tokens
+from scoring import DEFAULT_MODE, SCORING_MODES, Scoring, document_frequencies
+
+try:
+    import resource # Not available on Windows
+except ImportError:
+    resource = None
+
+READ_SIZE = 1 << 20
+
+
+def iter_recipes(path: str):
+    """Yields recipes one by one from a JSON array or a JSON lines file."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = f.read(READ_SIZE).lstrip()
+
+        if not buffer.startswith("["):
+            # JSON lines: one recipe per line
+            lines = buffer + f.readline()
+            for line in lines.splitlines():
+                if line.strip():
+                    yield json.loads(line)
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        # JSON array: decode one element at a time from a sliding buffer
+        position = 1
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                recipe, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                more = f.read(READ_SIZE)
+                if not more:
+                    raise
+                buffer = buffer[position:] + more
+                position = 0
+                continue
+            yield recipe
+            position = end
+            if position > READ_SIZE:
+                buffer = buffer[position:]
+                position = 0
+
+
+def iter_chunks(recipes, chunk_size: int):
+    chunk = []
+    for recipe in recipes:
+        chunk.append(recipe)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, in kilobytes on Linux
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def sorted_ids(provisional_ids: dict[str, int]) -> tuple[list[str], np.ndarray]:
+    """The names in sorted order, and the final (sorted position) id of every provisional id."""
+    names = sorted(provisional_ids)
+    final_ids = np.empty(len(names), dtype=np.int32)
+    final_ids[[provisional_ids[name] for name in names]] = np.arange(len(names), dtype=np.int32)
+    return names, final_ids
+
+
+def collect_categories(chunk: list[dict], n_before: int, values: dict[str, dict[str, int]],
+                       parts: dict[str, list[np.ndarray]], skipped: set[str]):
+    """
+    Adds the categorical fields of the next chunk of recipes to values (field ->
+    value -> provisional code) and parts (field -> codes of every chunk). Fields
+    with a list or object value, or with more than CATEGORY_MAX_VALUES distinct
+    values, are dropped and added to skipped. n_before recipes came before the chunk.
+    """
+    for field in {field for recipe in chunk for field in recipe} - skipped - values.keys():
+        # Earlier recipes did not have the field
+        values[field] = {"": 0}
+        parts[field] = [np.zeros(n_before, dtype=np.int32)]
+    for field in list(values):
+        codes = values[field]
+        chunk_values = [recipe.get(field) for recipe in chunk]
+        if all(map(is_category_value, chunk_values)):
+            parts[field].append(np.array([codes.setdefault(text_value(value), len(codes)) for value in chunk_values],
+                                         dtype=np.int32))
+            if len(codes) <= CATEGORY_MAX_VALUES:
+                continue
+        del values[field], parts[field]
+        skipped.add(field)
+
+
+def train(recipes_path: str, out_path: str, chunk_size: int = 10_000, mode: str = DEFAULT_MODE,
+          ann_bits: int | None = None):
+    """Trains a model. ann_bits also builds an approximate index with signatures of that many bits."""
+    start = time.perf_counter()
+    writer = ArtifactWriter(out_path)
+
+    # Terms get provisional ids in first-seen order while streaming, and are
+    # renumbered in sorted order at the end (the order CountVectorizer uses)
+    provisional_ids: dict[str, int] = {}
+    indptr_parts = [np.zeros(1, dtype=np.int64)]
+    indices_parts = []
+    counts_parts = []
+    nnz = 0
+    # Ingredient sets for coverage ranking, numbered the same way
+    ingredient_ids: dict[str, int] = {}
+    sets_lengths, sets_parts = [0], []
+    # Categorical fields for filtering
+    category_values, category_parts, not_categorical = {}, {}, set(TEXT_FIELDS)
+
+    for chunk in iter_chunks(iter_recipes(recipes_path), chunk_size):
+        collect_categories(chunk, writer.n_recipes, category_values, category_parts, not_categorical)
+        ingredients = [ingredients_text(recipe) for recipe in chunk]
+        writer.append_text({
+            field: ingredients if field == "Ingredients" else [recipe.get(field) for recipe in chunk]
+            for field in TEXT_FIELDS
+        })
+
+        row_lengths, chunk_indices, chunk_counts = [], [], []
+        for text in ingredients:
+            counts = Counter(provisional_ids.setdefault(token, len(provisional_ids)) for token in normalize_tokens(text))
+            chunk_indices.extend(counts.keys())
+            chunk_counts.extend(counts.values())
+            row_lengths.append(len(counts))
+        indices_parts.append(np.array(chunk_indices, dtype=np.int32))
+        counts_parts.append(np.array(chunk_counts, dtype=np.int32))
+        indptr_parts.append(np.cumsum(row_lengths, dtype=np.int64) + nnz)
+        nnz += len(chunk_indices)
+
+        chunk_sets = [[ingredient_ids.setdefault(name, len(ingredient_ids)) for name in ingredient_names(recipe)]
+                      for recipe in chunk]
+        sets_parts.append(np.array([i for recipe in chunk_sets for i in recipe], dtype=np.int32))
+        sets_lengths.extend(len(recipe) for recipe in chunk_sets)
+
+        print(f"Processed {writer.n_recipes} recipes, {len(provisional_ids)} terms so far.")
+
+    terms, final_ids = sorted_ids(provisional_ids)
+
+    indptr = np.concatenate(indptr_parts)
+    indices = final_ids[np.concatenate(indices_parts)] if indices_parts else np.empty(0, dtype=np.int32)
+    counts = np.concatenate(counts_parts) if counts_parts else np.empty(0, dtype=np.int32)
+    del provisional_ids, indices_parts, counts_parts
+
+    # write_matrix sorts the column indices within each row
+    matrix = csr_matrix((counts, indices, indptr), shape=(writer.n_recipes, len(terms)))
+    scoring = Scoring.fit(mode, matrix)
+    weights = writer.write_matrix(terms, matrix, scoring, scoring.idf(document_frequencies(matrix)))
+    del matrix, indices, counts
+    if ann_bits:
+        ann_start = time.perf_counter()
+        writer.write_ann(weights, ann_bits, ann.DEFAULT_SEED)
+        print(f"Built a {ann_bits} bit approximate index in {time.perf_counter() - ann_start:.1f} s.")
+    del weights
 
-with open("recipes.json", "r", encoding="utf-8") as f:
-    data = json.load(f)
+    names, final_ids = sorted_ids(ingredient_ids)
+    sets_indices = final_ids[np.concatenate(sets_parts)] if sets_parts else np.empty(0, dtype=np.int32)
+    writer.write_ingredients(names, csr_matrix(
+        (np.ones(sets_indices.size, dtype=np.int8), sets_indices, np.cumsum(sets_lengths, dtype=np.int64)),
+        shape=(writer.n_recipes, len(names))))
+    writer.write_categories({field: CategoryColumn.from_codes(np.concatenate(category_parts[field]), list(codes))
+                             for field, codes in sorted(category_values.items())})
+    writer.close()
 
-df = pd.DataFrame(data)
+    elapsed = time.perf_counter() - start
+    size_mb = os.path.getsize(recipes_path) / (1 << 20)
+    peak = peak_rss_mb()
+    print(f"Trained a {mode} model on {writer.n_recipes} recipes with {len(terms)} terms and {len(names)} ingredients in {elapsed:.1f} s "
+          f"({writer.n_recipes / elapsed:.0f} recipes/s, {size_mb / elapsed:.1f} MB/s).")
+    print(f"Peak RSS: {f'{peak:.0f} MB' if peak is not None else 'n/a'}")
 
-df["Ingredients"] = df["Ingredients"].apply(lambda lst: ", ".join(lst))
 
-vectorizer = CountVectorizer()
-X = vectorizer.fit_transform(df["Ingredients"])
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the recipe recommendation model.")
+    parser.add_argument("recipes", nargs="?", default="recipes.json", help="JSON array or JSON lines file of recipes")
+    parser.add_argument("--out", default="artifact", help="model directory to write")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="recipes processed per chunk")
+    parser.add_argument("--scoring", choices=SCORING_MODES, default=DEFAULT_MODE,
+                        help="how recipes are weighted, see scoring.py")
+    parser.add_argument("--ann", action="store_true", help="also build an approximate index, see ann.py")
+    parser.add_argument("--ann-bits", type=int, default=ann.DEFAULT_BITS,
+                        help="signature bits of the approximate index, a multiple of 64")
+    args = parser.parse_args()
 
-joblib.dump((vectorizer, X, df), "model.pkl")
-print("Model trained and saved successfully.")
\ No newline at end of file
+    train(args.recipes, args.out, args.chunk_size, args.scoring, args.ann_bits if args.ann else None)
+    print("Model trained and saved successfully.")
@@ -0,0 +1,216 @@
+"""
+Incremental model updates: adds new or changed recipes to an existing
+model without retraining it.
+
+New recipes are vectorized against the existing vocabulary and written as a
+delta segment (see segments.py). Recipes are identified by their Url: a
+recipe whose Url is already in the model replaces the old row, unchanged
+recipes are skipped. Tokens the model has not seen yet go into the delta's
+own vocabulary.
+
+Deltas are weighted with the scoring mode and collection statistics of the
+base model. Compaction merges the base and all deltas into a new base
+artifact with fresh statistics. The result is identical to training from
+scratch with the same scoring mode on the same recipes (base recipes first,
+in order, then the delta recipes).
+
+Usage (from backend/model):
+    python update.py new_recipes.json [--artifact artifact] [--compact-after 8]
+    python update.py --compact [--artifact artifact]
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+
+from artifact import TEXT_FIELDS, ArtifactWriter, ingredient_names, ingredients_text, text_value
+from filters import CategoryColumn
+from normalize import normalize_tokens
+from scoring import Scoring, document_frequencies
+from segments import DELTAS_DIR, delta_paths, load_model
+from train import iter_recipes
+
+COMPACT_AFTER = 8
+COMPACT_CHUNK_SIZE = 10_000
+
+
+def apply_update(path: str, recipes_path: str) -> str | None:
+    """Writes the recipes in recipes_path as a new delta segment. Returns its path, or None if nothing changed."""
+    start = time.perf_counter()
+    model = load_model(path)
+
+    # Url -> global id of every live recipe
+    url_ids = {}
+    for segment in model.segments:
+        urls = segment.store.columns["Url"]
+        deleted = set(segment.deleted.tolist())
+        for local_id in range(segment.n_recipes):
+            if local_id not in deleted:
+                url_ids[urls[local_id]] = segment.offset + local_id
+
+    term_ids = dict(model.vocabulary.term_ids)
+    new_terms = []
+    # Ingredient sets, only kept up to date for models that have them
+    ingredient_ids = dict(model.ingredients.term_ids) if model.ingredients is not None else None
+    new_ingredients = []
+    sets_indptr, sets_indices = [0], []
+    columns = {field: [] for field in TEXT_FIELDS}
+    # Values of the base model's categorical fields, every delta has its own list of values
+    category_values = {field: [] for field in model.categories}
+    indptr, indices, counts = [0], [], []
+    deleted = []
+    next_id = model.n_rows
+    skipped = 0
+
+    for recipe in iter_recipes(recipes_path):
+        fields = {field: text_value(recipe.get(field)) for field in TEXT_FIELDS}
+        fields["Ingredients"] = ingredients_text(recipe)
+
+        old_id = url_ids.get(fields["Url"]) if fields["Url"] else None
+        if old_id is not None:
+            if old_id < model.n_rows and model.get([old_id])[0] == fields:
+                skipped += 1
+                continue
+            deleted.append(old_id)
+
+        row = {}
+        for token in normalize_tokens(fields["Ingredients"]):
+            term_id = term_ids.get(token)
+            if term_id is None:
+                term_id = term_ids[token] = len(term_ids)
+                new_terms.append(token)
+            row[term_id] = row.get(term_id, 0) + 1
+        indices.extend(row.keys())
+        counts.extend(row.values())
+        indptr.append(len(indices))
+
+        if ingredient_ids is not None:
+            for name in ingredient_names(recipe):
+                if name not in ingredient_ids:
+                    ingredient_ids[name] = len(ingredient_ids)
+                    new_ingredients.append(name)
+                sets_indices.append(ingredient_ids[name])
+            sets_indptr.append(len(sets_indices))
+
+        for field in TEXT_FIELDS:
+            columns[field].append(fields[field])
+        for field, values in category_values.items():
+            values.append(text_value(recipe.get(field)))
+        if fields["Url"]:
+            url_ids[fields["Url"]] = next_id
+        next_id += 1
+
+    n_new = len(indptr) - 1
+    if n_new == 0:
+        print(f"No new or changed recipes ({skipped} unchanged).")
+        return None
+
+    sequence = len(delta_paths(path)) + 1
+    delta_path = os.path.join(path, DELTAS_DIR, f"{sequence:06d}")
+    os.makedirs(os.path.dirname(delta_path), exist_ok=True)
+
+    matrix = csr_matrix(
+        (np.array(counts, dtype=np.int32), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+        shape=(n_new, len(term_ids)),
+    )
+    # Known terms keep their idf, new ones get one from how many of the new recipes use them
+    scoring = model.base.scoring
+    idf = None
+    if scoring.uses_idf:
+        known = np.concatenate([segment.artifact.idf for segment in model.segments])
+        idf = np.concatenate([known, scoring.idf(document_frequencies(matrix)[len(known):])])
+
+    writer = ArtifactWriter(delta_path)
+    writer.append_text(columns)
+    writer.write_matrix(new_terms, matrix, scoring, idf)
+    if ingredient_ids is not None:
+        writer.write_ingredients(new_ingredients, csr_matrix(
+            (np.ones(len(sets_indices), dtype=np.int8), np.array(sets_indices, dtype=np.int32),
+             np.array(sets_indptr, dtype=np.int64)),
+            shape=(n_new, len(ingredient_ids)),
+        ))
+    writer.write_categories({field: CategoryColumn.encode(values) for field, values in category_values.items()})
+    writer.save("deleted", np.array(sorted(deleted), dtype=np.int64))
+    writer.manifest.update({"kind": "delta", "sequence": sequence, "n_deleted": len(deleted)})
+    writer.close()
+
+    print(f"Wrote delta {sequence}: {n_new - len(deleted)} new and {len(deleted)} changed recipes, "
+          f"{len(new_terms)} new terms, {skipped} unchanged, in {time.perf_counter() - start:.2f} s.")
+    return delta_path
+
+
+def drop_unused(matrix: csr_matrix, names: list[str]) -> tuple[csr_matrix, list[str]]:
+    """Drops the columns no row uses and renumbers the rest in sorted name order."""
+    used = np.unique(matrix.indices)
+    used_names = [names[i] for i in used.tolist()]
+    order = sorted(range(len(used_names)), key=used_names.__getitem__)
+    new_ids = np.full(matrix.shape[1], -1, dtype=np.int64)
+    new_ids[used[order]] = np.arange(len(order))
+    return (csr_matrix((matrix.data, new_ids[matrix.indices], matrix.indptr), shape=(matrix.shape[0], len(order))),
+            [used_names[i] for i in order])
+
+
+def merge_categories(columns: list[CategoryColumn], rows: list[np.ndarray]) -> CategoryColumn:
+    """One categorical column from the given rows of every segment's column."""
+    values = sorted(set().union(*(column.values for column in columns)))
+    value_codes = {value: code for code, value in enumerate(values)}
+    codes = [np.array([value_codes[value] for value in column.values], dtype=np.int64)[column.codes[segment_rows]]
+             for column, segment_rows in zip(columns, rows)]
+    return CategoryColumn.from_codes(np.concatenate(codes), values)
+
+
+def compact(path: str):
+    """Merges the base artifact and all its deltas into a new base artifact."""
+    start = time.perf_counter()
+    model = load_model(path)
+    if len(model.segments) == 1:
+        print("Nothing to compact.")
+        return
+
+    alive = [np.setdiff1d(np.arange(segment.n_recipes), segment.deleted) for segment in model.segments]
+    counts = vstack([segment.artifact.counts[rows] for segment, rows in zip(model.segments, alive)]).tocsr()
+
+    # Terms that only occurred in replaced recipes are dropped, the rest are renumbered in sorted order
+    matrix, terms = drop_unused(counts, model.vocabulary.terms)
+    base_scoring = model.base.scoring
+    scoring = Scoring.fit(base_scoring.mode, matrix, base_scoring.k1, base_scoring.b)
+
+    writer = ArtifactWriter(path)
+    for segment, rows in zip(model.segments, alive):
+        for chunk_start in range(0, rows.size, COMPACT_CHUNK_SIZE):
+            records = segment.store.get(rows[chunk_start:chunk_start + COMPACT_CHUNK_SIZE])
+            writer.append_text({field: [record[field] for record in records] for field in TEXT_FIELDS})
+    weights = writer.write_matrix(terms, matrix, scoring, scoring.idf(document_frequencies(matrix)))
+    if "ann" in model.base.manifest:
+        # Rebuilt with the same settings, the deltas are not in the old one
+        writer.write_ann(weights, model.base.manifest["ann"]["bits"], model.base.manifest["ann"]["seed"])
+    if model.ingredients is not None:
+        n_ingredients = len(model.ingredients)
+        sets = vstack([segment.artifact.ingredients.to_matrix(n_ingredients)[rows]
+                       for segment, rows in zip(model.segments, alive)]).tocsr()
+        sets, names = drop_unused(sets, model.ingredients.terms)
+        writer.write_ingredients(names, sets)
+    writer.write_categories({field: merge_categories([segment.artifact.categories[field] for segment in model.segments], alive)
+                             for field in model.categories})
+    # Replaces the whole directory, deltas included
+    writer.close()
+
+    print(f"Compacted {len(model.segments) - 1} deltas into {counts.shape[0]} recipes with {len(terms)} terms "
+          f"in {time.perf_counter() - start:.2f} s.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add new or changed recipes to a trained model.")
+    parser.add_argument("recipes", nargs="?", help="JSON array or JSON lines file with new or changed recipes")
+    parser.add_argument("--artifact", default="artifact", help="model directory to update")
+    parser.add_argument("--compact", action="store_true", help="merge all deltas into the base model")
+    parser.add_argument("--compact-after", type=int, default=COMPACT_AFTER,
+                        help="compact automatically once there are this many deltas")
+    args = parser.parse_args()
+
+    if args.recipes:
+        apply_update(args.artifact, args.recipes)
+    if args.compact or len(delta_paths(args.artifact)) >= args.compact_after:
+        compact(args.artifact)
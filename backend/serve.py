@@ -0,0 +1,173 @@
+"""
+Runs the backend with several worker processes that share as much memory as possible.
+
+Run from the backend directory:
+    python serve.py --workers 4 --port 8000
+
+`uvicorn main:app --workers N` starts every worker as a fresh interpreter that
+imports numpy, scipy, FastAPI and the Firestore client again. serve.py does
+the expensive parts once, in a parent process, and forks the workers from it:
+
+  - the libraries are imported before the fork, so the workers share their
+    code and module objects copy-on-write instead of loading them N times
+  - the model files are read once, into the page cache. The model is
+    memory-mapped (see model/artifact.py), so every worker maps those same
+    pages and none of them holds a copy of its own
+  - the listening socket is bound once and inherited by the workers, the
+    kernel hands every new connection to one of them
+
+main.py is imported before the fork as well. It only loads predict.py (the
+model and its watcher thread) when a worker starts up, and connects to
+Firestore on the first request that needs it: threads and gRPC channels do
+not survive a fork. A worker that exits is replaced, SIGINT or SIGTERM stop
+all of them.
+"""
+import argparse
+import gc
+import importlib
+import os
+import signal
+import sys
+import time
+
+import uvicorn
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BACKEND_DIR, "model")
+# Same model directory as predict.py
+ARTIFACT_PATH = os.environ.get("MODEL_ARTIFACT_PATH", os.path.join(MODEL_DIR, "artifact"))
+
+# Imported before the fork. Nothing here may start threads or open connections
+PRELOAD_MODULES = [
+    "numpy",
+    "scipy.sparse",
+    "sklearn.preprocessing",
+    "fastapi",
+    "pydantic",
+    "firebase_admin.firestore_async",
+    "segments",
+    "registry",
+    "cache",
+    "main",
+]
+# A worker that exits sooner than this after starting is restarted with this delay, so a worker
+# that cannot start (no Firebase credentials, a port problem ...) is not restarted in a tight loop
+RESTART_DELAY = 1.0
+
+
+def preload():
+    # The model modules are imported as top-level modules, like predict.py does
+    sys.path.insert(0, MODEL_DIR)
+    sys.path.insert(0, BACKEND_DIR)
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+    # The garbage collector of a worker would write to every shared object it looks at, copying
+    # the pages they live on. Frozen objects are never looked at
+    gc.freeze()
+
+
+def warm_page_cache(path: str) -> int:
+    """Reads every file of the model directory once. Returns the number of bytes read."""
+    total = 0
+    buffer = bytearray(1 << 20)
+    for directory, _, files in os.walk(path):
+        for name in files:
+            with open(os.path.join(directory, name), "rb", buffering=0) as f:
+                while read := f.readinto(buffer):
+                    total += read
+    return total
+
+
+def run_worker(config: uvicorn.Config, sock) -> int:
+    """Serves the app on the inherited socket until uvicorn shuts down, returns the exit code."""
+    # The parent's handlers are inherited by the fork, uvicorn installs its own
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+        return 0
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+        return 1
+
+
+def supervise(config: uvicorn.Config, sock, n_workers: int):
+    """Forks n_workers workers and keeps that many running until SIGINT or SIGTERM."""
+    workers = {}
+    stopping = False
+
+    def start_worker():
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = run_worker(config, sock)
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        workers[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for _ in range(n_workers):
+        start_worker()
+    print(f"Started {n_workers} workers: {sorted(workers)}")
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        print(f"Worker {pid} exited with code {os.waitstatus_to_exitcode(status)}, starting a new one")
+        if time.monotonic() - started < RESTART_DELAY:
+            time.sleep(RESTART_DELAY)
+        if not stopping:
+            start_worker()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--no-warm", action="store_true", help="do not read the model files before starting the workers")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    # Every worker has its own recommendation thread pool (workers.py), split the CPUs between them
+    # instead of starting up to 4 threads per worker
+    os.environ.setdefault("RECOMMEND_WORKERS", str(max(1, min(4, (os.cpu_count() or 1) // args.workers))))
+
+    start = time.perf_counter()
+    preload()
+    print(f"Imported {len(PRELOAD_MODULES)} modules in {(time.perf_counter() - start) * 1000:.0f} ms")
+    if not args.no_warm and os.path.isdir(ARTIFACT_PATH):
+        start = time.perf_counter()
+        size = warm_page_cache(ARTIFACT_PATH)
+        print(f"Read {size / (1 << 20):.1f} MB of model files in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    config = uvicorn.Config("main:app", host=args.host, port=args.port, log_level=args.log_level)
+    sock = config.bind_socket()
+    supervise(config, sock, args.workers)
+
+
+if __name__ == "__main__":
+    main()
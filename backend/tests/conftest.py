@@ -0,0 +1,9 @@
+import os
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# The tests import the backend like main.py does, the model modules as top-level modules
+# like predict.py does, and reuse the fakes and generators of the benchmarks
+for directory in ("benchmarks", "model", ""):
+    sys.path.insert(0, os.path.join(BACKEND_DIR, directory))
@@ -0,0 +1,43 @@
+"""Coverage ranking (model/coverage.py): pantry entries cover the ingredient lines with all of their terms."""
+import pytest
+
+from bench_incremental import quiet, write_jsonl
+from normalize import ingredient_name
+from segments import load_model
+from train import train
+
+RECIPES = {
+    "salad": ["1 rote Zwiebel", "500 g Tomaten"],
+    "soup": ["2 Zwiebeln", "1 l Gemüsebrühe"],
+    "pasta": ["500 g Nudeln", "200 g gehackte Tomaten", "1 Zwiebel, gewürfelt"],
+}
+
+
+@pytest.fixture(scope="module")
+def model(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("coverage")
+    write_jsonl(tmp / "recipes.jsonl", [{"Url": f"https://example.org/rezept/{name}", "Name": name,
+                                         "Ingredients": lines, "Instructions": "Alles vermengen."}
+                                        for name, lines in RECIPES.items()])
+    quiet(train, str(tmp / "recipes.jsonl"), str(tmp / "artifact"))
+    return load_model(str(tmp / "artifact"))
+
+
+def missing(model, pantry):
+    """{recipe name: missing ingredient names} of every recipe using something from the pantry."""
+    pantry_ids = model.pantry_ids(ingredient_name(name) for name in pantry)
+    ids, _, _ = model.search_coverage(model.vectorize([", ".join(pantry)]), pantry_ids, top_n=len(RECIPES))
+    names = [recipe["Name"] for recipe in model.get(ids, ["Name"])]
+    return dict(zip(names, model.missing_ingredients(ids, pantry_ids)))
+
+
+def test_pantry_entry_covers_lines_with_its_terms(model):
+    assert missing(model, ["Zwiebel", "Tomaten"]) == {
+        "salad": [],
+        "soup": ["gemüsebrühe"],
+        "pasta": ["nudel"],
+    }
+
+
+def test_line_needs_every_term_of_the_entry(model):
+    assert missing(model, ["rote Zwiebeln"]) == {"salad": ["tomate"]}
@@ -0,0 +1,64 @@
+"""Ingredient filters (model/filters.py) match terms, not whole ingredient lines."""
+import numpy as np
+import pytest
+
+from bench_incremental import quiet, write_jsonl
+from filters import RecipeFilter
+from normalize import normalize_tokens
+from segments import load_model
+from train import train
+from update import apply_update
+
+BASE = {
+    "salted": ["100 g gesalzene Erdnüsse", "1 Zwiebel"],
+    "roasted": ["200 g Erdnüsse, geröstet", "2 Tomaten"],
+    "plain": ["Erdnüsse"],
+    "tomato": ["500 g Tomaten", "1 rote Zwiebel"],
+    "onion": ["2 Zwiebeln", "Salz"],
+}
+# Introduces the term "erdnussbutter", which the base segment's index has no posting list for
+DELTA = {
+    "butter": ["2 EL Erdnussbutter", "1 rote Zwiebel"],
+}
+
+
+def recipe(name, lines):
+    return {"Url": f"https://example.org/rezept/{name}", "Name": name, "Ingredients": lines,
+            "Instructions": "Alles vermengen."}
+
+
+@pytest.fixture(scope="module")
+def model(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("filters")
+    artifact = str(tmp / "artifact")
+    write_jsonl(tmp / "base.jsonl", [recipe(name, lines) for name, lines in BASE.items()])
+    write_jsonl(tmp / "delta.jsonl", [recipe(name, lines) for name, lines in DELTA.items()])
+    quiet(train, str(tmp / "base.jsonl"), artifact)
+    quiet(apply_update, artifact, str(tmp / "delta.jsonl"))
+    return load_model(artifact)
+
+
+def allowed_names(model, exclude=(), require=()):
+    recipe_filter = RecipeFilter([term for name in exclude for term in normalize_tokens(name)],
+                                 [term for name in require for term in normalize_tokens(name)])
+    ids = np.flatnonzero(np.concatenate(model.filter_masks(recipe_filter)))
+    return sorted(item["Name"] for item in model.get(ids, ["Name"]))
+
+
+def test_exclude_drops_every_line_with_the_term(model):
+    assert allowed_names(model, exclude=["Erdnüsse"]) == ["onion", "tomato"]
+    assert allowed_names(model, exclude=["Erdnuss"]) == ["onion", "tomato"]
+
+
+def test_exclude_any_term_of_a_name(model):
+    assert allowed_names(model, exclude=["rote Zwiebel"]) == ["plain", "roasted"]
+
+
+def test_require_every_term(model):
+    assert allowed_names(model, require=["Zwiebel"]) == ["butter", "onion", "salted", "tomato"]
+    assert allowed_names(model, require=["rote Zwiebeln"]) == ["butter", "tomato"]
+    assert allowed_names(model, require=["Tomate", "Erdnüsse"]) == ["roasted"]
+
+
+def test_require_unknown_term(model):
+    assert allowed_names(model, require=["Zwiebel", "Trüffel"]) == []
@@ -0,0 +1,20 @@
+"""Concurrent household writes must not lose updates, see benchmarks/stress_households.py."""
+from types import SimpleNamespace
+
+from api.households.repository import HOUSEHOLDS_COLLECTION
+from fake_firestore import FakeAsyncFirestore
+from stress_households import HOUSEHOLD_ID, check, run_threads, setup_household
+
+
+def test_concurrent_writes_lose_no_updates():
+    args = SimpleNamespace(threads=8, ingredients=10, members=3, legacy=False)
+    # A little latency, so the threads' reads and writes interleave
+    fake = FakeAsyncFirestore(latency=0.001)
+    setup_household(fake.sync.collection(HOUSEHOLDS_COLLECTION))
+
+    errors = run_threads(lambda: fake, args)
+
+    assert errors == []
+    data = fake.sync.collection(HOUSEHOLDS_COLLECTION).document(HOUSEHOLD_ID).get().to_dict()
+    lost = [name for name, ok in check(data, args).items() if not ok]
+    assert lost == []
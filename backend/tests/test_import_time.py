@@ -0,0 +1,23 @@
+"""Importing main.py stays fast and leaves the heavy modules to the background, see benchmarks/check_import_time.py."""
+import os
+import statistics
+
+from check_import_time import DEFERRED, import_times
+
+# Milliseconds, the default budget of check_import_time.py. Slow CI machines can raise it
+BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", "1000"))
+RUNS = 3
+
+
+def test_importing_main_stays_within_budget():
+    # The first run also writes the .pyc files, it does not count
+    import_times("main")
+    runs = [import_times("main") for _ in range(RUNS)]
+
+    total_ms = statistics.median(times["main"][1] for times in runs) / 1000
+    assert total_ms <= BUDGET_MS, f"importing main took {total_ms:.0f} ms, the budget is {BUDGET_MS:.0f} ms"
+
+
+def test_importing_main_defers_heavy_modules():
+    deferred = sorted({name for name in import_times("main") if name.split(".")[0] in DEFERRED})
+    assert deferred == []
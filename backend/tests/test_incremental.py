@@ -0,0 +1,88 @@
+"""Incremental updates (model/update.py) must rank exactly like a full retrain, see benchmarks/bench_incremental.py."""
+import filecmp
+import os
+import random
+import shutil
+
+import numpy as np
+import pytest
+
+from bench_incremental import quiet, recipe, write_jsonl
+from segments import load_model
+from train import train
+from update import apply_update, compact
+
+N_RECIPES = 2_000
+N_UPDATES = 100
+N_QUERIES = 50
+
+
+@pytest.fixture(scope="module")
+def models(tmp_path_factory):
+    """(path of base + two deltas, path of a full retrain on the same recipes, query texts)"""
+    tmp = tmp_path_factory.mktemp("incremental")
+    rng = random.Random(3)
+    base = [recipe(i, rng) for i in range(N_RECIPES)]
+    # New recipes, changed recipes (same Url) and unchanged copies
+    batches = []
+    next_id = N_RECIPES
+    for _ in range(2):
+        batch = [recipe(next_id + i, rng) for i in range(N_UPDATES)]
+        next_id += N_UPDATES
+        batch += [recipe(i, rng, version=1) for i in rng.sample(range(N_RECIPES), N_UPDATES // 10)]
+        batch += [base[i] for i in rng.sample(range(N_RECIPES), N_UPDATES // 10)]
+        batches.append(batch)
+
+    # What a full retrain sees: live base recipes in order, then the delta recipes in order
+    corpus = {item["Url"]: item for item in base}
+    for batch in batches:
+        for item in batch:
+            if corpus.get(item["Url"]) != item:
+                corpus.pop(item["Url"], None)
+                corpus[item["Url"]] = item
+
+    artifact, full = str(tmp / "artifact"), str(tmp / "full")
+    write_jsonl(tmp / "base.jsonl", base)
+    write_jsonl(tmp / "corpus.jsonl", corpus.values())
+    quiet(train, str(tmp / "base.jsonl"), artifact)
+    for i, batch in enumerate(batches):
+        write_jsonl(tmp / f"batch{i}.jsonl", batch)
+        quiet(apply_update, artifact, str(tmp / f"batch{i}.jsonl"))
+    quiet(train, str(tmp / "corpus.jsonl"), full)
+
+    words = sorted({token for item in batches[0] for token in " ".join(item["Ingredients"]).lower().split()})
+    query_rng = random.Random(5)
+    queries = [" ".join(query_rng.sample(words, 4)) for _ in range(N_QUERIES)]
+    return artifact, full, queries
+
+
+def assert_same_rankings(model, expected, queries):
+    assert model.n_recipes == expected.n_recipes
+    for text in queries:
+        ids, scores = model.search(model.vectorize([text]), 10)
+        expected_ids, expected_scores = expected.search(expected.vectorize([text]), 10)
+        assert [record["Url"] for record in model.get(ids, ["Url"])] == \
+               [record["Url"] for record in expected.get(expected_ids, ["Url"])], text
+        np.testing.assert_allclose(scores, expected_scores)
+
+
+def test_deltas_rank_like_full_retrain(models):
+    artifact, full, queries = models
+    segmented = load_model(artifact)
+    assert len(segmented.segments) == 3
+    assert_same_rankings(segmented, load_model(full), queries)
+
+
+def test_compacted_model_matches_full_retrain(models):
+    artifact, full, queries = models
+    # Compacts a copy, the other tests keep the deltas
+    artifact = shutil.copytree(artifact, artifact + "-compacted")
+    quiet(compact, artifact)
+    compacted = load_model(artifact)
+    assert len(compacted.segments) == 1
+    assert_same_rankings(compacted, load_model(full), queries)
+
+    # Apart from the manifest timestamp, compaction writes the same files as the retrain
+    different = [name for name in sorted(os.listdir(full)) if name != "manifest.json" and not filecmp.cmp(
+        os.path.join(artifact, name), os.path.join(full, name), shallow=False)]
+    assert different == []
@@ -0,0 +1,76 @@
+"""The bulk ingredient routes of api/ingredients/ingredients.py, on the in-memory Firestore fake."""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.households.repository import HOUSEHOLDS_COLLECTION, HouseholdRepository
+from api.ingredients import ingredients
+from fake_firestore import FakeAsyncFirestore
+
+HOUSEHOLD_ID = "pantry"
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeAsyncFirestore()
+    fake.sync.collection(HOUSEHOLDS_COLLECTION).document(HOUSEHOLD_ID).set(
+        {"name": "Pantry", "ingredients": [{"name": "Zucker"}], "ingredients_version": 0})
+    monkeypatch.setattr(ingredients, "household_repository", HouseholdRepository(fake))
+    return fake
+
+
+@pytest.fixture
+def client(fake):
+    app = FastAPI()
+    app.include_router(ingredients.router)
+    with TestClient(app, cookies={"household_id": HOUSEHOLD_ID}) as client:
+        yield client
+
+
+def stored(fake) -> dict:
+    return fake.sync.collection(HOUSEHOLDS_COLLECTION).document(HOUSEHOLD_ID).get().to_dict()
+
+
+def test_bulk_add_reports_added_and_skipped(client, fake):
+    response = client.post("/households/ingredients/bulk", json={"names": ["Salz", " Pfeffer ", "", "Salz", "Zucker"]})
+
+    assert response.status_code == 200
+    # Blank names and repeats are dropped, names the household has are skipped
+    assert response.json()["added"] == ["Salz", "Pfeffer"]
+    assert response.json()["skipped"] == ["Zucker"]
+    assert [item["name"] for item in stored(fake)["ingredients"]] == ["Zucker", "Salz", "Pfeffer"]
+    assert stored(fake)["ingredients_version"] == 1
+
+
+def test_bulk_add_of_known_names_writes_nothing(client, fake):
+    response = client.post("/households/ingredients/bulk", json={"names": ["Zucker"]})
+
+    assert response.json()["added"] == []
+    assert response.json()["skipped"] == ["Zucker"]
+    assert stored(fake)["ingredients_version"] == 0
+
+
+def test_bulk_delete_reports_deleted_and_not_found(client, fake):
+    client.post("/households/ingredients/bulk", json={"names": ["Salz", "Pfeffer"]})
+
+    response = client.request("DELETE", "/households/ingredients/bulk", json={"names": ["Salz", "Mehl", "Salz", " Zucker"]})
+
+    assert response.status_code == 200
+    assert response.json()["deleted"] == ["Salz", "Zucker"]
+    assert response.json()["not_found"] == ["Mehl"]
+    assert [item["name"] for item in stored(fake)["ingredients"]] == ["Pfeffer"]
+    assert stored(fake)["ingredients_version"] == 2
+
+
+def test_bulk_request_size_is_limited(client):
+    names = [f"Zutat {i}" for i in range(ingredients.MAX_BULK_INGREDIENTS + 1)]
+
+    assert client.post("/households/ingredients/bulk", json={"names": names}).status_code == 413
+    assert client.request("DELETE", "/households/ingredients/bulk", json={"names": names}).status_code == 413
+
+
+def test_bulk_routes_need_an_existing_household(client):
+    client.cookies.set("household_id", "missing")
+
+    assert client.post("/households/ingredients/bulk", json={"names": ["Salz"]}).status_code == 404
+    assert client.request("DELETE", "/households/ingredients/bulk", json={"names": ["Salz"]}).status_code == 404
@@ -0,0 +1,35 @@
+"""Ingredient lines and pantry entries become the same terms (model/normalize.py)."""
+import pytest
+
+from normalize import ingredient_name, stem
+
+
+@pytest.mark.parametrize("line, name", [
+    ("500 g frische Tomaten", "tomate"),
+    ("Paradeiser", "tomate"),
+    ("2 tomatoes", "tomate"),
+    ("1 egg", "ei"),
+    ("3 eggs", "ei"),
+    ("2 Eier", "ei"),
+    ("2 chilies", "chili"),
+    ("3 Chilis", "chili"),
+    ("1 Chili", "chili"),
+    ("2 Zwiebeln, gehackt", "zwiebel"),
+    ("1 rote Zwiebel", "rote zwiebel"),
+    ("100 g gesalzene Erdnüsse", "gesalzene erdnuss"),
+    ("250 g Reis", "reis"),
+    ("1 Dose Mais", "mais"),
+    ("1 Kürbis", "kürbis"),
+    ("200 ml Sahne", "sahne"),
+    ("1 Prise Salz", "salz"),
+    ("2 EL Olivenöl", "olivenöl"),
+    ("1 cup berries", "berry"),
+    ("1 Glas", ""),
+])
+def test_ingredient_name(line, name):
+    assert ingredient_name(line) == name
+
+
+@pytest.mark.parametrize("token", ["reis", "mais", "nuss", "tofu", "feta", "ei", "kürbis"])
+def test_stem_keeps_singulars(token):
+    assert stem(token) == token
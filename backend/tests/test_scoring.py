@@ -0,0 +1,33 @@
+"""tfidf models rank like sklearn's sublinear TfidfVectorizer, see model/scoring.py."""
+import random
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from artifact import ingredients_text
+from bench_incremental import quiet, recipe, write_jsonl
+from normalize import normalize_tokens
+from segments import load_model
+from train import train
+
+
+def test_tfidf_ranks_like_sklearn_with_repeated_query_terms(tmp_path):
+    rng = random.Random(7)
+    recipes = [recipe(i, rng) for i in range(500)]
+    write_jsonl(tmp_path / "recipes.jsonl", recipes)
+    quiet(train, str(tmp_path / "recipes.jsonl"), str(tmp_path / "artifact"), 10_000, "tfidf")
+    model = load_model(str(tmp_path / "artifact"))
+
+    vectorizer = TfidfVectorizer(analyzer=normalize_tokens, sublinear_tf=True)
+    documents = vectorizer.fit_transform([ingredients_text(item) for item in recipes])
+    for item in recipes[:40]:
+        tokens = normalize_tokens(ingredients_text(item))
+        # Repeated terms are where raw query counts and 1 + ln tf differ
+        text = " ".join([rng.choice(tokens) for _ in range(3)] + [tokens[0]] * 4)
+
+        ids, scores = model.search(model.vectorize([text]), 10)
+        assert scores[0] > 0
+        expected = (documents @ vectorizer.transform([text]).T).toarray().ravel()
+        # The scores differ by a constant factor per query, see scoring.py
+        np.testing.assert_allclose(scores / scores[0], expected[ids] / expected[ids[0]], rtol=1e-9)
+        assert np.isclose(expected[ids[-1]], np.sort(expected)[-10])
@@ -0,0 +1,53 @@
+"""Back-pressure and counters of workers.BoundedPool."""
+import asyncio
+import threading
+
+import pytest
+
+from workers import BoundedPool, PoolSaturated
+
+
+def test_cancelled_call_stays_pending_until_its_thread_is_done():
+    pool = BoundedPool(workers=1, queue_depth=0, name="test")
+    started, release = threading.Event(), threading.Event()
+
+    def work():
+        started.set()
+        release.wait(5)
+
+    async def scenario():
+        request = asyncio.ensure_future(pool.run(work))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        # Like a client disconnect: the request is gone, the thread is still computing
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+        with pytest.raises(PoolSaturated):
+            await pool.run(work)
+
+        release.set()
+        while pool.status()["running"]:
+            await asyncio.sleep(0.01)
+        await pool.run(lambda: None)
+
+    asyncio.run(scenario())
+    assert pool.status()["rejected"] == 1
+    assert pool.status()["completed"] == 2
+    pool.shutdown()
+
+
+def test_errors_are_counted_as_failed():
+    pool = BoundedPool(workers=1, queue_depth=1, name="test")
+
+    def fail():
+        raise ValueError("broken")
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await pool.run(fail)
+        assert await pool.run(lambda: 42) == 42
+
+    asyncio.run(scenario())
+    status = pool.status()
+    assert (status["completed"], status["failed"], status["running"], status["waiting"]) == (1, 1, 0, 0)
+    pool.shutdown()
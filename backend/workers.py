@@ -0,0 +1,89 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Recommendation work is CPU-bound and runs outside the event loop, so a long
+# similarity pass does not stall the other requests on the same worker.
+# RECOMMEND_WORKERS threads do the work, up to RECOMMEND_QUEUE_DEPTH more calls
+# wait for a free thread, anything beyond that is rejected right away.
+RECOMMEND_WORKERS = int(os.environ.get("RECOMMEND_WORKERS", str(min(4, os.cpu_count() or 1))))
+RECOMMEND_QUEUE_DEPTH = int(os.environ.get("RECOMMEND_QUEUE_DEPTH", "32"))
+
+
+class PoolSaturated(Exception):
+    """Raised when a BoundedPool already has as many calls running and waiting as it accepts."""
+
+
+class BoundedPool:
+    """
+    A thread pool with a limit on waiting calls.
+
+    A call counts as pending from run() until its thread is done with it, even
+    if the request that started it was cancelled in the meantime, so the limit
+    holds for the work the threads actually have.
+    """
+
+    def __init__(self, workers: int, queue_depth: int, name: str):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        # The counters are updated from the event loop and from the worker threads
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_depth
+
+    async def run(self, fn, *args):
+        """Runs fn(*args) on the pool and waits for the result. Raises PoolSaturated if the pool is full."""
+        with self._lock:
+            if self._pending >= self.capacity:
+                self.rejected += 1
+                raise PoolSaturated(f"{self._pending} calls running or waiting")
+            self._pending += 1
+
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.add_done_callback(self._done)
+        # Cancelling the request only cancels the call if no thread has started it yet
+        return await asyncio.wrap_future(future)
+
+    def _done(self, future: Future):
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled():
+                self.cancelled += 1
+            elif future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def status(self) -> dict:
+        with self._lock:
+            pending = self._pending
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "running": min(pending, self.workers),
+            "waiting": max(pending - self.workers, 0),
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+recommend_pool = BoundedPool(RECOMMEND_WORKERS, RECOMMEND_QUEUE_DEPTH, "recommend")